@@ -0,0 +1,49 @@
+import statistics
+import time
+import typing as t
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Measurement:
+    name: str
+    items: int = 0
+    latencies: list[float] = field(default_factory=list)
+    failures: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: float | None = None
+
+    async def timed[R](self, awaitable: t.Awaitable[R], items: int = 1) -> R | None:
+        started_at = time.perf_counter()
+        try:
+            return await awaitable
+        except Exception:
+            self.failures += 1
+            return None
+        finally:
+            self.latencies.append(time.perf_counter() - started_at)
+            self.items += items
+
+    def finish(self) -> t.Self:
+        self.finished_at = time.perf_counter()
+        return self
+
+    @property
+    def wall(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def percentile(self, p: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[p - 1]
+
+
+def report(measurements: t.Sequence[Measurement]) -> str:
+    header = f"{'scenario':<44} {'items/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'fail':>5} {'wall s':>7}"
+    lines = [header, "-" * len(header)]
+    for m in measurements:
+        lines.append(
+            f"{m.name:<44} {m.items / m.wall:>9.1f} {m.percentile(50) * 1000:>8.1f} "
+            f"{m.percentile(99) * 1000:>8.1f} {m.failures:>5} {m.wall:>7.2f}"
+        )
+    return "\n".join(lines)
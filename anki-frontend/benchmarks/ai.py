@@ -0,0 +1,131 @@
+"""
+AI path latency and throughput against a local fake OpenAI-compatible server.
+
+Run from the `anki-frontend` directory:
+
+    PYTHONPATH=src python -m benchmarks.ai --images 8 --extractions 20
+"""
+
+import argparse
+import asyncio as aio
+import itertools
+import time
+
+from openai import AsyncOpenAI
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import AiClient, RateLimits, RequestScheduler
+
+from benchmarks._stats import Measurement, report
+from tests.fakes.openai import FakeOpenAI, Faults, Pace
+
+_counter = itertools.count()
+
+
+def fresh_image() -> Image:
+    return Image(name="bench.png", mime="image/png", data=f"{next(_counter)}".encode())
+
+
+async def bench_extraction(
+    ai: AiClient, images: int, concurrency: int
+) -> tuple[Measurement, Measurement]:
+    total = Measurement(f"extract x{images} c={concurrency}")
+    first = Measurement(f"  first extraction x{images} c={concurrency}")
+    semaphore = aio.Semaphore(concurrency)
+
+    async def extract() -> None:
+        async with semaphore:
+            started_at = time.perf_counter()
+            seen = False
+
+            async def on_extraction(_: Extraction) -> None:
+                nonlocal seen
+                if not seen:
+                    seen = True
+                    first.latencies.append(time.perf_counter() - started_at)
+                    first.items += 1
+
+            await total.timed(
+                ai.get_extractions_from_image(
+                    fresh_image(), on_extraction=on_extraction
+                )
+            )
+
+    await aio.gather(*(extract() for _ in range(images)))
+    return total.finish(), first.finish()
+
+
+async def bench_generation(
+    ai: AiClient, extractions: int, batch_size: int, max_in_flight: int
+) -> Measurement:
+    m = Measurement(
+        f"generate x{extractions} batch={batch_size} in-flight={max_in_flight}"
+    )
+    await m.timed(
+        ai.generate_protonotes(
+            [
+                Extraction(reason="bench", snippet=f"word {next(_counter)}")
+                for _ in range(extractions)
+            ],
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+        ),
+        items=extractions,
+    )
+    return m.finish()
+
+
+async def main(args: argparse.Namespace) -> None:
+    pace = Pace(
+        time_to_first_token=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+    )
+    faults = Faults(rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+
+    async with FakeOpenAI.running(pace=pace, faults=faults, seed=args.seed) as (
+        fake,
+        url,
+    ):
+        scheduler = RequestScheduler(RateLimits(attempts=50))
+        async with AiClient.running(
+            AsyncOpenAI(api_key="unused", base_url=url), scheduler=scheduler
+        ) as ai:
+            measurements = []
+            for concurrency in args.concurrency:
+                measurements.extend(
+                    await bench_extraction(ai, args.images, concurrency)
+                )
+            for batch_size, max_in_flight in itertools.product(
+                args.batch_sizes, args.concurrency
+            ):
+                measurements.append(
+                    await bench_generation(
+                        ai, args.extractions, batch_size, max_in_flight
+                    )
+                )
+
+    print(report(measurements))
+    print()
+    print(ai.telemetry.report())
+    print(
+        f"\n{len(fake.requests)} requests, {scheduler.metrics.throttled} throttled, "
+        f"mean scheduler wait {scheduler.metrics.mean_wait * 1000:.1f} ms"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--extractions", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    aio.run(main(parse_args()))
@@ -0,0 +1,185 @@
+"""
+Export throughput against a local fake AnkiConnect.
+
+Run from the `anki-frontend` directory:
+
+    PYTHONPATH=src python -m benchmarks.export --notes 200 --latency 0.005
+"""
+
+import argparse
+import asyncio as aio
+import itertools
+import typing as t
+import uuid
+from urllib.parse import urlparse
+
+from openai import AsyncOpenAI
+
+from aicards.misc.ankiconnect_client import (
+    AnkiConnectClient,
+    CoalescingOptions,
+    NoteData,
+)
+from aicards.ctx.aicards.base import Example, MeaningProtonote
+from aicards.ctx.aicards.core import Service
+from aicards.ctx.aicards.core.ai import AiClient
+
+from benchmarks._stats import Measurement, report
+from tests.fakes.ankiconnect import FakeAnkiConnect, Faults
+
+_counter = itertools.count()
+
+
+def fresh_note() -> NoteData:
+    return {
+        "deckName": "English",
+        "modelName": "Meaning",
+        "fields": {"Concept": f"concept {next(_counter)}"},
+    }
+
+
+def fresh_protonote() -> MeaningProtonote:
+    return MeaningProtonote(
+        id=f"proto-{uuid.uuid4()}",
+        type="Meaning",
+        concept=f"concept {next(_counter)}",
+        examples=(Example(sentence="Example sentence", image=None), None),
+    )
+
+
+def chunked[T](items: t.Sequence[T], size: int) -> list[t.Sequence[T]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+async def run_limited(
+    calls: t.Iterable[t.Callable[[], t.Awaitable[t.Any]]],
+    concurrency: int,
+) -> None:
+    """Make the calls, `concurrency` at a time."""
+    semaphore = aio.Semaphore(concurrency)
+
+    async def limited(call: t.Callable[[], t.Awaitable[t.Any]]) -> None:
+        # NOTE: Calls are only made here, as operations start running as soon as they're created
+        async with semaphore:
+            await call()
+
+    await aio.gather(*(limited(c) for c in calls))
+
+
+async def bench_add_note(
+    base_url: str, notes: int, concurrency: int, coalescing: bool
+) -> Measurement:
+    m = Measurement(
+        f"addNote x{notes} c={concurrency}{' coalesced' if coalescing else ''}"
+    )
+    url = urlparse(base_url)
+    async with AnkiConnectClient.running(
+        url.hostname or "127.0.0.1",
+        url.port or 80,
+        coalescing=CoalescingOptions() if coalescing else None,
+    ) as client:
+        await run_limited(
+            (lambda: m.timed(client.add_note(fresh_note())) for _ in range(notes)),
+            concurrency,
+        )
+    return m.finish()
+
+
+async def bench_add_notes(
+    base_url: str, notes: int, batch_size: int, concurrency: int
+) -> Measurement:
+    m = Measurement(f"addNotes x{notes} batch={batch_size} c={concurrency}")
+    url = urlparse(base_url)
+    async with AnkiConnectClient.running(
+        url.hostname or "127.0.0.1", url.port or 80
+    ) as client:
+        batches = chunked([fresh_note() for _ in range(notes)], batch_size)
+        await run_limited(
+            (lambda b=b: m.timed(client.add_notes(b), items=len(b)) for b in batches),
+            concurrency,
+        )
+    return m.finish()
+
+
+async def bench_service_export(
+    base_url: str, notes: int, batch_size: int, concurrency: int
+) -> Measurement:
+    m = Measurement(f"export_protonotes x{notes} batch={batch_size} c={concurrency}")
+    url = urlparse(base_url)
+    async with (
+        AnkiConnectClient.running(
+            url.hostname or "127.0.0.1",
+            url.port or 80,
+            coalescing=CoalescingOptions(),
+        ) as anki_client,
+        AiClient.running(AsyncOpenAI(api_key="unused")) as ai_client,
+        Service.running(ai_client, anki_client, deck_name="English") as service,
+    ):
+        batches = chunked([fresh_protonote() for _ in range(notes)], batch_size)
+        await run_limited(
+            (
+                lambda b=b: m.timed(
+                    _exported(service.export_protonotes(b)), items=len(b)
+                )
+                for b in batches
+            ),
+            concurrency,
+        )
+    return m.finish()
+
+
+async def _exported(operation: t.Awaitable[t.Sequence[t.Any]]) -> None:
+    results = await operation
+    if failed := [r for r in results if not r.ok]:
+        raise RuntimeError(f"{len(failed)} protonotes failed to export")
+
+
+async def main(args: argparse.Namespace) -> None:
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall=args.stall,
+        per_item_latency=args.per_item_latency,
+    )
+
+    async with FakeAnkiConnect.running(faults=faults, seed=args.seed) as (_, url):
+        measurements = []
+        for concurrency in args.concurrency:
+            measurements.append(
+                await bench_add_note(url, args.notes, concurrency, False)
+            )
+            measurements.append(
+                await bench_add_note(url, args.notes, concurrency, True)
+            )
+        for batch_size, concurrency in itertools.product(
+            args.batch_sizes, args.concurrency
+        ):
+            measurements.append(
+                await bench_add_notes(url, args.notes, batch_size, concurrency)
+            )
+            measurements.append(
+                await bench_service_export(url, args.notes, batch_size, concurrency)
+            )
+
+    print(report(measurements))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.002)
+    parser.add_argument("--per-item-latency", type=float, default=0.0002)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    aio.run(main(parse_args()))
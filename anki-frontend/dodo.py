@@ -22,6 +22,14 @@ def task_test() -> Dict[str, Any]:
     }
 
 
+def task_bench() -> Dict[str, Any]:
+    """Benchmark export and AI paths against local fake AnkiConnect and OpenAI servers."""
+    return {
+        "actions": ["python -m benchmarks.export", "python -m benchmarks.ai"],
+        "verbosity": 2,
+    }
+
+
 def task_type_check() -> Dict[str, Any]:
     """Run static type checking with mypy."""
     return {"actions": [f"mypy {path}" for path in PYTHON_PATHS]}
@@ -44,7 +52,7 @@ def task_lint() -> Dict[str, Any]:
 
 def task_package() -> Dict[str, Any]:
     """Create .ankiaddon file.
-    
+
     Following Anki add-on packaging requirements:
     - Includes all files from src/ directory (recursively)
     - Includes manifest.json from root
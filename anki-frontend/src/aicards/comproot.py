@@ -0,0 +1,35 @@
+import contextlib
+import typing as t
+
+from aicards.misc.logging import LoggerLike, null_logger
+from aicards.misc.anki_collection_client import AnkiCollectionClient
+from aicards.misc.ankiconnect_client import (
+    AnkiClientLike,
+    AnkiConnectClient,
+    CoalescingOptions,
+)
+
+
+@contextlib.asynccontextmanager
+async def anki_client_running(
+    logger: LoggerLike = null_logger,
+) -> t.AsyncIterator[AnkiClientLike]:
+    """Talk to the collection in-process when running as an add-on, over AnkiConnect otherwise."""
+    if (col := _addon_collection()) is not None:
+        async with AnkiCollectionClient.running(col) as client:
+            yield client
+        return
+
+    async with AnkiConnectClient.running(
+        coalescing=CoalescingOptions(),
+        logger=logger,
+    ) as client:
+        yield client
+
+
+def _addon_collection():
+    try:
+        from aqt import mw  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return None if mw is None else mw.col
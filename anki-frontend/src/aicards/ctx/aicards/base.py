@@ -87,22 +87,53 @@ class ExtractionWithPrototonotes:
     protonotes: tuple[Protonote, ...]
 
 
+@dataclass(frozen=True)
+class ProtonoteExportResult:
+    protonote: Protonote
+    note_id: int | None = None
+    error: str | None = None
+    queued: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """Exported as a note known by its id, or queued to be."""
+        return self.error is None and (self.queued or self.note_id is not None)
+
+
 @dataclass(frozen=True)
 class LlmChatMessage:
     role: str
     text: str
+    # NOTE: Messages of the same stream are fragments of a single message, to be appended together
+    stream_id: str | None = None
 
 
 class IOperation[R](t.Awaitable[R]):
     llm_messages: rx.AsyncObservable[LlmChatMessage]
 
 
+class IStreamingOperation[R, I](IOperation[R]):
+    """Operation that emits parts of its result as soon as they are produced."""
+
+    items: rx.AsyncObservable[I]
+
+
 class IService(ABC):
     def extract_emphases(
         self,
         image: Image,
         logger: LoggerLike = ...,
-    ) -> IOperation[list[Extraction]]: ...
+        bypass_cache: bool = False,
+    ) -> IStreamingOperation[list[Extraction], Extraction]: ...
+
+    def extract_emphases_batch(
+        self,
+        images: t.Sequence[Image],
+        logger: LoggerLike = ...,
+        bypass_cache: bool = False,
+    ) -> IOperation[list[list[Extraction]]]:
+        """Extractions of every image, in their order, with as few LLM requests as fit the budgets."""
+        raise NotImplementedError
 
     def create_protonotes(
         self,
@@ -110,8 +141,16 @@ class IService(ABC):
         logger: LoggerLike = ...,
     ) -> IOperation[list[ExtractionWithPrototonotes]]: ...
 
+    def preflight_protonotes(
+        self,
+        protonotes: t.Sequence[Protonote],
+        logger: LoggerLike = ...,
+    ) -> IOperation[dict[str, str]]:
+        """Map ids of protonotes that cannot be exported to the reason why."""
+        raise NotImplementedError
+
     def export_protonotes(
         self,
-        protonotes: list[Protonote],
+        protonotes: t.Sequence[Protonote],
         logger: LoggerLike = ...,
-    ) -> IOperation[bool]: ...
+    ) -> IOperation[list[ProtonoteExportResult]]: ...
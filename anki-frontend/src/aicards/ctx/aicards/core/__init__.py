@@ -1,29 +1,48 @@
 import asyncio as aio
 import contextlib
-import random
+import dataclasses
+import itertools
+import time
 import uuid
 import typing as t
 from dataclasses import dataclass as native_dataclass
 
 import aioreactive as rx
+import openai
+import pydantic
 
 from aicards.misc.logging import LoggerLike, null_logger
-from aicards.misc.ankiconnect_client import AnkiConnectClient
+from aicards.misc.ankiconnect_client import (
+    AnkiClientLike,
+    NoteData,
+    AnkiConnectClientError,
+)
+from aicards.misc.anki_duplicates import DuplicateIndex, DuplicateKey, DUPLICATE_ERROR
+from aicards.misc.anki_media import MediaUploader
+from aicards.misc.anki_schema import InvalidNoteError, SchemaRegistry
+from aicards.misc import highlights, imaging
+from aicards.misc.highlights import HighlightOptions
+from aicards.misc.imaging import PreprocessingOptions, TilingOptions
 
 from aicards.ctx.ankiconnect import notedata_from
 from aicards.ctx.aicards.base import (
     IOperation,
+    IStreamingOperation,
     Image,
-    Example,
     IService,
     Extraction,
     Protonote,
     ExtractionWithPrototonotes,
-    MeaningProtonote,
-    EnglishNounProtonote,
     LlmChatMessage,
+    ProtonoteExportResult,
+)
+from aicards.ctx.aicards.core.ai import AiClient, BatchingOptions, cache_key, pack
+from aicards.ctx.aicards.core._singleflight import SingleFlight, Sink
+from aicards.ctx.aicards.core._journal import (
+    ExportJournal,
+    JournalEntry,
+    JournaledExporter,
 )
-from aicards.ctx.aicards.core.ai import AiClient
 
 
 class Operation[R](IOperation[R]):
@@ -43,6 +62,21 @@ class Operation[R](IOperation[R]):
         return self._task.__await__()
 
 
+class StreamingOperation[R, I](Operation[R], IStreamingOperation[R, I]):
+    def __init__(
+        self,
+        coro: t.Coroutine[t.Any, R, t.Any],
+        llm_messages: rx.AsyncObservable[LlmChatMessage],
+        items: rx.AsyncObservable[I],
+    ):
+        super().__init__(coro, llm_messages)
+        self._items = items
+
+    @property
+    def items(self) -> rx.AsyncObservable[I]:
+        return self._items
+
+
 @native_dataclass(frozen=True)
 class Service(IService):
     @classmethod
@@ -50,106 +84,524 @@ class Service(IService):
     async def running(
         cls,
         ai_client: AiClient,
-        anki_client: AnkiConnectClient,
+        anki_client: AnkiClientLike,
         deck_name: str = "Default",
+        journal: ExportJournal | None = None,
+        export_batch_size: int = 50,
+        max_exports_in_flight: int = 4,
+        preprocessing: PreprocessingOptions | None = PreprocessingOptions(),
+        tiling: TilingOptions | None = TilingOptions(),
+        highlight_detection: HighlightOptions | None = HighlightOptions(),
+        batching: BatchingOptions | None = BatchingOptions(),
         logger: LoggerLike = null_logger,
     ) -> t.AsyncIterator[t.Self]:
-        yield cls(
+        schema = SchemaRegistry(anki_client)
+        exporter = JournaledExporter(
+            ExportJournal.open(":memory:") if journal is None else journal,
+            anki_client,
+            batch_size=export_batch_size,
+            max_in_flight=max_exports_in_flight,
+            # NOTE: Collection schema has changed since it was cached
+            on_schema_error=schema.invalidate,
+            logger=logger,
+        )
+        self = cls(
             ai_client,
             anki_client,
             deck_name,
             logger,
+            schema,
+            DuplicateIndex(anki_client, schema),
+            exporter,
+            MediaUploader(anki_client),
+            preprocessing,
+            tiling,
+            highlight_detection,
+            batching,
+            SingleFlight(),
         )
+        indexing = aio.create_task(self._refresh_duplicates())
+        replaying = aio.create_task(exporter.replaying())
+        try:
+            yield self
+        finally:
+            indexing.cancel()
+            replaying.cancel()
+            # NOTE: Cancelled tasks may still be talking to the clients, which are closed next
+            await aio.gather(indexing, replaying, return_exceptions=True)
 
     _ai_client: AiClient
-    _anki_client: AnkiConnectClient
+    _anki_client: AnkiClientLike
     _deck_name: str
     _logger: LoggerLike
+    _schema: SchemaRegistry
+    _duplicates: DuplicateIndex
+    _exporter: JournaledExporter
+    _media: MediaUploader
+    _preprocessing: PreprocessingOptions | None
+    _tiling: TilingOptions | None
+    _highlights: HighlightOptions | None
+    _batching: BatchingOptions | None
+    _flights: SingleFlight
+
+    async def _refresh_duplicates(self) -> None:
+        try:
+            await self._duplicates.refresh(self._deck_name)
+        except AnkiConnectClientError as e:
+            self._logger.warn("Failed to index existing notes", exc_info=e)
 
     def extract_emphases(
-        self, image: Image, logger: LoggerLike = null_logger
-    ) -> Operation[list[Extraction]]:
-        llm_messages = rx.AsyncSubject()
-        return Operation(
-            self._extract_emphases(image, llm_messages),
+        self,
+        image: Image,
+        logger: LoggerLike = null_logger,
+        bypass_cache: bool = False,
+    ) -> StreamingOperation[list[Extraction], Extraction]:
+        llm_messages = rx.AsyncSubject[LlmChatMessage]()
+        extractions = rx.AsyncSubject[Extraction]()
+        flight, joined = self._flights.join(
+            cache_key("extract", image.data, image.mime, str(bypass_cache)),
+            lambda messages, items: self._extract_emphases(
+                image, messages, items, bypass_cache
+            ),
+            channels=2,
+        )
+        if joined:
+            self._logger.debug(
+                "Joined in-flight extraction of an identical image",
+                {"name": image.name},
+            )
+        return StreamingOperation(
+            flight.follow(_Restreamed(llm_messages), extractions),
             llm_messages,
+            extractions,
         )
 
     async def _extract_emphases(
         self,
         image: Image,
-        llm_messages: rx.AsyncSubject,
+        llm_messages: Sink[LlmChatMessage],
+        extractions: Sink[Extraction],
+        bypass_cache: bool,
     ) -> list[Extraction]:
-        result = self._ai_client.get_extractions_from_image(image)
+        started_at = time.perf_counter()
+        parts = await self._cropped(image, llm_messages) or await self._tiles(
+            image, llm_messages
+        )
+        emitted: set[tuple[str, str]] = set()
+
+        async def on_extraction(extraction: Extraction) -> None:
+            # NOTE: Overlapping tiles see the same emphases twice
+            if (key := _identity_of(extraction)) in emitted:
+                return
+            if not emitted:
+                self._logger.info(
+                    "First extraction from %(name)s after %(latency).2fs",
+                    {"name": image.name, "latency": time.perf_counter() - started_at},
+                )
+            emitted.add(key)
+            await extractions.asend(extraction)
+
+        per_part = await aio.gather(
+            *(
+                self._extract_part(
+                    part, llm_messages, on_extraction, bypass_cache, announce=i == 0
+                )
+                for i, part in enumerate(parts)
+            )
+        )
+
+        merged: dict[tuple[str, str], Extraction] = {}
+        for extraction in itertools.chain.from_iterable(per_part):
+            merged.setdefault(_identity_of(extraction), extraction)
+        # NOTE: Anything the incremental parser couldn't make out is still delivered
+        for extraction in merged.values():
+            await on_extraction(extraction)
+
+        self._logger.info(
+            "Extracted emphases from %(name)s in %(latency).2fs",
+            {
+                "name": image.name,
+                "latency": time.perf_counter() - started_at,
+                "parts": len(parts),
+            },
+        )
+        return list(merged.values())
+
+    async def _extract_part(
+        self,
+        image: Image,
+        llm_messages: Sink[LlmChatMessage],
+        on_extraction: t.Callable[[Extraction], t.Awaitable[None]],
+        bypass_cache: bool,
+        announce: bool,
+    ) -> list[Extraction]:
+        image = await self._preprocessed(image, llm_messages)
+        return await self._extract_preprocessed(
+            image, llm_messages, on_extraction, bypass_cache, announce
+        )
+
+    async def _extract_preprocessed(
+        self,
+        image: Image,
+        llm_messages: Sink[LlmChatMessage],
+        on_extraction: t.Callable[[Extraction], t.Awaitable[None]],
+        bypass_cache: bool,
+        announce: bool,
+    ) -> list[Extraction]:
+        stream_id = f"extraction-{uuid.uuid4()}"
+
+        async def on_token(token: str) -> None:
+            await llm_messages.asend(
+                LlmChatMessage(role="ocr-response", text=token, stream_id=stream_id)
+            )
+
+        result = self._ai_client.get_extractions_from_image(
+            image, bypass_cache, on_token, on_extraction
+        )
+        if announce:
+            await llm_messages.asend(LlmChatMessage(role="user", text=result.prompt))
+
+        return list((await result).extractions)
+
+    def extract_emphases_batch(
+        self,
+        images: t.Sequence[Image],
+        logger: LoggerLike = null_logger,
+        bypass_cache: bool = False,
+    ) -> Operation[list[list[Extraction]]]:
+        llm_messages = rx.AsyncSubject[LlmChatMessage]()
+        return Operation(
+            self._extract_emphases_batch(images, llm_messages, bypass_cache),
+            llm_messages,
+        )
 
+    async def _extract_emphases_batch(
+        self,
+        images: t.Sequence[Image],
+        llm_messages: Sink[LlmChatMessage],
+        bypass_cache: bool,
+    ) -> list[list[Extraction]]:
+        started_at = time.perf_counter()
+
+        async def parts_of(image: Image) -> list[Image]:
+            parts = await self._cropped(image, llm_messages) or await self._tiles(
+                image, llm_messages
+            )
+            return list(
+                await aio.gather(*(self._preprocessed(p, llm_messages) for p in parts))
+            )
+
+        # NOTE: Crops and tiles of all the images are packed together, then merged back per image
+        split = await aio.gather(*(parts_of(image) for image in images))
+        parts = list(itertools.chain.from_iterable(split))
+        if self._batching is None:
+            batches = [[i] for i in range(len(parts))]
+        else:
+            batches = pack(parts, self._batching)
         await llm_messages.asend(
             LlmChatMessage(
-                role="user",
-                text=result.prompt,
+                role="system",
+                text=f"Extracting emphases from {len(images)} images in {len(batches)} requests",
             )
         )
 
-        return list((await result).extractions)
+        per_batch = await aio.gather(
+            *(
+                self._extract_batch(
+                    [parts[i] for i in batch],
+                    llm_messages,
+                    bypass_cache,
+                    announce=j == 0,
+                )
+                for j, batch in enumerate(batches)
+            )
+        )
+        per_part: dict[int, list[Extraction]] = {}
+        for batch, extractions in zip(batches, per_batch):
+            per_part.update(zip(batch, extractions))
+
+        results: list[list[Extraction]] = []
+        owned = itertools.count()
+        for image_parts in split:
+            merged: dict[tuple[str, str], Extraction] = {}
+            for i in itertools.islice(owned, len(image_parts)):
+                for extraction in per_part[i]:
+                    merged.setdefault(_identity_of(extraction), extraction)
+            results.append(list(merged.values()))
+
+        self._logger.info(
+            "Extracted emphases from %(images)d images with %(requests)d requests "
+            "in %(latency).2fs",
+            {
+                "images": len(images),
+                "parts": len(parts),
+                "requests": len(batches),
+                "latency": time.perf_counter() - started_at,
+            },
+        )
+        return results
+
+    async def _extract_batch(
+        self,
+        images: t.Sequence[Image],
+        llm_messages: Sink[LlmChatMessage],
+        bypass_cache: bool,
+        announce: bool,
+    ) -> list[list[Extraction]]:
+        """Extractions of preprocessed images with a single request, or one request per image if it fails."""
+        if len(images) == 1:
+            return [
+                await self._extract_preprocessed(
+                    images[0], llm_messages, _ignore, bypass_cache, announce
+                )
+            ]
+
+        response = self._ai_client.get_extractions_from_images(images, bypass_cache)
+        if announce:
+            await llm_messages.asend(LlmChatMessage(role="user", text=response.prompt))
+        try:
+            return [list(result.extractions) for result in await response]
+        except (ValueError, openai.APIError) as e:
+            self._logger.warn(
+                "Batch extraction of %(count)d images failed, extracting them one by one",
+                {"count": len(images)},
+                exc_info=e,
+            )
+            await llm_messages.asend(
+                LlmChatMessage(
+                    role="system",
+                    text=f"Batch of {len(images)} images failed, extracting them one by one",
+                )
+            )
+            return list(
+                await aio.gather(
+                    *(
+                        self._extract_preprocessed(
+                            image, llm_messages, _ignore, bypass_cache, announce=False
+                        )
+                        for image in images
+                    )
+                )
+            )
+
+    async def _cropped(
+        self, image: Image, llm_messages: Sink[LlmChatMessage]
+    ) -> list[Image]:
+        """Crops of the highlighted and underlined parts of an image; empty to send it whole."""
+        if self._highlights is None:
+            return []
+
+        try:
+            crops = await aio.to_thread(highlights.crop, image.data, self._highlights)
+        except ValueError as e:
+            self._logger.warn("Failed to look for highlights", exc_info=e)
+            return []
+        if not crops:
+            return []
+
+        cropped_bytes = sum(len(c.data) for c in crops)
+        self._logger.info(
+            "Cropped %(name)s to %(crops)d highlighted regions",
+            {
+                "name": image.name,
+                "crops": len(crops),
+                "bytes_before": len(image.data),
+                "bytes_after": cropped_bytes,
+            },
+        )
+        await llm_messages.asend(
+            LlmChatMessage(
+                role="system",
+                text=(
+                    f"Cropped to {len(crops)} highlighted regions, "
+                    f"{cropped_bytes / 1024:.0f} KiB instead of {len(image.data) / 1024:.0f} KiB"
+                ),
+            )
+        )
+        return [
+            Image(name=f"{image.name}@{i}", mime=crop.mime, data=crop.data)
+            for i, crop in enumerate(crops)
+        ]
+
+    async def _tiles(
+        self, image: Image, llm_messages: Sink[LlmChatMessage]
+    ) -> list[Image]:
+        """Split images too large to be read at the provider's resolution into tiles."""
+        if self._tiling is None:
+            return [image]
+
+        try:
+            width, height = imaging.dimensions(image.data)
+            if max(width, height) <= self._tiling.threshold:
+                return [image]
+            tiles = await aio.to_thread(
+                imaging.split,
+                image.data,
+                self._tiling.tile_size,
+                self._tiling.overlap,
+            )
+        except ValueError as e:
+            self._logger.warn("Failed to split image into tiles", exc_info=e)
+            return [image]
+
+        await llm_messages.asend(
+            LlmChatMessage(
+                role="system",
+                text=f"Image {width}x{height} split into {len(tiles)} tiles",
+            )
+        )
+        return [
+            Image(name=f"{image.name}#{i}", mime=tile.mime, data=tile.data)
+            for i, tile in enumerate(tiles)
+        ]
+
+    async def _preprocessed(
+        self, image: Image, llm_messages: Sink[LlmChatMessage]
+    ) -> Image:
+        """Shrink the image before it's sent to the LLM, reporting what it saved."""
+        if self._preprocessing is None:
+            return image
+
+        started_at = time.perf_counter()
+        try:
+            # NOTE: Decoding and scaling a 4K screenshot takes long enough to stall the UI
+            after = await aio.to_thread(
+                imaging.preprocess, image.data, self._preprocessing
+            )
+        except ValueError as e:
+            self._logger.warn("Failed to preprocess image", exc_info=e)
+            return image
+
+        stats = {
+            "name": image.name,
+            "bytes_before": len(image.data),
+            "bytes_after": len(after.data),
+            "tokens_before": imaging.estimate_vision_tokens(
+                after.source_width, after.source_height
+            ),
+            "tokens_after": imaging.estimate_vision_tokens(after.width, after.height),
+            "latency": time.perf_counter() - started_at,
+        }
+        self._logger.info(
+            "Preprocessed %(name)s: %(bytes_before)d -> %(bytes_after)d bytes, "
+            "~%(tokens_before)d -> ~%(tokens_after)d tokens in %(latency).2fs",
+            stats,
+        )
+        await llm_messages.asend(
+            LlmChatMessage(
+                role="system",
+                text=(
+                    f"Image {after.source_width}x{after.source_height} -> "
+                    f"{after.width}x{after.height}, "
+                    f"{len(image.data) // 1024} -> {len(after.data) // 1024} KiB, "
+                    f"~{stats['tokens_before']} -> ~{stats['tokens_after']} tokens"
+                ),
+            )
+        )
+
+        return Image(name=image.name, mime=after.mime, data=after.data)
 
     def create_protonotes(
         self,
         extractions: t.Sequence[Extraction],
         logger: LoggerLike = null_logger,
     ) -> Operation[t.Sequence[ExtractionWithPrototonotes]]:
-        llm_messages = rx.AsyncSubject()
+        llm_messages = rx.AsyncSubject[LlmChatMessage]()
+        flight, joined = self._flights.join(
+            cache_key("protonotes", _extractions_adapter.dump_json(list(extractions))),
+            lambda messages: self._create_protonotes(extractions, messages, logger),
+        )
+        if joined:
+            self._logger.debug(
+                "Joined in-flight protonotes generation of identical extractions",
+                {"count": len(extractions)},
+            )
         return Operation(
-            self._create_protonotes(extractions, llm_messages, logger),
+            flight.follow(_Restreamed(llm_messages)),
             llm_messages,
         )
 
     async def _create_protonotes(
         self,
         extractions: t.Sequence[Extraction],
-        llm_messages: rx.AsyncSubject,
+        llm_messages: Sink[LlmChatMessage],
         logger: LoggerLike,
     ) -> t.Sequence[ExtractionWithPrototonotes]:
         await llm_messages.asend(
             LlmChatMessage(
-                role="user",
+                role="generation-request",
                 text=f"Create protonotes for {len(extractions)} extractions",
             )
         )
 
-        results = [
-            ExtractionWithPrototonotes(
-                extraction=extraction,
-                protonotes=(
-                    MeaningProtonote(
-                        id=f"proto-{uuid.uuid4()}",
-                        type="Meaning",
-                        concept=f"Concept {random.randint(10, 99)}",
-                        examples=(
-                            Example(
-                                sentence="Example sentence 1",
-                                image=None,
-                            ),
-                            None,
-                        ),
-                    ),
-                    EnglishNounProtonote(
-                        id=f"proto-{uuid.uuid4()}",
-                        type="English Noun",
-                        singular=f"Singular {random.randint(10, 99)}",
-                        plural="Plural",
-                    ),
-                ),
+        result = await self._ai_client.generate_protonotes(extractions)
+
+        await llm_messages.asend(
+            LlmChatMessage(role="generation-response", text=result.message)
+        )
+        for extraction in result.failed:
+            await llm_messages.asend(
+                LlmChatMessage(
+                    role="generation-response",
+                    text=f"Failed to generate protonotes for {extraction.snippet}",
+                )
             )
-            for extraction in extractions
-        ]
 
-        return results
+        return list(result.results)
+
+    def preflight_protonotes(
+        self,
+        protonotes: t.Sequence[Protonote],
+        logger: LoggerLike = null_logger,
+    ) -> Operation[dict[str, str]]:
+        llm_messages = rx.AsyncSubject[LlmChatMessage]()
+        return Operation(
+            self._preflight_protonotes(protonotes),
+            llm_messages,
+        )
+
+    async def _preflight_protonotes(
+        self,
+        protonotes: t.Sequence[Protonote],
+    ) -> dict[str, str]:
+        problems: dict[str, str] = {}
+        unknown: list[tuple[Protonote, NoteData]] = []
+        seen = set()
+        await self._refresh_duplicates()
+
+        try:
+            for protonote in protonotes:
+                try:
+                    note = await self._schema.validate(self._notedata_from(protonote))
+                except InvalidNoteError as e:
+                    problems[protonote.id] = str(e)
+                    continue
+
+                key = await self._duplicates.key_of(note)
+                if self._duplicates.contains(key) or (key is not None and key in seen):
+                    problems[protonote.id] = DUPLICATE_ERROR
+                else:
+                    unknown.append((protonote, note))
+                seen.add(key)
+
+            if unknown:
+                checks = await self._anki_client.can_add_notes_with_error_detail(
+                    [note for _, note in unknown]
+                )
+                for (protonote, _), check in zip(unknown, checks):
+                    if not check.canAdd:
+                        problems[protonote.id] = check.error or "cannot create note"
+        except AnkiConnectClientError as e:
+            self._logger.warn("Pre-flight check failed", exc_info=e)
+
+        return problems
 
     def export_protonotes(
         self,
         protonotes: t.Sequence[Protonote],
         logger: LoggerLike = null_logger,
-    ) -> Operation[t.Sequence[Protonote]]:
-        llm_messages = rx.AsyncSubject()
+    ) -> Operation[list[ProtonoteExportResult]]:
+        llm_messages = rx.AsyncSubject[LlmChatMessage]()
         return Operation(
             self._export_protonotes(protonotes, llm_messages),
             llm_messages,
@@ -159,7 +611,10 @@ class Service(IService):
         self,
         protonotes: t.Sequence[Protonote],
         llm_messages: rx.AsyncSubject,
-    ) -> bool:
+    ) -> list[ProtonoteExportResult]:
+        if not protonotes:
+            return []
+
         for protonote in protonotes:
             await llm_messages.asend(
                 LlmChatMessage(
@@ -167,6 +622,140 @@ class Service(IService):
                     text=f"Exporting protonote {protonote.description}",
                 )
             )
-            note_data = notedata_from(protonote, deck_name="English")
-            await self._anki_client.add_note(note_data)
-        return True
+
+        results: list[ProtonoteExportResult | None] = [None] * len(protonotes)
+        notes: dict[int, NoteData] = {}
+
+        # NOTE: Notes that don't fit the collection's schema are rejected locally, without a round-trip
+        for i, protonote in enumerate(protonotes):
+            try:
+                notes[i] = await self._validated(self._notedata_from(protonote))
+            except InvalidNoteError as e:
+                results[i] = ProtonoteExportResult(protonote=protonote, error=str(e))
+
+        keys = {i: await self._duplicate_key(note) for i, note in notes.items()}
+
+        # NOTE: Known duplicates are rejected locally as well, once the index has caught up with
+        #       notes added or deleted in Anki in the meantime
+        await self._refresh_duplicates()
+        pending = []
+        for i, key in keys.items():
+            if self._duplicates.contains(key):
+                results[i] = ProtonoteExportResult(
+                    protonote=protonotes[i], error=DUPLICATE_ERROR
+                )
+            else:
+                pending.append(i)
+
+        if pending:
+            by_id = {protonotes[i].id: protonotes[i] for i in pending}
+
+            async def on_delivered(entries: list[JournalEntry]) -> None:
+                for entry in entries:
+                    result = _export_result_from(by_id[entry.key], entry)
+                    await llm_messages.asend(
+                        LlmChatMessage(role="export", text=_describe(result))
+                    )
+
+            entries = await self._exporter.export(
+                [
+                    (protonotes[i].id, await self._attach_media(notes[i]))
+                    for i in pending
+                ],
+                on_delivered,
+            )
+            for i, entry in zip(pending, entries):
+                results[i] = _export_result_from(protonotes[i], entry)
+                if entry.note_id is not None:
+                    self._duplicates.add(entry.note_id, keys[i])
+
+        exported = [r for r in results if r is not None]
+        added = sum(r.ok and not r.queued for r in exported)
+        text = f"Exported {added} of {len(exported)} protonotes"
+        if queued := sum(r.queued for r in exported):
+            text += f", {queued} queued until Anki is reachable"
+        await llm_messages.asend(LlmChatMessage(role="export-complete", text=text))
+        return exported
+
+    async def _validated(self, note: NoteData) -> NoteData:
+        try:
+            return await self._schema.validate(note)
+        except InvalidNoteError:
+            raise
+        except AnkiConnectClientError as e:
+            # NOTE: Unreachable Anki is not a reason to reject the note - it gets journaled instead
+            self._logger.warn("Failed to validate note", exc_info=e)
+            return note
+
+    async def _duplicate_key(self, note: NoteData) -> DuplicateKey | None:
+        try:
+            return await self._duplicates.key_of(note)
+        except AnkiConnectClientError:
+            return None
+
+    async def _attach_media(self, note: NoteData) -> NoteData:
+        try:
+            return await self._media.attach(note)
+        except AnkiConnectClientError as e:
+            # NOTE: AnkiConnect can still store the media itself when the note is added
+            self._logger.warn("Failed to upload note media", exc_info=e)
+            return note
+
+    def _notedata_from(self, protonote: Protonote) -> NoteData:
+        return notedata_from(protonote, deck_name=self._deck_name)
+
+
+_extractions_adapter = pydantic.TypeAdapter(list[Extraction])
+
+
+async def _ignore(_: t.Any) -> None:
+    pass
+
+
+def _identity_of(extraction: Extraction) -> tuple[str, str]:
+    def normalized(text: str | None) -> str:
+        return " ".join((text or "").split()).casefold()
+
+    return normalized(extraction.snippet), normalized(extraction.context)
+
+
+_followers = itertools.count()
+
+
+class _Restreamed:
+    """Gives streamed messages ids of their own, so that followers of a flight don't interleave."""
+
+    def __init__(self, sink: Sink[LlmChatMessage]) -> None:
+        self._sink = sink
+        self._follower = next(_followers)
+
+    async def asend(self, msg: LlmChatMessage) -> None:
+        if msg.stream_id is not None:
+            msg = dataclasses.replace(
+                msg, stream_id=f"{msg.stream_id}/{self._follower}"
+            )
+        await self._sink.asend(msg)
+
+
+def _export_result_from(
+    protonote: Protonote, entry: JournalEntry
+) -> ProtonoteExportResult:
+    match entry.state:
+        case "done" if entry.note_id is not None:
+            return ProtonoteExportResult(protonote=protonote, note_id=entry.note_id)
+        case "done":
+            return ProtonoteExportResult(
+                protonote=protonote, error="Exported, but the note is not known"
+            )
+        case "failed":
+            return ProtonoteExportResult(protonote=protonote, error=entry.error)
+        case _:
+            return ProtonoteExportResult(protonote=protonote, queued=True)
+
+
+def _describe(result: ProtonoteExportResult) -> str:
+    if result.queued:
+        return f"Queued {result.protonote.description}"
+    if result.ok:
+        return f"Exported {result.protonote.description} as note {result.note_id}"
+    return f"Failed to export {result.protonote.description}: {result.error}"
@@ -0,0 +1,318 @@
+import asyncio as aio
+import json
+import sqlite3
+import time
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from aicards.misc.logging import LoggerLike, null_logger
+from aicards.misc.ankiconnect_client import (
+    AnkiClientLike,
+    AnkiConnectAPIError,
+    AnkiConnectClientError,
+    AnkiSchemaError,
+    NoteData,
+    NoteInfo,
+)
+from aicards.misc.anki_duplicates import escape_query
+
+type JournalState = t.Literal["sent", "done", "failed"]
+type JournalOutcome = tuple[str, JournalState, int | None, str | None]
+type OnDelivered = t.Callable[[list[JournalEntry]], t.Awaitable[None]]
+
+_schema = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    note TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL REFERENCES entries (key),
+    state TEXT NOT NULL,
+    note_id INTEGER,
+    error TEXT,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outcomes_by_key ON outcomes (key, id);
+"""
+
+_latest = """
+SELECT e.key, e.note, o.state, o.note_id, o.error
+FROM entries e
+LEFT JOIN outcomes o ON o.id = (SELECT max(id) FROM outcomes WHERE key = e.key)
+"""
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    key: str
+    note: NoteData
+    state: JournalState | None = None
+    note_id: int | None = None
+    error: str | None = None
+
+
+class ExportJournal:
+    """
+    Append-only log of notes to be exported, keyed by idempotency key.
+
+    Every delivery attempt and its outcome is appended, so the latest outcome tells whether a note
+    still has to reach Anki.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+        self._conn.executescript(_schema)
+
+    @classmethod
+    def open(cls, path: Path | t.Literal[":memory:"]) -> t.Self:
+        if path != ":memory:":
+            path.parent.mkdir(parents=True, exist_ok=True)
+        return cls(sqlite3.connect(path))
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def append(self, entries: t.Iterable[tuple[str, NoteData]]) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entries (key, note, created_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(note), now) for key, note in entries],
+            )
+
+    def record(self, outcomes: t.Iterable[JournalOutcome]) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO outcomes (key, state, note_id, error, at) VALUES (?, ?, ?, ?, ?)",
+                [(*outcome, now) for outcome in outcomes],
+            )
+
+    def lookup(self, keys: t.Sequence[str]) -> list[JournalEntry]:
+        placeholders = ", ".join("?" * len(keys))
+        rows = self._conn.execute(f"{_latest} WHERE e.key IN ({placeholders})", keys)
+        entries = {row[0]: _entry_from(row) for row in rows}
+        return [entries[key] for key in keys]
+
+    def backlog(self, limit: int) -> list[JournalEntry]:
+        """Entries that have not been confirmed by Anki yet, oldest first."""
+        rows = self._conn.execute(
+            f"{_latest} WHERE o.state IS NULL OR o.state = 'sent' "
+            "ORDER BY e.created_at LIMIT ?",
+            (limit,),
+        )
+        return [_entry_from(row) for row in rows]
+
+
+def _entry_from(row: tuple) -> JournalEntry:
+    key, note, state, note_id, error = row
+    return JournalEntry(key, json.loads(note), state, note_id, error)
+
+
+class JournaledExporter:
+    """Writes notes to the journal before delivering them, and replays whatever didn't make it."""
+
+    def __init__(
+        self,
+        journal: ExportJournal,
+        client: AnkiClientLike,
+        batch_size: int = 50,
+        max_in_flight: int = 4,
+        replay_interval: float = 30.0,
+        on_schema_error: t.Callable[[], None] | None = None,
+        logger: LoggerLike = null_logger,
+    ) -> None:
+        """`on_schema_error` is called whenever Anki rejects a note for its deck, model or fields."""
+        self._journal = journal
+        self._client = client
+        self._batch_size = batch_size
+        self._max_in_flight = max_in_flight
+        self._replay_interval = replay_interval
+        self._on_schema_error = on_schema_error
+        self._logger = logger
+        self._lock = aio.Lock()
+
+    async def export(
+        self,
+        notes: t.Sequence[tuple[str, NoteData]],
+        on_delivered: OnDelivered | None = None,
+    ) -> list[JournalEntry]:
+        """
+        Deliver notes not yet in Anki, up to `max_in_flight` batches at a time.
+
+        Entries left without a terminal state stay queued for replay. `on_delivered` is awaited
+        with the latest entries of every batch as soon as that batch settles.
+        """
+        self._journal.append(notes)
+        keys = [key for key, _ in notes]
+
+        async with self._lock:
+            entries = [e for e in self._journal.lookup(keys) if e.state != "done"]
+            if errors := await self._deliver_concurrently(entries, on_delivered):
+                self._logger.warn(
+                    "Anki is unreachable, export is queued", exc_info=errors[0]
+                )
+
+        return self._journal.lookup(keys)
+
+    async def replaying(self) -> t.NoReturn:
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                # NOTE: Whatever went wrong this time, journaled notes must keep being retried
+                self._logger.error("Journal replay failed", exc_info=e)
+            await aio.sleep(self._replay_interval)
+
+    async def drain(self) -> int:
+        replayed = 0
+        async with self._lock:
+            while batch := self._journal.backlog(
+                self._batch_size * self._max_in_flight
+            ):
+                if errors := await self._deliver_concurrently(batch):
+                    self._logger.debug("Journal replay postponed", exc_info=errors[0])
+                    break
+                replayed += len(batch)
+
+        if replayed:
+            self._logger.info("Replayed %(count)d journaled notes", {"count": replayed})
+        return replayed
+
+    async def _deliver_concurrently(
+        self,
+        entries: t.Sequence[JournalEntry],
+        on_delivered: OnDelivered | None = None,
+    ) -> list[AnkiConnectClientError]:
+        """Deliver entries in batches; a batch that fails leaves the others intact."""
+        semaphore = aio.Semaphore(self._max_in_flight)
+
+        async def deliver(batch: t.Sequence[JournalEntry]) -> None:
+            async with semaphore:
+                try:
+                    await self._deliver(batch)
+                finally:
+                    if on_delivered is not None:
+                        await on_delivered(self._journal.lookup([e.key for e in batch]))
+
+        outcomes = await aio.gather(
+            *(
+                deliver(entries[i : i + self._batch_size])
+                for i in range(0, len(entries), self._batch_size)
+            ),
+            return_exceptions=True,
+        )
+
+        errors = []
+        for outcome in outcomes:
+            if isinstance(outcome, AnkiConnectClientError):
+                errors.append(outcome)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+        return errors
+
+    async def _deliver(
+        self, entries: t.Sequence[JournalEntry], resolving: bool = False
+    ) -> None:
+        # NOTE: Notes Anki won't take are failed up front, so a failing batch is rare and its
+        #       duplicates can only be notes of the batch itself. Entries that were sent without
+        #       a confirmation may have already been added - their note is looked up then.
+        entries = [e for e in entries if e.state != "done"]
+        checks = await self._client.can_add_notes_with_error_detail(
+            [e.note for e in entries]
+        )
+        rejected = [
+            (entry, error)
+            for entry, check in zip(entries, checks)
+            if (error := check.exception()) is not None
+        ]
+        self._check_schema(error for _, error in rejected)
+        delivered = await self._delivered(
+            [
+                e
+                for e, error in rejected
+                if e.state == "sent" and "duplicate" in str(error)
+            ]
+        )
+        self._journal.record(
+            (
+                (entry.key, "done", delivered[entry.key], None)
+                if entry.key in delivered
+                else (entry.key, "failed", None, str(error))
+            )
+            for entry, error in rejected
+        )
+
+        settled = {entry.key for entry, _ in rejected}
+        entries = [e for e in entries if e.key not in settled]
+        if not entries:
+            return
+
+        self._journal.record((e.key, "sent", None, None) for e in entries)
+
+        try:
+            outcomes = await self._client.add_notes([e.note for e in entries])
+        except AnkiConnectAPIError as e:
+            # NOTE: AnkiConnect fails addNotes as a whole for a single bad note, yet keeps the
+            #       notes it has added - the entries stay sent and are resolved one by one
+            if resolving:
+                self._logger.warn(
+                    "Batch of %(count)d notes failed again, left for replay",
+                    {"count": len(entries)},
+                    exc_info=e,
+                )
+                return
+            self._logger.debug(
+                "Batch of %(count)d notes failed, resolving notes one by one",
+                {"count": len(entries)},
+                exc_info=e,
+            )
+            await self._deliver(
+                self._journal.lookup([e.key for e in entries]), resolving=True
+            )
+            return
+
+        self._check_schema(outcomes)
+        self._journal.record(
+            (
+                (entry.key, "failed", None, str(outcome))
+                if isinstance(outcome, Exception)
+                else (entry.key, "done", outcome, None)
+            )
+            for entry, outcome in zip(entries, outcomes)
+        )
+
+    def _check_schema(self, outcomes: t.Iterable[object]) -> None:
+        if self._on_schema_error is not None and any(
+            isinstance(outcome, AnkiSchemaError) for outcome in outcomes
+        ):
+            self._on_schema_error()
+
+    async def _delivered(self, entries: t.Sequence[JournalEntry]) -> dict[str, int]:
+        """Ids of the notes in Anki the entries have been delivered as, by entry key."""
+        by_deck: dict[str, list[JournalEntry]] = {}
+        for entry in entries:
+            by_deck.setdefault(entry.note.get("deckName", "Default"), []).append(entry)
+
+        delivered = {}
+        for deck_name, deck_entries in by_deck.items():
+            note_ids = await self._client.find_notes(
+                f'deck:"{escape_query(deck_name)}"'
+            )
+            infos = await self._client.notes_info(note_ids)
+            for entry in deck_entries:
+                matches = [info.noteId for info in infos if _is_note_of(entry, info)]
+                if matches:
+                    delivered[entry.key] = max(matches)
+        return delivered
+
+
+def _is_note_of(entry: JournalEntry, info: NoteInfo) -> bool:
+    fields = entry.note.get("fields", {})
+    return info.modelName == entry.note.get("modelName") and all(
+        name in info.fields and info.fields[name].value == value
+        for name, value in fields.items()
+    )
@@ -0,0 +1,73 @@
+import asyncio as aio
+import typing as t
+
+
+class Sink[T](t.Protocol):
+    async def asend(self, value: T) -> None: ...
+
+
+class Flight[R]:
+    """
+    Single run of a coroutine shared by every caller that joined it.
+
+    Values the run sends to its channels are recorded, so that late joiners get them replayed.
+    """
+
+    def __init__(self, channels: int) -> None:
+        self._history: list[tuple[int, t.Any]] = []
+        self._changed = aio.Event()
+        self.channels = [_Channel(self, i) for i in range(channels)]
+        self.task: aio.Task[R]
+
+    def start(self, coro: t.Coroutine[t.Any, t.Any, R]) -> None:
+        self.task = aio.create_task(coro)
+        self.task.add_done_callback(lambda _: self._changed.set())
+
+    async def follow(self, *sinks: Sink[t.Any]) -> R:
+        """Forward everything sent so far and from now on to the sinks, then return the result."""
+        forwarded = 0
+        while True:
+            while forwarded < len(self._history):
+                channel, value = self._history[forwarded]
+                forwarded += 1
+                await sinks[channel].asend(value)
+            if self.task.done():
+                return self.task.result()
+            self._changed.clear()
+            await self._changed.wait()
+
+    def _record(self, channel: int, value: t.Any) -> None:
+        self._history.append((channel, value))
+        self._changed.set()
+
+
+class _Channel:
+    def __init__(self, flight: Flight, index: int) -> None:
+        self._flight = flight
+        self._index = index
+
+    async def asend(self, value: t.Any) -> None:
+        self._flight._record(self._index, value)
+
+
+class SingleFlight:
+    """Deduplicates concurrent runs by key: a run started while an identical one is in flight joins it."""
+
+    def __init__(self) -> None:
+        self._flights: dict[str, Flight] = {}
+
+    def join[R](
+        self,
+        key: str,
+        start: t.Callable[..., t.Coroutine[t.Any, t.Any, R]],
+        channels: int = 1,
+    ) -> tuple[Flight[R], bool]:
+        """Flight for the key, started with its channels as arguments unless already in flight."""
+        if (flight := self._flights.get(key)) is not None:
+            return flight, True
+
+        flight = Flight[R](channels)
+        flight.start(start(*flight.channels))
+        self._flights[key] = flight
+        flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        return flight, False
@@ -1,9 +1,9 @@
 import asyncio as aio
 import base64
 import json
-import textwrap
 import typing as t
 import contextlib
+import dataclasses
 from dataclasses import dataclass as native_dataclass
 
 import pydantic
@@ -12,7 +12,47 @@ import openai.types.chat
 from openai import AsyncOpenAI
 from pydantic.dataclasses import dataclass
 
-from aicards.ctx.aicards.base import Extraction, Image, Protonote
+from aicards.misc import imaging
+from aicards.misc.logging import LoggerLike, null_logger
+from aicards.ctx.aicards.base import (
+    Extraction,
+    ExtractionWithPrototonotes,
+    Image,
+)
+from aicards.ctx.aicards.core.ai._batching import (
+    BatchExtractionResult,
+    BatchingOptions,
+    pack,
+)
+from aicards.ctx.aicards.core.ai._cache import ResponseCache, cache_key
+from aicards.ctx.aicards.core.ai._schemas import strict_response_format
+from aicards.ctx.aicards.core.ai._streaming import JsonArrayItems
+from aicards.ctx.aicards.core.ai._drafts import ProtonoteDraft, ProtonoteDraftsResponse
+from aicards.ctx.aicards.core.ai._prompting import (
+    PrefixCacheEstimate,
+    PromptPrefix,
+    count_tokens,
+    fit_contexts,
+)
+from aicards.ctx.aicards.core.ai._prompts import (
+    BATCH_EXTRACTION_PROMPT,
+    EXTRACTION_PROMPT,
+    PROTONOTES_PROMPT,
+)
+from aicards.ctx.aicards.core.ai._routing import HedgeMetrics, Route, Router
+from aicards.ctx.aicards.core.ai._scheduler import (
+    Priority,
+    RateLimits,
+    RequestScheduler,
+    estimate_tokens,
+)
+from aicards.ctx.aicards.core.ai._telemetry import (
+    CallStats,
+    LlmTelemetry,
+    Prices,
+    Stage,
+    StageSummary,
+)
 
 
 @dataclass(frozen=True)
@@ -28,7 +68,9 @@ class ProtonotesGenerationResult:
     message: str = pydantic.Field(
         description="User-friendly message to be shown to the user for this processing stage in the chat view/log",
     )
-    protonotes: tuple[Protonote, ...] = pydantic.Field()
+    results: tuple[ExtractionWithPrototonotes, ...] = pydantic.Field()
+    # Extractions no protonotes could be generated for
+    failed: tuple[Extraction, ...] = ()
 
 
 class AiResponse[R](t.Awaitable[R]):
@@ -45,7 +87,7 @@ class AiResponse[R](t.Awaitable[R]):
 
 
 _extraction_json_schema = json.dumps(
-    pydantic.TypeAdapter(Extraction).json_schema(),
+    pydantic.TypeAdapter(ExtractionResult).json_schema(),
     indent=2,
     ensure_ascii=False,
     # most concise format
@@ -53,67 +95,620 @@ _extraction_json_schema = json.dumps(
 )
 
 
+_extraction_adapter = pydantic.TypeAdapter(Extraction)
+_extraction_result_adapter = pydantic.TypeAdapter(ExtractionResult)
+_extractions_adapter = pydantic.TypeAdapter(list[Extraction])
+_batch_extraction_adapter = pydantic.TypeAdapter(BatchExtractionResult)
+_drafts_response_adapter = pydantic.TypeAdapter(ProtonoteDraftsResponse)
+_drafts_adapter = pydantic.TypeAdapter(tuple[ProtonoteDraft, ...])
+
+_batch_extraction_json_schema = json.dumps(
+    _batch_extraction_adapter.json_schema(),
+    indent=2,
+    ensure_ascii=False,
+    separators=(",", ": "),
+)
+
+_drafts_json_schema = json.dumps(
+    _drafts_response_adapter.json_schema(),
+    indent=2,
+    ensure_ascii=False,
+    separators=(",", ": "),
+)
+
+_extraction_response_format = strict_response_format(
+    "extraction_result", _extraction_result_adapter
+)
+_batch_extraction_response_format = strict_response_format(
+    "batch_extraction_result", _batch_extraction_adapter
+)
+_drafts_response_format = strict_response_format(
+    "protonote_drafts", _drafts_response_adapter
+)
+
+
+def _schema_in_prompt(prompt: str, schema: str) -> PromptPrefix:
+    """Prefix for providers without structured outputs, constrained by the prompt alone."""
+    return PromptPrefix(
+        f"{prompt}\n\nYour response must adhere to the following schema: {schema}",
+        {"type": "json_object"},
+    )
+
+
+# NOTE: Keyed by stage and whether the schema is strict
+_prefixes: dict[tuple[Stage, bool], PromptPrefix] = {
+    ("extraction", True): PromptPrefix(EXTRACTION_PROMPT, _extraction_response_format),
+    ("extraction", False): _schema_in_prompt(
+        EXTRACTION_PROMPT, _extraction_json_schema
+    ),
+    ("batch-extraction", True): PromptPrefix(
+        BATCH_EXTRACTION_PROMPT, _batch_extraction_response_format
+    ),
+    ("batch-extraction", False): _schema_in_prompt(
+        BATCH_EXTRACTION_PROMPT, _batch_extraction_json_schema
+    ),
+    ("protonotes", True): PromptPrefix(PROTONOTES_PROMPT, _drafts_response_format),
+    ("protonotes", False): _schema_in_prompt(PROTONOTES_PROMPT, _drafts_json_schema),
+}
+
+# Prompt tokens per call, images excluded
+default_prompt_budgets: t.Mapping[Stage, int] = {
+    "extraction": 2_000,
+    "protonotes": 6_000,
+}
+
+
+type _OpenedStream = tuple[
+    openai.AsyncStream[openai.types.chat.ChatCompletionChunk],
+    openai.types.chat.ChatCompletionChunk | None,
+]
+
+type OnToken = t.Callable[[str], t.Awaitable[None]]
+type OnExtraction = t.Callable[[Extraction], t.Awaitable[None]]
+
+
+async def _ignore(_: t.Any) -> None:
+    pass
+
+
 @native_dataclass(frozen=True)
 class AiClient:
     @classmethod
     @contextlib.asynccontextmanager
-    async def running(cls, client: AsyncOpenAI) -> t.AsyncIterator[t.Self]:
-        yield cls(client)
+    async def running(
+        cls,
+        client: AsyncOpenAI,
+        model: str = "gpt-4o-mini",
+        cache: ResponseCache | None = None,
+        protonote_cache: ResponseCache | None = None,
+        scheduler: RequestScheduler | None = None,
+        telemetry: LlmTelemetry | None = None,
+        router: Router | None = None,
+        strict_schema: bool = True,
+        prompt_budgets: t.Mapping[Stage, int] = default_prompt_budgets,
+        logger: LoggerLike = null_logger,
+    ) -> t.AsyncIterator[t.Self]:
+        """
+        With `strict_schema`, responses are constrained to the schemas with structured outputs;
+        otherwise, for providers lacking them, the schemas are pasted into the prompts.
+        """
+        yield cls(
+            client,
+            model,
+            cache,
+            protonote_cache,
+            scheduler,
+            LlmTelemetry() if telemetry is None else telemetry,
+            router,
+            strict_schema,
+            prompt_budgets,
+            PrefixCacheEstimate(),
+            logger,
+        )
 
     _client: AsyncOpenAI
+    _model: str = "gpt-4o-mini"
+    _cache: ResponseCache | None = None
+    # Drafts per extraction, tagged with the extraction's normalized snippet
+    _protonote_cache: ResponseCache | None = None
+    _scheduler: RequestScheduler | None = None
+    _telemetry: LlmTelemetry = dataclasses.field(default_factory=LlmTelemetry)
+    _router: Router | None = None
+    _strict_schema: bool = True
+    _prompt_budgets: t.Mapping[Stage, int] = dataclasses.field(
+        default_factory=lambda: default_prompt_budgets
+    )
+    _prefix_cache: PrefixCacheEstimate = dataclasses.field(
+        default_factory=PrefixCacheEstimate
+    )
+    _logger: LoggerLike = null_logger
+
+    @property
+    def telemetry(self) -> LlmTelemetry:
+        return self._telemetry
 
     def get_extractions_from_image(
         self,
         image: Image,
+        bypass_cache: bool = False,
+        on_token: OnToken = _ignore,
+        on_extraction: OnExtraction = _ignore,
     ) -> AiResponse[ExtractionResult]:
-        # fmt: off
-        prompt = textwrap.dedent(f"""\
-        From this image, extract the information user has emphasized and wants to memorize for his language learning.                
-        Your request must adhere to the following schema: {_extraction_json_schema}
-        """.strip()
+        """
+        Stream extractions out of the image.
+
+        `on_token` receives the raw response as it arrives and `on_extraction` every extraction as
+        soon as its JSON object is complete, well before the response as a whole.
+        """
+        prefix = _prefixes["extraction", self._strict_schema]
+
+        async def impl() -> tuple[ExtractionResult, str]:
+            messages = prefix.messages(
+                {"role": "user", "content": [_image_part(image)]}
+            )
+            if prefix.tokens > self._prompt_budgets.get("extraction", prefix.tokens):
+                self._logger.warn(
+                    "Extraction prompt exceeds its budget of %(budget)d tokens",
+                    {
+                        "tokens": prefix.tokens,
+                        "budget": self._prompt_budgets["extraction"],
+                    },
+                )
+
+            with self._measured("extraction", messages, image, prefix) as stats:
+
+                async def opened(model: str) -> _OpenedStream:
+                    stream = await self._call(
+                        "interactive",
+                        estimate_tokens(prefix.system, images=1),
+                        lambda client: client.chat.completions.create(
+                            model=model,
+                            response_format=prefix.response_format,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                            messages=messages,
+                        ),
+                        stats,
+                    )
+                    # NOTE: Routing races streams to their first chunk, the rest is read from the winner only
+                    try:
+                        return stream, await anext(stream, None)
+                    except BaseException:
+                        await stream.close()
+                        raise
+
+                stream, first = await self._routed(
+                    "extraction", opened, stats, lambda lost: lost[0].close()
+                )
+
+                scanner = JsonArrayItems("extractions")
+                content: list[str] = []
+                refusal: list[str] = []
+                async for chunk in _prepended(first, stream):
+                    stats.used(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].delta.refusal:
+                        refusal.append(chunk.choices[0].delta.refusal)
+                    if not (delta := chunk.choices[0].delta.content):
+                        continue
+                    stats.first_token()
+                    content.append(delta)
+                    await on_token(delta)
+                    for item in scanner.feed_raw(delta):
+                        try:
+                            extraction = _extraction_adapter.validate_json(item)
+                        except pydantic.ValidationError as e:
+                            # NOTE: Whole response is validated once complete, failing loudly there
+                            self._logger.debug(
+                                "Skipped malformed extraction", exc_info=e
+                            )
+                            continue
+                        await on_extraction(extraction)
+
+                if refusal:
+                    raise ValueError(f"Model refused to extract: {''.join(refusal)}")
+                result = _extraction_result_adapter.validate_json("".join(content))
+                return result, stats.model
+
+        async def replay(result: ExtractionResult) -> None:
+            for extraction in result.extractions:
+                await on_extraction(extraction)
+
+        def key(model: str) -> str:
+            return cache_key(image.data, prefix.key, model)
+
+        return AiResponse(prefix.system, self._cached(key, impl, bypass_cache, replay))
+
+    def get_extractions_from_images(
+        self,
+        images: t.Sequence[Image],
+        bypass_cache: bool = False,
+    ) -> AiResponse[list[ExtractionResult]]:
+        """
+        Extractions out of several images with a single request, a result per image in their order.
+
+        Cached images aren't sent again. A response missing any of the images fails as a whole.
+        """
+        prefix = _prefixes["batch-extraction", self._strict_schema]
+        model = self._model_for("batch-extraction")
+        keys = [cache_key(image.data, prefix.key, model) for image in images]
+
+        async def impl() -> list[ExtractionResult]:
+            results: dict[int, ExtractionResult] = {}
+            if self._cache is not None and not bypass_cache:
+                for i, key in enumerate(keys):
+                    if (cached := self._cache.get(key)) is not None:
+                        results[i] = _extraction_result_adapter.validate_json(cached)
+                self._logger.debug(
+                    "Extraction cache has %(hits)d of %(count)d batched images",
+                    {"hits": len(results), "count": len(images)},
+                )
+
+            misses = [i for i in range(len(images)) if i not in results]
+            if misses:
+                batch, answered_by = await self._extract_batch(
+                    [images[i] for i in misses], prefix
+                )
+                per_image = batch.extractions_by_index(len(misses))
+                for i, extractions in zip(misses, per_image):
+                    results[i] = ExtractionResult(
+                        message=batch.message, extractions=extractions
+                    )
+                    if self._cache is not None:
+                        self._cache.put(
+                            cache_key(images[i].data, prefix.key, answered_by),
+                            _extraction_result_adapter.dump_json(results[i]),
+                        )
+            return [results[i] for i in range(len(images))]
+
+        return AiResponse(prefix.system, impl())
+
+    async def _extract_batch(
+        self, images: t.Sequence[Image], prefix: PromptPrefix
+    ) -> tuple[BatchExtractionResult, str]:
+        messages = prefix.messages(
+            {"role": "user", "content": [_image_part(image) for image in images]}
         )
-        # fmt: on
-
-        async def impl():
-            return ExtractionResult(
-                message="test",
-                extractions=(
-                    Extraction(
-                        reason="test",
-                        snippet="test",
-                        context=None,
-                        comment=None,
+        with self._measured("batch-extraction", messages, None, prefix) as stats:
+            response = await self._routed(
+                "batch-extraction",
+                lambda model: self._call(
+                    "interactive",
+                    estimate_tokens(prefix.system, images=len(images)),
+                    lambda client: client.chat.completions.create(
+                        model=model,
+                        response_format=prefix.response_format,
+                        messages=messages,
                     ),
+                    stats,
                 ),
+                stats,
             )
-            b64_image = _to_base64_image(image)
-            # Call the OpenAI API
-            response = await self._client.chat.completions.create(
-                model="gpt-4o-mini",
-                response_format={"type": "json_object"},
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
+            stats.used(response.usage)
+
+            message = response.choices[0].message
+            if message.refusal:
+                raise ValueError(f"Model refused to extract: {message.refusal}")
+            result = _batch_extraction_adapter.validate_json(message.content or "")
+            return result, stats.model
+
+    async def _cached(
+        self,
+        key: t.Callable[[str], str],
+        impl: t.Callable[[], t.Awaitable[tuple[ExtractionResult, str]]],
+        bypass: bool,
+        on_hit: t.Callable[[ExtractionResult], t.Awaitable[None]],
+    ) -> ExtractionResult:
+        """
+        Result of `impl` cached under the key of the model that answered.
+
+        Only answers of the stage's preferred model are looked up, so hedges and fallbacks
+        to other models don't stand in for it.
+        """
+        if self._cache is None:
+            result, _ = await impl()
+            return result
+
+        preferred = key(self._model_for("extraction"))
+        if not bypass and (cached := self._cache.get(preferred)) is not None:
+            self._log_cache("hit", preferred)
+            result = _extraction_result_adapter.validate_json(cached)
+            await on_hit(result)
+            return result
+
+        self._log_cache("bypass" if bypass else "miss", preferred)
+        result, model = await impl()
+        self._cache.put(key(model), _extraction_result_adapter.dump_json(result))
+        return result
+
+    def _log_cache(self, outcome: str, key: str) -> None:
+        assert self._cache is not None
+        self._logger.debug(
+            "Extraction cache %(outcome)s (%(hits)d hits, %(misses)d misses)",
+            {
+                "outcome": outcome,
+                "key": key,
+                "hits": self._cache.hits,
+                "misses": self._cache.misses,
+            },
+        )
+
+    async def _call[R](
+        self,
+        priority: Priority,
+        tokens: int,
+        call: t.Callable[[AsyncOpenAI], t.Awaitable[R]],
+        stats: CallStats,
+    ) -> R:
+        def attempt(client: AsyncOpenAI) -> t.Awaitable[R]:
+            stats.attempted()
+            return call(client)
+
+        if self._scheduler is None:
+            return await attempt(self._client)
+
+        # NOTE: 429s are retried by the scheduler, which pauses every call instead of just one
+        client = self._client.with_options(max_retries=0)
+        return await self._scheduler.run(priority, tokens, lambda: attempt(client))
+
+    def _model_for(self, stage: Stage) -> str:
+        """Model a call of the stage is meant to be answered by."""
+        if self._router is None or not self._router.handles(stage):
+            return self._model
+        return self._router.preferred(stage)
+
+    async def _routed[R](
+        self,
+        stage: Stage,
+        attempt: t.Callable[[str], t.Coroutine[t.Any, t.Any, R]],
+        stats: CallStats,
+        discard: t.Callable[[R], t.Awaitable[None]] | None = None,
+    ) -> R:
+        """Make the call with the configured model, or as the router decides if it routes the stage."""
+        if self._router is None or not self._router.handles(stage):
+            return await attempt(self._model)
+
+        result, stats.model = await self._router.run(stage, attempt, discard)
+        return result
+
+    @contextlib.contextmanager
+    def _measured(
+        self,
+        stage: Stage,
+        messages: t.Sequence[openai.types.chat.ChatCompletionMessageParam],
+        image: Image | None,
+        prefix: PromptPrefix,
+    ) -> t.Iterator[CallStats]:
+        """Time the LLM call made in the block and record what it cost, on a span and in the telemetry."""
+        stats = CallStats(stage, self._model, len(json.dumps(messages)))
+        stats.estimated_cached_tokens = self._prefix_cache.cached_tokens(prefix)
+        self._logger.debug(
+            "Prompt of %(stage)s call has a %(prefix)d token static prefix, ~%(cached)d cached",
+            {
+                "stage": stage,
+                "prefix": prefix.tokens,
+                "cached": stats.estimated_cached_tokens,
+            },
+        )
+        if image is not None:
+            with contextlib.suppress(ValueError):
+                stats.image_width, stats.image_height = imaging.dimensions(image.data)
+
+        with self._logger.span(
+            "LLM %(stage)s call", {"stage": stage, "model": self._model}
+        ) as logger:
+            try:
+                yield stats
+            except BaseException as e:
+                stats.error = type(e).__name__
+                raise
+            finally:
+                stats.finish()
+                self._telemetry.record(stats)
+                logger.info(
+                    "LLM %(stage)s call took %(latency).2fs", stats.as_context()
+                )
+
+    async def generate_protonotes(
+        self,
+        extractions: t.Sequence[Extraction],
+        batch_size: int = 5,
+        max_in_flight: int = 4,
+        attempts: int = 2,
+    ) -> ProtonotesGenerationResult:
+        """
+        Generate protonotes with one request per `batch_size` extractions, `max_in_flight` at a time.
+
+        Extractions whose protonotes are cached aren't sent at all. A batch whose response stays
+        malformed after `attempts` tries is reported in `failed` instead of failing the other batches.
+        """
+        semaphore = aio.Semaphore(max_in_flight)
+        drafts: dict[int, tuple[ProtonoteDraft, ...]] = self._cached_drafts(extractions)
+        misses = [i for i in range(len(extractions)) if i not in drafts]
+
+        async def generate(
+            batch: t.Sequence[Extraction],
+        ) -> list[tuple[ProtonoteDraft, ...]] | None:
+            async with semaphore:
+                for attempt in range(1, attempts + 1):
+                    try:
+                        generated, model = await self._generate_batch(batch)
+                        self._cache_drafts(batch, generated, model)
+                        return generated
+                    except (ValueError, openai.APIError) as e:
+                        self._logger.warn(
+                            "Protonotes generation failed for a batch of %(size)d "
+                            "(attempt %(attempt)d of %(attempts)d)",
                             {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{b64_image}"
-                                },
+                                "size": len(batch),
+                                "attempt": attempt,
+                                "attempts": attempts,
                             },
-                        ],
-                    }
-                ],
+                            exc_info=e,
+                        )
+                return None
+
+        batches = [
+            misses[i : i + batch_size] for i in range(0, len(misses), batch_size)
+        ]
+        generated = await aio.gather(
+            *(generate([extractions[i] for i in b]) for b in batches)
+        )
+        for batch, batch_drafts in zip(batches, generated):
+            if batch_drafts is not None:
+                drafts.update(zip(batch, batch_drafts))
+
+        results: list[ExtractionWithPrototonotes] = []
+        failed: list[Extraction] = []
+        for i, extraction in enumerate(extractions):
+            if i not in drafts:
+                failed.append(extraction)
+                continue
+            results.append(
+                ExtractionWithPrototonotes(
+                    extraction=extraction,
+                    protonotes=tuple(d.to_protonote() for d in drafts[i]),
+                )
             )
 
-        return AiResponse(prompt, impl())
+        message = (
+            f"Generated protonotes for {len(results)} of {len(extractions)} "
+            f"extractions in {len(batches)} requests"
+        )
+        if cached := len(extractions) - len(misses):
+            message += f", {cached} from cache"
+        if failed:
+            message += f"; {len(failed)} failed"
+        return ProtonotesGenerationResult(
+            message=message,
+            results=tuple(results),
+            failed=tuple(failed),
+        )
 
-    async def generate_protonotes(
+    def invalidate_protonotes(self, snippet: str | None = None) -> int:
+        """Forget cached protonotes of a snippet in any context, or of everything."""
+        if self._protonote_cache is None:
+            return 0
+        return self._protonote_cache.invalidate(
+            None if snippet is None else _normalized(snippet)
+        )
+
+    def _cached_drafts(
+        self, extractions: t.Sequence[Extraction]
+    ) -> dict[int, tuple[ProtonoteDraft, ...]]:
+        if self._protonote_cache is None:
+            return {}
+
+        drafts = {}
+        model = self._model_for("protonotes")
+        for i, extraction in enumerate(extractions):
+            cached = self._protonote_cache.get(self._drafts_key(extraction, model))
+            if cached is not None:
+                drafts[i] = _drafts_adapter.validate_json(cached)
+        self._logger.debug(
+            "Protonote cache has %(hits)d of %(count)d extractions",
+            {
+                "hits": len(drafts),
+                "count": len(extractions),
+                "total_hits": self._protonote_cache.hits,
+                "total_misses": self._protonote_cache.misses,
+            },
+        )
+        return drafts
+
+    def _cache_drafts(
         self,
         extractions: t.Sequence[Extraction],
-    ) -> ProtonotesGenerationResult:
-        raise NotImplementedError()
+        drafts: t.Sequence[tuple[ProtonoteDraft, ...]],
+        model: str,
+    ) -> None:
+        if self._protonote_cache is None:
+            return
+        for extraction, extraction_drafts in zip(extractions, drafts):
+            self._protonote_cache.put(
+                self._drafts_key(extraction, model),
+                _drafts_adapter.dump_json(extraction_drafts),
+                tag=_normalized(extraction.snippet),
+            )
+
+    def _drafts_key(self, extraction: Extraction, model: str) -> str:
+        # NOTE: The drafts' schema stands for the note types they can be
+        return cache_key(
+            "protonotes",
+            _normalized(extraction.snippet),
+            cache_key(_normalized(extraction.context or "")),
+            _drafts_json_schema,
+            model,
+        )
+
+    async def _generate_batch(
+        self,
+        extractions: t.Sequence[Extraction],
+    ) -> tuple[list[tuple[ProtonoteDraft, ...]], str]:
+        prefix = _prefixes["protonotes", self._strict_schema]
+        if (budget := self._prompt_budgets.get("protonotes")) is not None:
+            fitted = fit_contexts(
+                extractions,
+                budget,
+                lambda es: prefix.tokens
+                + count_tokens(_extractions_adapter.dump_json(list(es)).decode()),
+            )
+            if fitted != list(extractions):
+                self._logger.debug(
+                    "Shortened extraction contexts to fit %(budget)d prompt tokens",
+                    {"budget": budget, "extractions": len(extractions)},
+                )
+            extractions = fitted
+        extractions_json = _extractions_adapter.dump_json(list(extractions)).decode()
+        messages = prefix.messages({"role": "user", "content": extractions_json})
+
+        with self._measured("protonotes", messages, None, prefix) as stats:
+            response = await self._routed(
+                "protonotes",
+                lambda model: self._call(
+                    "background",
+                    estimate_tokens(prefix.system, extractions_json),
+                    lambda client: client.chat.completions.create(
+                        model=model,
+                        response_format=prefix.response_format,
+                        messages=messages,
+                    ),
+                    stats,
+                ),
+                stats,
+            )
+            stats.used(response.usage)
+
+            message = response.choices[0].message
+            if message.refusal:
+                raise ValueError(f"Model refused to generate: {message.refusal}")
+            content = message.content or ""
+            drafts = _drafts_response_adapter.validate_json(content)
+            return drafts.drafts_by_index(len(extractions)), stats.model
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+async def _prepended[T](
+    first: T | None, rest: t.AsyncIterator[T]
+) -> t.AsyncIterator[T]:
+    if first is not None:
+        yield first
+    async for item in rest:
+        yield item
+
+
+def _image_part(
+    image: Image,
+) -> openai.types.chat.ChatCompletionContentPartImageParam:
+    b64_image = _to_base64_image(image)
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:{image.mime};base64,{b64_image}"},
+    }
 
 
 def _to_base64_image(image: Image) -> str:
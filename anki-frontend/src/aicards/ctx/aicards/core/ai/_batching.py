@@ -0,0 +1,79 @@
+import typing as t
+from dataclasses import dataclass as native_dataclass
+
+import pydantic
+from pydantic.dataclasses import dataclass
+
+from aicards.misc import imaging
+from aicards.ctx.aicards.base import Extraction, Image
+
+
+@dataclass(frozen=True)
+class ImageExtractions:
+    index: int = pydantic.Field(
+        description="Index of the image in the request these extractions are made from",
+    )
+    extractions: tuple[Extraction, ...] = pydantic.Field()
+
+
+@dataclass(frozen=True)
+class BatchExtractionResult:
+    message: str = pydantic.Field(
+        description="User-friendly message to be shown to the user for this processing stage in the chat view/log",
+    )
+    images: tuple[ImageExtractions, ...] = pydantic.Field(
+        description="Exactly one entry per image of the request",
+    )
+
+    def extractions_by_index(self, count: int) -> list[tuple[Extraction, ...]]:
+        """Extractions of every requested image, in request order."""
+        by_index = {r.index: r for r in self.images}
+        if sorted(by_index) != list(range(count)):
+            raise ValueError(
+                f"Expected results for images 0..{count - 1}, got {sorted(by_index)}"
+            )
+        return [by_index[i].extractions for i in range(count)]
+
+
+@native_dataclass(frozen=True)
+class BatchingOptions:
+    # Images packed into a single request at most; 1 disables batching
+    max_images: int = 8
+    # Encoded images per request
+    max_bytes: int = 8 * 1024 * 1024
+    # Estimated vision tokens of the images per request
+    max_tokens: int = 10_000
+
+
+def pack(images: t.Sequence[Image], options: BatchingOptions) -> list[list[int]]:
+    """
+    Indices of the images grouped into requests within the budgets, in order.
+
+    An image over budget on its own still gets a request of its own.
+    """
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    size = tokens = 0
+    for i, image in enumerate(images):
+        image_tokens = vision_tokens(image)
+        if batch and (
+            len(batch) >= options.max_images
+            or size + len(image.data) > options.max_bytes
+            or tokens + image_tokens > options.max_tokens
+        ):
+            batches.append(batch)
+            batch, size, tokens = [], 0, 0
+        batch.append(i)
+        size += len(image.data)
+        tokens += image_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def vision_tokens(image: Image) -> int:
+    try:
+        return imaging.estimate_vision_tokens(*imaging.dimensions(image.data))
+    except ValueError:
+        # NOTE: Whatever the provider makes of it, it's billed at most like the largest image
+        return imaging.estimate_vision_tokens(2048, 2048)
@@ -0,0 +1,122 @@
+import hashlib
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+
+_schema = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    tag TEXT
+);
+CREATE INDEX IF NOT EXISTS results_by_use ON results (used_at);
+"""
+
+
+def cache_key(*parts: str | bytes) -> str:
+    """Content address of everything that determines an LLM response."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else part
+        # NOTE: Length prefix keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent store of serialized LLM responses, keyed by `cache_key`.
+
+    Entries older than `max_age` are never returned; once the total size exceeds `max_bytes`, least
+    recently used entries are evicted. Entries can be tagged, to be invalidated together.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age: float = 30 * 24 * 3600,
+        clock: t.Callable[[], float] = time.time,
+    ) -> None:
+        self._conn = conn
+        self._conn.executescript(_schema)
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(results)")}
+        if "tag" not in columns:
+            # NOTE: Caches created before tags existed
+            with self._conn:
+                self._conn.execute("ALTER TABLE results ADD COLUMN tag TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_by_tag ON results (tag)")
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path: Path | t.Literal[":memory:"], **kwargs) -> t.Self:
+        if path != ":memory:":
+            path.parent.mkdir(parents=True, exist_ok=True)
+        return cls(sqlite3.connect(path), **kwargs)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def get(self, key: str) -> bytes | None:
+        now = self._clock()
+        row = self._conn.execute(
+            "SELECT value FROM results WHERE key = ? AND created_at > ?",
+            (key, now - self._max_age),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self._conn:
+            self._conn.execute(
+                "UPDATE results SET used_at = ? WHERE key = ?", (now, key)
+            )
+        return row[0]
+
+    def put(self, key: str, value: bytes, tag: str | None = None) -> None:
+        now = self._clock()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(key, value, size, created_at, used_at, tag) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now, tag),
+            )
+            self._evict(now)
+
+    def invalidate(self, tag: str | None = None) -> int:
+        """Drop the entries with the tag, or all entries; returns how many were dropped."""
+        with self._conn:
+            if tag is None:
+                cursor = self._conn.execute("DELETE FROM results")
+            else:
+                cursor = self._conn.execute("DELETE FROM results WHERE tag = ?", (tag,))
+        return cursor.rowcount
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM results WHERE created_at <= ?", (now - self._max_age,)
+        )
+        # NOTE: Keeps the most recently used entries whose running total fits the budget
+        self._conn.execute(
+            """
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, sum(size) OVER (ORDER BY used_at DESC, key) AS total
+                    FROM results
+                )
+                WHERE total > ?
+            )
+            """,
+            (self._max_bytes,),
+        )
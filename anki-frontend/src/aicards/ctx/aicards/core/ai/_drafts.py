@@ -0,0 +1,82 @@
+import typing as t
+import uuid
+
+import pydantic
+from pydantic.dataclasses import dataclass
+
+from aicards.ctx.aicards.base import EnglishNounProtonote, Example, MeaningProtonote
+
+# NOTE: Drafts are what the LLM fills in - protonotes minus the fields it has no business inventing
+
+
+@dataclass(frozen=True)
+class MeaningDraft:
+    type: t.Literal["Meaning"]
+    concept: str = pydantic.Field(
+        description="Word or phrase in its base form, as it should be memorized",
+    )
+    examples: tuple[str, ...] = pydantic.Field(
+        description="Up to two example sentences using the concept",
+        max_length=2,
+    )
+
+    def to_protonote(self) -> MeaningProtonote:
+        examples = [Example(sentence=s, image=None) for s in self.examples]
+        first, second = (examples + [None, None])[:2]
+        return MeaningProtonote(
+            id=_new_id(),
+            type=self.type,
+            concept=self.concept,
+            examples=(first, second),
+        )
+
+
+@dataclass(frozen=True)
+class EnglishNounDraft:
+    type: t.Literal["English Noun"]
+    singular: str
+    plural: str
+
+    def to_protonote(self) -> EnglishNounProtonote:
+        return EnglishNounProtonote(
+            id=_new_id(),
+            type=self.type,
+            singular=self.singular,
+            plural=self.plural,
+        )
+
+
+type ProtonoteDraft = t.Annotated[
+    MeaningDraft | EnglishNounDraft, pydantic.Field(discriminator="type")
+]
+
+
+@dataclass(frozen=True)
+class ExtractionDrafts:
+    index: int = pydantic.Field(
+        description="Index of the extraction in the request these protonotes are made for",
+    )
+    protonotes: tuple[ProtonoteDraft, ...] = pydantic.Field()
+
+
+@dataclass(frozen=True)
+class ProtonoteDraftsResponse:
+    message: str = pydantic.Field(
+        description="User-friendly message to be shown to the user for this processing stage in the chat view/log",
+    )
+    results: tuple[ExtractionDrafts, ...] = pydantic.Field(
+        description="Exactly one entry per extraction of the request",
+    )
+
+    def drafts_by_index(self, count: int) -> list[tuple[ProtonoteDraft, ...]]:
+        """Drafts of every requested extraction, in request order."""
+        by_index = {r.index: r for r in self.results}
+        if sorted(by_index) != list(range(count)):
+            raise ValueError(
+                f"Expected results for extractions 0..{count - 1}, got {sorted(by_index)}"
+            )
+        return [by_index[i].protonotes for i in range(count)]
+
+
+def _new_id() -> str:
+    return f"proto-{uuid.uuid4()}"
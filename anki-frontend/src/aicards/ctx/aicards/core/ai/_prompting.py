@@ -0,0 +1,123 @@
+import dataclasses
+import functools
+import hashlib
+import json
+import math
+import re
+import time
+import typing as t
+from dataclasses import dataclass
+
+import openai.types.chat
+
+from aicards.ctx.aicards.base import Extraction
+
+type Message = openai.types.chat.ChatCompletionMessageParam
+
+# NOTE: Rough stand-in for the provider's BPE pre-tokenization: words, digit groups, punctuation runs
+_pieces = re.compile(r"\s?[^\W\d_]+|\d{1,3}|\s?[^\w\s]+|\s+")
+
+
+def count_tokens(text: str) -> int:
+    """Local estimate of the tokens a text takes, erring on the high side."""
+    return sum(math.ceil(len(piece) / 5) for piece in _pieces.findall(text))
+
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """
+    Static start of a stage's requests: system prompt, instructions and response schema.
+
+    Built once, so that it's identical byte for byte across calls and providers can cache it.
+    """
+
+    system: str
+    response_format: openai.types.chat.completion_create_params.ResponseFormat
+
+    @functools.cached_property
+    def tokens(self) -> int:
+        return count_tokens(self.system) + count_tokens(
+            json.dumps(self.response_format)
+        )
+
+    @functools.cached_property
+    def key(self) -> str:
+        content = json.dumps([self.system, self.response_format], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def messages(self, *variable: Message) -> list[Message]:
+        return [{"role": "system", "content": self.system}, *variable]
+
+
+class PrefixCacheEstimate:
+    """
+    Guesses the share of a prompt a provider serves from its prompt cache.
+
+    OpenAI caches prefixes of at least `min_tokens`, in `step` token increments, for a few
+    minutes since they were last used.
+    """
+
+    def __init__(
+        self,
+        min_tokens: int = 1024,
+        step: int = 128,
+        ttl: float = 300.0,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._min_tokens = min_tokens
+        self._step = step
+        self._ttl = ttl
+        self._clock = clock
+        self._last_used: dict[str, float] = {}
+
+    def cached_tokens(self, prefix: PromptPrefix) -> int:
+        """Tokens of the prefix likely to be cached for a call made now."""
+        now = self._clock()
+        warm = now - self._last_used.get(prefix.key, -math.inf) < self._ttl
+        self._last_used[prefix.key] = now
+        if not warm or prefix.tokens < self._min_tokens:
+            return 0
+        return prefix.tokens // self._step * self._step
+
+
+def fit_contexts(
+    extractions: t.Sequence[Extraction],
+    budget: int,
+    count: t.Callable[[t.Sequence[Extraction]], int],
+) -> list[Extraction]:
+    """
+    Extractions with contexts shortened around their snippets until `count` of them is within budget.
+
+    Snippets are never cut; if even no contexts at all are over budget, that's what is returned.
+    """
+    if count(extractions) <= budget:
+        return list(extractions)
+
+    longest = max(len(e.context or "") for e in extractions)
+    low, high = 0, longest
+    # NOTE: Longest context length that fits, by bisection
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count([_clipped(e, middle) for e in extractions]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return [_clipped(e, low) for e in extractions]
+
+
+def _clipped(extraction: Extraction, length: int) -> Extraction:
+    context = extraction.context
+    if context is None or len(context) <= length:
+        return extraction
+    if length <= len(extraction.snippet):
+        return dataclasses.replace(extraction, context=None)
+
+    at = context.find(extraction.snippet)
+    center = len(context) // 2 if at < 0 else at + len(extraction.snippet) // 2
+    start = max(0, min(len(context) - length, center - length // 2))
+    end = start + length
+    clipped = context[start:end].strip()
+    return dataclasses.replace(
+        extraction,
+        context=f"{'…' if start else ''}{clipped}{'…' if end < len(context) else ''}",
+    )
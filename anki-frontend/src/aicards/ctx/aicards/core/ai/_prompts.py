@@ -1,16 +1,30 @@
-SYSTEM_PROMPT = """
+# NOTE: Prompts are sent as the first message, byte for byte the same on every call, so that providers
+#       can serve them from their prompt caches - anything varying per call belongs in later messages.
+
+EXTRACTION_PROMPT = """
 Extract text from the following image, focusing only on highlighted/emphasized German words and/or phrases.
-The words and phrases can be emphasized by highlights, underlines, bold, or any other distinct visual marker. 
+These are the words and phrases the user wants to memorize for their language learning.
+The words and phrases can be emphasized by highlights, underlines, bold, or any other distinct visual marker.
 If multiple words are highlighted/emphasized together, consider them as a single phrase.
-The exact method of emphasizing will be specified by the message accompanying the image - follow those instructions as close as possible.
+The image might be a crop or a tile of a larger page, with sentences cut off at its edges.
 
 If the snippet is a part of a sentence, the whole sentence should be saved in "context" field.
 Otherwise, the "context" field should be empty.
 Mind that sentences might span multiple lines.
 Also note that images might come from textbook excercises, so it might contain different irrelevant formatting (like e.g. "(2)") that should be stripped.
 
-"kind" must contain one of the following enum keys: {kind_keys_str}.
-
 Normalize standalone nouns, verbs, and adjectives to their base forms if applicable.
 """.strip()
 
+BATCH_EXTRACTION_PROMPT = f"""
+{EXTRACTION_PROMPT}
+
+The user message carries several images, numbered by their position in the message, starting from 0.
+They are unrelated to each other: report the extractions of every image separately, with an entry for each image even if nothing is emphasized in it.
+""".strip()
+
+PROTONOTES_PROMPT = """
+Create Anki protonotes for each of the extractions in the user message, which the user has emphasized for their language learning.
+Extractions are numbered by their position in the list, starting from 0.
+Contexts of the extractions might be shortened, with "…" marking the cuts.
+""".strip()
@@ -0,0 +1,218 @@
+import asyncio as aio
+import collections
+import time
+import typing as t
+from dataclasses import dataclass
+
+from aicards.misc.logging import LoggerLike, null_logger
+from aicards.ctx.aicards.core.ai._telemetry import Stage
+
+
+@dataclass(frozen=True)
+class Route:
+    # Preferred model first; later ones serve hedges and fallbacks, the last one repeatedly
+    models: tuple[str, ...]
+    # Duplicates fired for a call that hasn't answered in time; 0 disables hedging
+    max_hedges: int = 1
+    # Percentile of recent answer latencies after which a call gets hedged, 0..1
+    hedge_percentile: float = 0.95
+    # Hedge delay until `min_samples` latencies are known
+    initial_hedge_delay: float = 10.0
+    min_hedge_delay: float = 0.5
+    min_samples: int = 10
+    # Latencies of this many recent calls are kept
+    window: int = 100
+    # Overall deadline of a call, hedges included
+    timeout: float | None = None
+
+    def plan(self) -> list[str]:
+        """Model of every attempt a call may make, in order."""
+        return [
+            self.models[min(i, len(self.models) - 1)]
+            for i in range(1 + self.max_hedges)
+        ]
+
+
+@dataclass
+class HedgeMetrics:
+    calls: int = 0
+    # Calls that fired at least one hedge
+    hedged: int = 0
+    # Hedged calls answered by a hedge rather than the original attempt
+    hedges_won: int = 0
+    # Attempts fired right away because the previous one failed
+    fallbacks: int = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.calls if self.calls else 0.0
+
+    @property
+    def hedge_win_rate(self) -> float:
+        return self.hedges_won / self.hedged if self.hedged else 0.0
+
+
+class Router:
+    """
+    Routes LLM calls to per-stage models and hedges slow ones.
+
+    A call that hasn't answered after the route's percentile of recent latencies gets a duplicate,
+    possibly to a fallback model; the first answer wins and the other attempts are cancelled.
+    A failed attempt is followed up right away while the route has attempts left.
+    """
+
+    def __init__(
+        self,
+        routes: t.Mapping[Stage, Route],
+        logger: LoggerLike = null_logger,
+    ) -> None:
+        self._routes = routes
+        self._logger = logger
+        self._latencies: dict[Stage, collections.deque[float]] = {}
+        self.metrics: dict[Stage, HedgeMetrics] = {}
+
+    def handles(self, stage: Stage) -> bool:
+        return stage in self._routes
+
+    def preferred(self, stage: Stage) -> str:
+        return self._routes[stage].models[0]
+
+    def hedge_delay(self, stage: Stage) -> float:
+        route = self._routes[stage]
+        latencies = self._latencies.get(stage, ())
+        if len(latencies) < route.min_samples:
+            return route.initial_hedge_delay
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(route.hedge_percentile * len(ordered)))
+        return max(route.min_hedge_delay, ordered[index])
+
+    async def run[R](
+        self,
+        stage: Stage,
+        attempt: t.Callable[[str], t.Coroutine[t.Any, t.Any, R]],
+        discard: t.Callable[[R], t.Awaitable[None]] | None = None,
+    ) -> tuple[R, str]:
+        """
+        Answer of the first successful attempt and the model that gave it.
+
+        `discard` releases answers that lost the race, e.g. open streams.
+        """
+        route = self._routes[stage]
+        async with aio.timeout(route.timeout):
+            return await self._race(stage, route, attempt, discard)
+
+    async def _race[R](
+        self,
+        stage: Stage,
+        route: Route,
+        attempt: t.Callable[[str], t.Coroutine[t.Any, t.Any, R]],
+        discard: t.Callable[[R], t.Awaitable[None]] | None,
+    ) -> tuple[R, str]:
+        metrics = self.metrics.setdefault(stage, HedgeMetrics())
+        metrics.calls += 1
+        plan = route.plan()
+        delay = self.hedge_delay(stage)
+        started_at = time.perf_counter()
+        attempts: list[tuple[aio.Task[R], str, float]] = []
+        pending: set[aio.Task[R]] = set()
+        hedged = False
+        error: BaseException | None = None
+
+        def launch() -> None:
+            model = plan[len(attempts)]
+            task = aio.create_task(attempt(model))
+            # NOTE: Losers' errors are of no interest, but must be retrieved to not be reported
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            attempts.append((task, model, time.perf_counter()))
+            pending.add(task)
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if len(attempts) < len(plan):
+                    hedge_at = started_at + delay * len(attempts)
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+
+                done, _ = await aio.wait(
+                    pending, timeout=timeout, return_when=aio.FIRST_COMPLETED
+                )
+                if not done:
+                    if not hedged:
+                        hedged = True
+                        metrics.hedged += 1
+                    self._logger.debug(
+                        "No answer to %(stage)s call after %(delay).2fs, hedging with %(model)s",
+                        {"stage": stage, "delay": delay, "model": plan[len(attempts)]},
+                    )
+                    launch()
+                    continue
+
+                pending -= done
+                for index, (task, model, launched_at) in enumerate(attempts):
+                    if task not in done:
+                        continue
+                    if (error := task.exception()) is not None:
+                        continue
+
+                    self._observe(stage, route, time.perf_counter() - launched_at)
+                    if hedged:
+                        metrics.hedges_won += index > 0
+                        self._log_hedge(stage, model, index, metrics)
+                    await self._discard(
+                        [
+                            other
+                            for other in done
+                            if other is not task and not other.exception()
+                        ],
+                        discard,
+                    )
+                    return task.result(), model
+
+                if not pending and len(attempts) < len(plan):
+                    metrics.fallbacks += 1
+                    message = "LLM %(stage)s call failed, falling back to %(model)s"
+                    context = {"stage": stage, "model": plan[len(attempts)]}
+                    if isinstance(error, Exception):
+                        self._logger.warn(message, context, exc_info=error)
+                    else:
+                        self._logger.warn(message, context)
+                    launch()
+
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _observe(self, stage: Stage, route: Route, latency: float) -> None:
+        self._latencies.setdefault(
+            stage, collections.deque(maxlen=route.window)
+        ).append(latency)
+
+    def _log_hedge(
+        self, stage: Stage, model: str, index: int, metrics: HedgeMetrics
+    ) -> None:
+        self._logger.info(
+            "Hedged %(stage)s call answered by %(winner)s "
+            "(%(hedge_rate).1f%% of calls hedged, hedges won %(hedge_win_rate).1f%%)",
+            {
+                "stage": stage,
+                "winner": "hedge" if index else "original",
+                "model": model,
+                "hedge_rate": metrics.hedge_rate * 100,
+                "hedge_win_rate": metrics.hedge_win_rate * 100,
+                "calls": metrics.calls,
+                "fallbacks": metrics.fallbacks,
+            },
+        )
+
+    async def _discard[R](
+        self,
+        tasks: list[aio.Task[R]],
+        discard: t.Callable[[R], t.Awaitable[None]] | None,
+    ) -> None:
+        if discard is None:
+            return
+        for task in tasks:
+            await discard(task.result())
@@ -0,0 +1,189 @@
+import asyncio as aio
+import heapq
+import itertools
+import time
+import typing as t
+from dataclasses import dataclass, field
+
+import openai
+
+from aicards.misc.logging import LoggerLike, null_logger
+
+type Priority = t.Literal["interactive", "background"]
+
+_ranks: dict[Priority, int] = {"interactive": 0, "background": 1}
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        capacity: float,
+        per_second: float,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._capacity = capacity
+        self._per_second = per_second
+        self._clock = clock
+        self._level = capacity
+        self._updated_at = clock()
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be taken; amounts above capacity only need a full bucket."""
+        self._refill()
+        missing = min(amount, self._capacity) - self._level
+        return max(0.0, missing / self._per_second)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._level -= min(amount, self._capacity)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(
+            self._capacity, self._level + (now - self._updated_at) * self._per_second
+        )
+        self._updated_at = now
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    requests_per_minute: float = 500
+    tokens_per_minute: float = 200_000
+    # Retries of calls rejected with 429
+    attempts: int = 5
+    # Pause when a 429 carries no retry-after
+    default_retry_after: float = 5.0
+
+
+@dataclass
+class SchedulerMetrics:
+    queued: dict[Priority, int] = field(
+        default_factory=lambda: {"interactive": 0, "background": 0}
+    )
+    admitted: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    throttled: int = 0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.admitted if self.admitted else 0.0
+
+
+class RequestScheduler:
+    """
+    Admits calls to the LLM API within request and token rate limits, higher priorities first.
+
+    A 429 pauses admission of all calls for as long as its retry-after asks.
+    """
+
+    def __init__(
+        self,
+        limits: RateLimits = RateLimits(),
+        clock: t.Callable[[], float] = time.monotonic,
+        logger: LoggerLike = null_logger,
+    ) -> None:
+        self._limits = limits
+        self._clock = clock
+        self._logger = logger
+        self._requests = TokenBucket(
+            limits.requests_per_minute, limits.requests_per_minute / 60, clock
+        )
+        self._tokens = TokenBucket(
+            limits.tokens_per_minute, limits.tokens_per_minute / 60, clock
+        )
+        self._paused_until = 0.0
+        self._waiting: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._changed = aio.Condition()
+        self.metrics = SchedulerMetrics()
+
+    async def run[R](
+        self,
+        priority: Priority,
+        tokens: int,
+        call: t.Callable[[], t.Awaitable[R]],
+    ) -> R:
+        for attempt in range(1, self._limits.attempts + 1):
+            await self.acquire(priority, tokens)
+            try:
+                return await call()
+            except openai.RateLimitError as e:
+                if attempt == self._limits.attempts:
+                    raise
+                await self.pause(_retry_after(e) or self._limits.default_retry_after)
+        raise AssertionError("unreachable")
+
+    async def acquire(self, priority: Priority, tokens: int) -> None:
+        entry = (_ranks[priority], next(self._sequence))
+        started_at = self._clock()
+        self.metrics.queued[priority] += 1
+
+        async with self._changed:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while (delay := self._delay(entry, tokens)) != 0:
+                    try:
+                        await aio.wait_for(self._changed.wait(), delay)
+                    except TimeoutError:
+                        pass
+                self._requests.take(1)
+                self._tokens.take(tokens)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self.metrics.queued[priority] -= 1
+                self._changed.notify_all()
+
+        waited = self._clock() - started_at
+        self.metrics.admitted += 1
+        self.metrics.total_wait += waited
+        self.metrics.max_wait = max(self.metrics.max_wait, waited)
+        self._logger.debug(
+            "Admitted %(priority)s LLM call after %(waited).2fs",
+            {
+                "priority": priority,
+                "waited": waited,
+                "tokens": tokens,
+                "queued": dict(self.metrics.queued),
+            },
+        )
+
+    async def pause(self, seconds: float) -> None:
+        self.metrics.throttled += 1
+        self._logger.warn(
+            "LLM API is rate limiting, pausing calls for %(seconds).1fs",
+            {"seconds": seconds},
+        )
+        async with self._changed:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._changed.notify_all()
+
+    def _delay(self, entry: tuple[int, int], tokens: int) -> float | None:
+        """Seconds the entry has to wait for; None until it's at the head of the queue."""
+        if self._waiting[0] != entry:
+            return None
+        return max(
+            self._paused_until - self._clock(),
+            self._requests.time_until(1),
+            self._tokens.time_until(tokens),
+            0.0,
+        )
+
+
+def _retry_after(e: openai.APIStatusError) -> float | None:
+    headers = e.response.headers
+    try:
+        if (ms := headers.get("retry-after-ms")) is not None:
+            return float(ms) / 1000
+        if (seconds := headers.get("retry-after")) is not None:
+            return float(seconds)
+    except ValueError:
+        pass
+    return None
+
+
+def estimate_tokens(*texts: str, images: int = 0, completion: int = 1000) -> int:
+    """Rough upper estimate of the tokens a call consumes, for rate limiting only."""
+    # NOTE: ~4 characters per token in English, ~765 tokens per high-detail 1024px image
+    return sum(len(text) for text in texts) // 4 + images * 765 + completion
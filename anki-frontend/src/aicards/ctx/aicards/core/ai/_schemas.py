@@ -0,0 +1,49 @@
+import typing as t
+
+import pydantic
+from openai.types.shared_params import ResponseFormatJSONSchema
+
+# NOTE: Strict structured outputs reject these, and the validators enforce them anyway
+_unsupported = {"default", "discriminator"}
+
+
+def strict_response_format(
+    name: str, adapter: pydantic.TypeAdapter
+) -> ResponseFormatJSONSchema:
+    """
+    `response_format` making the model answer with JSON valid against the adapter's schema.
+
+    Strict mode wants every object closed and every property required - optional ones are nullable
+    already - and no `oneOf`.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "schema": _strict(adapter.json_schema()),
+            "strict": True,
+        },
+    }
+
+
+def _strict(node: t.Any) -> t.Any:
+    if isinstance(node, list):
+        return [_strict(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    if "$ref" in node:
+        # NOTE: References can't have siblings
+        return {"$ref": node["$ref"]}
+
+    strict: dict[str, t.Any] = {}
+    for key, value in node.items():
+        if key in ("properties", "$defs"):
+            # NOTE: Keys of these are names, not keywords
+            strict[key] = {name: _strict(schema) for name, schema in value.items()}
+        elif key not in _unsupported:
+            strict["anyOf" if key == "oneOf" else key] = _strict(value)
+    if strict.get("type") == "object" and "properties" in strict:
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    return strict
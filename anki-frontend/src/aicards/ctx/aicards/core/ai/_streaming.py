@@ -0,0 +1,79 @@
+import json
+import typing as t
+
+
+class JsonArrayItems:
+    """
+    Incremental scanner of a streamed JSON object, yielding items of one of its top-level arrays.
+
+    Every item is parsed as soon as its closing bracket arrives, long before the whole document is
+    complete - the rest of the document is only tracked, never buffered.
+    """
+
+    def __init__(self, key: str) -> None:
+        self._key = key
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Last string seen directly in the top-level object, which becomes a key at ":"
+        self._string: list[str] | None = None
+        self._last_string = ""
+        self._member = ""
+        self._item: list[str] | None = None
+
+    def feed(self, chunk: str) -> list[t.Any]:
+        return [json.loads(item) for item in self.feed_raw(chunk)]
+
+    def feed_raw(self, chunk: str) -> list[str]:
+        """JSON text of the items completed by the chunk, for validators parsing it themselves."""
+        items = []
+        for char in chunk:
+            if (item := self._step(char)) is not None:
+                items.append(item)
+        return items
+
+    def _step(self, char: str) -> str | None:
+        if self._item is not None:
+            self._item.append(char)
+
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._string is not None:
+                    self._last_string = json.loads(f'"{"".join(self._string)}"')
+                    self._string = None
+                return None
+            if self._string is not None:
+                self._string.append(char)
+            return None
+
+        match char:
+            case '"':
+                self._in_string = True
+                if len(self._stack) == 1:
+                    self._string = []
+            case ":" if len(self._stack) == 1:
+                self._member = self._last_string
+            case "{" | "[":
+                self._stack.append(char)
+                if self._is_item_start():
+                    self._item = [char]
+            case "}" | "]":
+                closed = self._item is not None and len(self._stack) == 3
+                if self._stack:
+                    self._stack.pop()
+                if closed:
+                    item, self._item = "".join(self._item or ()), None
+                    return item
+        return None
+
+    def _is_item_start(self) -> bool:
+        return (
+            len(self._stack) == 3
+            and self._stack[1] == "["
+            and self._member == self._key
+        )
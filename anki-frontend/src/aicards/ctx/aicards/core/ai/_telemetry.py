@@ -0,0 +1,150 @@
+import time
+import typing as t
+from dataclasses import dataclass, field
+
+import openai.types
+
+type Stage = t.Literal["extraction", "batch-extraction", "protonotes"]
+
+# USD per million prompt and completion tokens
+type Prices = t.Mapping[str, tuple[float, float]]
+
+default_prices: Prices = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+
+@dataclass
+class CallStats:
+    """What a single LLM call cost, filled in while it runs."""
+
+    stage: Stage
+    model: str
+    request_bytes: int
+    image_width: int | None = None
+    image_height: int | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    # Prompt tokens served from the provider's prompt cache, as reported and as guessed beforehand
+    cached_tokens: int | None = None
+    estimated_cached_tokens: int | None = None
+    time_to_first_token: float | None = None
+    latency: float = 0.0
+    # Requests sent, more than one when rate limiting made the call retry
+    attempts: int = 0
+    # Name of the exception the call failed with
+    error: str | None = None
+    started_at: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    def attempted(self) -> None:
+        self.attempts += 1
+
+    def first_token(self) -> None:
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started_at
+
+    def used(self, usage: openai.types.CompletionUsage | None) -> None:
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+            if usage.prompt_tokens_details is not None:
+                self.cached_tokens = usage.prompt_tokens_details.cached_tokens
+
+    def finish(self) -> None:
+        self.latency = time.perf_counter() - self.started_at
+
+    def as_context(self) -> dict[str, t.Any]:
+        return {
+            "stage": self.stage,
+            "model": self.model,
+            "request_bytes": self.request_bytes,
+            "image_width": self.image_width,
+            "image_height": self.image_height,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "estimated_cached_tokens": self.estimated_cached_tokens,
+            "time_to_first_token": self.time_to_first_token,
+            "latency": self.latency,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+@dataclass
+class StageSummary:
+    calls: int = 0
+    failures: int = 0
+    retries: int = 0
+    request_bytes: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    total_time_to_first_token: float = 0.0
+    streamed: int = 0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    @property
+    def mean_time_to_first_token(self) -> float:
+        return self.total_time_to_first_token / self.streamed if self.streamed else 0.0
+
+
+class LlmTelemetry:
+    """In-process totals of LLM calls per stage, for tracking cost and latency over a session."""
+
+    def __init__(self, prices: Prices = default_prices) -> None:
+        self._prices = prices
+        self.stages: dict[Stage, StageSummary] = {}
+
+    def record(self, stats: CallStats) -> None:
+        summary = self.stages.setdefault(stats.stage, StageSummary())
+        summary.calls += 1
+        summary.failures += stats.error is not None
+        summary.retries += stats.retries
+        summary.request_bytes += stats.request_bytes
+        summary.prompt_tokens += stats.prompt_tokens or 0
+        summary.completion_tokens += stats.completion_tokens or 0
+        summary.cached_tokens += stats.cached_tokens or 0
+        summary.cost += self.cost_of(stats)
+        summary.total_latency += stats.latency
+        summary.max_latency = max(summary.max_latency, stats.latency)
+        if stats.time_to_first_token is not None:
+            summary.total_time_to_first_token += stats.time_to_first_token
+            summary.streamed += 1
+
+    def cost_of(self, stats: CallStats) -> float:
+        """USD the call cost; 0 for models of unknown price."""
+        prompt, completion = self._prices.get(stats.model, (0.0, 0.0))
+        return (
+            (stats.prompt_tokens or 0) * prompt
+            + (stats.completion_tokens or 0) * completion
+        ) / 1_000_000
+
+    def report(self) -> str:
+        header = (
+            f"{'stage':<16} {'calls':>6} {'failed':>6} {'retries':>7} {'KiB sent':>9} "
+            f"{'tokens in':>10} {'cached':>8} {'tokens out':>10} {'cost $':>8} "
+            f"{'mean s':>7} {'max s':>7} {'ttft s':>7}"
+        )
+        lines = [header, "-" * len(header)]
+        for stage, s in sorted(self.stages.items()):
+            lines.append(
+                f"{stage:<16} {s.calls:>6} {s.failures:>6} {s.retries:>7} "
+                f"{s.request_bytes / 1024:>9.1f} {s.prompt_tokens:>10} "
+                f"{s.cached_tokens:>8} {s.completion_tokens:>10} {s.cost:>8.4f} {s.mean_latency:>7.2f} "
+                f"{s.max_latency:>7.2f} {s.mean_time_to_first_token:>7.2f}"
+            )
+        return "\n".join(lines)
@@ -58,21 +58,25 @@ async def extractions_processor(
     service: IService,
     add_llm_chat_message: AddLlmChatMessage,
 ) -> None:
+    async def add_extraction(extraction: Extraction) -> None:
+        item = QListWidgetItem(extraction.snippet)
+        item.setData(Qt.ItemDataRole.UserRole, extraction)
+        extractions_list.addItem(item)
+        item.setSelected(True)
+
     async def pull():
         while True:
             image = await incoming.get()
 
             image_processing = service.extract_emphases(image)
-            async with await image_processing.llm_messages.subscribe_async(
-                add_llm_chat_message
+            async with (
+                await image_processing.llm_messages.subscribe_async(
+                    add_llm_chat_message
+                ),
+                # NOTE: Extractions show up one by one, while the response is still streaming
+                await image_processing.items.subscribe_async(add_extraction),
             ):
-                new_extractions = await image_processing
-
-            for extraction in new_extractions:
-                item = QListWidgetItem(extraction.snippet)
-                item.setData(Qt.ItemDataRole.UserRole, extraction)
-                extractions_list.addItem(item)
-                item.setSelected(True)
+                await image_processing
 
             incoming.task_done()
 
@@ -23,7 +23,7 @@ class MessageBubble(QWidget):
         )
 
         # Create the message body
-        body = QLabel(text, self)
+        body = self._body = QLabel(text, self)
         body.setWordWrap(True)
         body.setTextInteractionFlags(
             Qt.TextInteractionFlag.TextSelectableByMouse
@@ -62,6 +62,9 @@ class MessageBubble(QWidget):
         # Make the widget expand horizontally but only take vertical space it needs
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Minimum)
 
+    def append(self, text: str) -> None:
+        self._body.setText(self._body.text() + text)
+
 
 class LLMDialoguePanel(QScrollArea):
     """Scrollable container for multiple MessageBubble widgets."""
@@ -119,17 +122,25 @@ class LLMDialoguePanel(QScrollArea):
         self._placeholder.setStyleSheet("color: gray; font-style: italic;")
         self._layout.insertWidget(0, self._placeholder)
 
+        # Bubbles of streamed messages, which keep growing as fragments arrive
+        self._streams: dict[str, MessageBubble] = {}
+
     async def add_message(self, msg: LlmChatMessage) -> None:
         # Remove placeholder if it's the first message
         if self._placeholder.parent():
             self._layout.removeWidget(self._placeholder)
             self._placeholder.setParent(None)
 
-        # Create the message bubble
-        bubble = MessageBubble(msg.role, msg.text)
+        if msg.stream_id is not None and msg.stream_id in self._streams:
+            self._streams[msg.stream_id].append(msg.text)
+        else:
+            # Create the message bubble
+            bubble = MessageBubble(msg.role, msg.text)
+            if msg.stream_id is not None:
+                self._streams[msg.stream_id] = bubble
 
-        # Insert before the stretch spacer at the bottom
-        self._layout.insertWidget(self._layout.count() - 1, bubble)
+            # Insert before the stretch spacer at the bottom
+            self._layout.insertWidget(self._layout.count() - 1, bubble)
 
         # Auto-scroll to show the new message
         vscroll = self.verticalScrollBar()
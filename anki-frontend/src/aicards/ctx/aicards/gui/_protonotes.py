@@ -24,6 +24,7 @@ async def protonotes_creating_processor(
 ) -> None:
     def update_tree(
         extraction_protonotes: t.Sequence[ExtractionWithPrototonotes],
+        problems: t.Mapping[str, str],
     ) -> None:
         for ep in extraction_protonotes:
             extraction_item = QTreeWidgetItem(notes_tree)
@@ -41,6 +42,11 @@ async def protonotes_creating_processor(
                 note_item.setCheckState(0, Qt.CheckState.Checked)
                 note_item.setData(0, Qt.ItemDataRole.UserRole, protonote)
 
+                if problem := problems.get(protonote.id):
+                    note_item.setCheckState(0, Qt.CheckState.Unchecked)
+                    note_item.setText(1, problem)
+                    note_item.setToolTip(0, problem)
+
         notes_tree.expandAll()
 
     def get_selected_extraction_protonotes() -> t.Sequence[ExtractionWithPrototonotes]:
@@ -51,8 +57,23 @@ async def protonotes_creating_processor(
             if top_item is None:
                 continue
             ep = top_item.data(0, Qt.ItemDataRole.UserRole)
-            if ep and top_item.checkState(0) == Qt.CheckState.Checked:
-                selected.append(ep)
+            if not ep or top_item.checkState(0) != Qt.CheckState.Checked:
+                continue
+
+            protonotes = []
+            for j in range(top_item.childCount()):
+                note_item = top_item.child(j)
+                if note_item is None:
+                    continue
+                if note_item.checkState(0) == Qt.CheckState.Checked:
+                    protonotes.append(note_item.data(0, Qt.ItemDataRole.UserRole))
+
+            selected.append(
+                ExtractionWithPrototonotes(
+                    extraction=ep.extraction,
+                    protonotes=tuple(protonotes),
+                )
+            )
 
         return selected
 
@@ -66,8 +87,13 @@ async def protonotes_creating_processor(
             ):
                 extraction_protonotes = await protonotes_creation
 
+            # Flag notes Anki would reject before the user gets to export them
+            problems = await service.preflight_protonotes(
+                [p for ep in extraction_protonotes for p in ep.protonotes]
+            )
+
             # Update the tree with the results
-            update_tree(extraction_protonotes)
+            update_tree(extraction_protonotes, problems)
 
     # Run the continuous task
     async with asyncio.TaskGroup() as tg:
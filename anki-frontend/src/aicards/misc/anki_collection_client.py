@@ -0,0 +1,281 @@
+import asyncio as aio
+import base64
+import fnmatch
+import hashlib
+import os
+import typing as t
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+from anki.collection import Collection, OpChanges
+from anki.decks import DeckId
+from anki.errors import NotFoundError
+from anki.notes import Note, NoteFieldsCheckResult
+
+from aicards.misc.ankiconnect_client import (
+    AddNotesResponse,
+    AnkiConnectAPIError,
+    AnkiSchemaError,
+    CanAddNoteResponse,
+    CanAddNotesResponse,
+    NoteData,
+    NoteFieldInfo,
+    MediaFile,
+    NoteInfo,
+    NotesInfoResponse,
+)
+
+_media_kinds: tuple[t.Literal["picture", "audio", "video"], ...] = (
+    "picture",
+    "audio",
+    "video",
+)
+
+type _Media = list[tuple[str, MediaFile, bytes]]
+
+
+class AnkiCollectionClient:
+    """
+    Same operations as `AnkiConnectClient`, performed directly on the collection of the running Anki.
+
+    Errors mirror the ones AnkiConnect reports, so callers can't tell the two apart.
+    Duplicates are always checked collection-wide, regardless of `duplicateScope`.
+    Notes added at once are a single undo step, run as a collection operation inside Anki.
+    """
+
+    def __init__(self, col: Collection) -> None:
+        self._col = col
+
+    @classmethod
+    @asynccontextmanager
+    async def running(cls, col: Collection) -> t.AsyncIterator[t.Self]:
+        yield cls(col)
+
+    async def add_note(self, note: NoteData) -> int:
+        [result] = await self.add_notes([note])
+        if isinstance(result, AnkiConnectAPIError):
+            raise result
+        return result
+
+    async def add_notes(self, notes: t.Sequence[NoteData]) -> AddNotesResponse:
+        results: AddNotesResponse = []
+        prepared: list[tuple[int, NoteData, Note, DeckId, _Media]] = []
+        for note in notes:
+            try:
+                anki_note = self._note_from(note)
+                deck_id = self._deck_id(note)
+                media = await self._media_of(note, anki_note)
+            except AnkiConnectAPIError as e:
+                results.append(e)
+                continue
+            prepared.append((len(results), note, anki_note, deck_id, media))
+            results.append(AnkiConnectAPIError("cannot create note"))
+
+        def add(col: Collection) -> OpChanges:
+            undo_entry = col.add_custom_undo_entry("Add Notes")
+            for i, note, anki_note, deck_id, media in prepared:
+                # NOTE: Checked as they're added, so that a batch can't duplicate itself
+                if self._is_duplicate(note, anki_note):
+                    results[i] = AnkiConnectAPIError(
+                        "cannot create note because it is a duplicate"
+                    )
+                    continue
+                for kind, file, content in media:
+                    self._attach(col, anki_note, kind, file, content)
+                col.add_note(anki_note, deck_id)
+                results[i] = anki_note.id
+            return col.merge_undo_entries(undo_entry)
+
+        if prepared:
+            await self._run(add)
+        return results
+
+    async def can_add_notes_with_error_detail(
+        self, notes: t.Sequence[NoteData]
+    ) -> CanAddNotesResponse:
+        results = []
+        for note in notes:
+            try:
+                anki_note = self._note_from(note)
+                self._deck_id(note)
+            except AnkiConnectAPIError as e:
+                results.append(CanAddNoteResponse(canAdd=False, error=str(e)))
+                continue
+
+            if self._is_duplicate(note, anki_note):
+                results.append(
+                    CanAddNoteResponse(
+                        canAdd=False,
+                        error="cannot create note because it is a duplicate",
+                    )
+                )
+            else:
+                results.append(CanAddNoteResponse(canAdd=True, error=None))
+        return results
+
+    async def find_notes(self, query: str) -> list[int]:
+        return list(self._col.find_notes(query))
+
+    async def notes_info(self, note_ids: t.Sequence[int]) -> NotesInfoResponse:
+        results = []
+        for note_id in note_ids:
+            try:
+                note = self._col.get_note(note_id)  # type: ignore[arg-type]
+            except NotFoundError:
+                continue
+            results.append(
+                NoteInfo(
+                    noteId=note.id,
+                    modelName=note.note_type()["name"],  # type: ignore[index]
+                    tags=list(note.tags),
+                    fields={
+                        name: NoteFieldInfo(value=value, order=order)
+                        for order, (name, value) in enumerate(note.items())
+                    },
+                )
+            )
+        return results
+
+    async def model_field_names(self, model_name: str) -> list[str]:
+        model = self._col.models.by_name(model_name)
+        if model is None:
+            raise AnkiSchemaError(f"model was not found: {model_name}")
+        return self._col.models.field_names(model)
+
+    async def model_names(self) -> list[str]:
+        return [m.name for m in self._col.models.all_names_and_ids()]
+
+    async def deck_names(self) -> list[str]:
+        return [d.name for d in self._col.decks.all_names_and_ids()]
+
+    async def store_media_file(
+        self,
+        filename: str,
+        *,
+        path: str | None = None,
+        data: str | None = None,
+    ) -> str:
+        content = (
+            Path(path).read_bytes()
+            if path is not None
+            else base64.b64decode(data or "")
+        )
+        return self._col.media.write_data(filename, content)
+
+    async def get_media_file_names(self, pattern: str = "*") -> list[str]:
+        return fnmatch.filter(os.listdir(self._col.media.dir()), pattern)
+
+    async def _run(self, op: t.Callable[[Collection], OpChanges]) -> None:
+        """Run the operation on the collection, through Anki's GUI when running inside it."""
+        if (mw := self._main_window()) is None:
+            op(self._col)
+            return
+
+        from aqt.operations import CollectionOp  # type: ignore[import-not-found]
+
+        # NOTE: GUI learns about the changes and offers to undo them, the op runs off the main thread
+        done = aio.get_running_loop().create_future()
+        collection_op = CollectionOp(parent=mw, op=op)
+
+        def succeeded(_: OpChanges) -> None:
+            if not done.done():
+                done.set_result(None)
+
+        def failed(e: Exception) -> None:
+            if not done.done():
+                done.set_exception(e)
+
+        collection_op.success(succeeded)
+        collection_op.failure(failed)
+        collection_op.run_in_background()
+        await done
+
+    def _main_window(self) -> t.Any:
+        try:
+            from aqt import mw  # type: ignore[import-not-found]
+        except ImportError:
+            return None
+        return mw if mw is not None and mw.col is self._col else None
+
+    async def _media_of(self, note: NoteData, anki_note: Note) -> _Media:
+        media: _Media = []
+        for kind in _media_kinds:
+            for file in note.get(kind, ()):
+                for field in file["fields"]:
+                    if field not in anki_note:
+                        raise AnkiSchemaError(
+                            f"cannot create note: unknown field {field}"
+                        )
+                content = await self._media_content(file)
+                if (skip := file.get("skipHash")) and (
+                    hashlib.md5(content).hexdigest() == skip
+                ):
+                    continue
+                media.append((kind, file, content))
+        return media
+
+    async def _media_content(self, file: MediaFile) -> bytes:
+        try:
+            if "path" in file:
+                return Path(file["path"]).read_bytes()
+            if "data" in file:
+                return base64.b64decode(file["data"])
+            if "url" in file:
+                url = file["url"]
+                async with httpx.AsyncClient(follow_redirects=True) as client:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                    return response.content
+        except (OSError, ValueError, httpx.HTTPError) as e:
+            raise AnkiConnectAPIError(
+                f"cannot read media file {file['filename']}: {e}"
+            ) from e
+        raise AnkiConnectAPIError(
+            f"media file {file['filename']} has no path, data or url"
+        )
+
+    def _attach(
+        self,
+        col: Collection,
+        anki_note: Note,
+        kind: str,
+        file: MediaFile,
+        content: bytes,
+    ) -> None:
+        # NOTE: Media folder may rename the file to not clash with a different one of the same name
+        filename = col.media.write_data(file["filename"], content)
+        reference = (
+            f'<img src="{filename}">' if kind == "picture" else f"[sound:{filename}]"
+        )
+        for field in file["fields"]:
+            anki_note[field] += reference
+
+    def _note_from(self, note: NoteData) -> Note:
+        model_name = note.get("modelName", "")
+        model = self._col.models.by_name(model_name)
+        if model is None:
+            raise AnkiSchemaError(f"model was not found: {model_name}")
+
+        anki_note = self._col.new_note(model)
+        for name, value in note.get("fields", {}).items():
+            if name not in anki_note:
+                raise AnkiSchemaError(f"cannot create note: unknown field {name}")
+            anki_note[name] = value
+        anki_note.tags = list(note.get("tags", ()))
+
+        if anki_note.fields_check() == NoteFieldsCheckResult.EMPTY:
+            raise AnkiConnectAPIError("cannot create note because it is empty")
+        return anki_note
+
+    def _deck_id(self, note: NoteData) -> DeckId:
+        deck_name = note.get("deckName", "Default")
+        deck_id = self._col.decks.id_for_name(deck_name)
+        if deck_id is None:
+            raise AnkiSchemaError(f"deck was not found: {deck_name}")
+        return DeckId(deck_id)
+
+    def _is_duplicate(self, note: NoteData, anki_note: Note) -> bool:
+        if note.get("options", {}).get("allowDuplicate", False):
+            return False
+        return anki_note.fields_check() == NoteFieldsCheckResult.DUPLICATE
@@ -0,0 +1,82 @@
+import collections
+import html
+import re
+import typing as t
+
+from aicards.misc.ankiconnect_client import AnkiClientLike, NoteData, NoteInfo
+from aicards.misc.anki_schema import SchemaRegistry
+
+type DuplicateKey = tuple[str, str, str]
+
+DUPLICATE_ERROR = "cannot create note because it is a duplicate"
+
+_html_tag = re.compile(r"<[^>]*>")
+
+
+def _normalize(value: str) -> str:
+    # NOTE: Anki compares first fields with HTML stripped
+    return html.unescape(_html_tag.sub("", value)).strip()
+
+
+class DuplicateIndex:
+    """
+    Local mirror of (deck, model, first field) keys of notes already in the collection.
+    """
+
+    def __init__(self, client: AnkiClientLike, schema: SchemaRegistry) -> None:
+        self._client = client
+        self._schema = schema
+        self._notes: dict[str, dict[int, DuplicateKey]] = {}
+        self._keys = collections.Counter[DuplicateKey]()
+
+    async def refresh(self, deck_name: str) -> None:
+        """Sync the deck with the collection, fetching details only for unseen notes."""
+        note_ids = set(
+            await self._client.find_notes(f'deck:"{escape_query(deck_name)}"')
+        )
+        known = self._notes.setdefault(deck_name, {})
+
+        for note_id in known.keys() - note_ids:
+            self._keys[known.pop(note_id)] -= 1
+
+        for info in await self._client.notes_info(sorted(note_ids - known.keys())):
+            self._remember(deck_name, info.noteId, _key_from_info(deck_name, info))
+
+    async def key_of(self, note: NoteData) -> DuplicateKey | None:
+        model_name = note.get("modelName")
+        fields = note.get("fields")
+        if not model_name or not fields:
+            return None
+
+        field_names = await self._schema.field_names(model_name)
+        if not field_names:
+            return None
+
+        first_field = fields.get(field_names[0])
+        if first_field is None:
+            return None
+
+        return (note.get("deckName", "Default"), model_name, _normalize(first_field))
+
+    def contains(self, key: DuplicateKey | None) -> bool:
+        return key is not None and self._keys[key] > 0
+
+    def add(self, note_id: int, key: DuplicateKey | None) -> None:
+        if key is not None:
+            self._remember(key[0], note_id, key)
+
+    def _remember(self, deck_name: str, note_id: int, key: DuplicateKey) -> None:
+        notes = self._notes.setdefault(deck_name, {})
+        if note_id in notes:
+            self._keys[notes[note_id]] -= 1
+        notes[note_id] = key
+        self._keys[key] += 1
+
+
+def _key_from_info(deck_name: str, info: NoteInfo) -> DuplicateKey:
+    first = min(info.fields.values(), key=lambda f: f.order, default=None)
+    return (deck_name, info.modelName, _normalize(first.value if first else ""))
+
+
+def escape_query(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
@@ -0,0 +1,95 @@
+import asyncio as aio
+import base64
+import hashlib
+import typing as t
+from pathlib import PurePath
+
+from aicards.misc.ankiconnect_client import AnkiClientLike, MediaFile, NoteData
+
+_media_kinds: tuple[t.Literal["picture", "audio", "video"], ...] = (
+    "picture",
+    "audio",
+    "video",
+)
+
+
+class MediaUploader:
+    """
+    Stores note media under content-addressed names, uploading only what Anki doesn't have yet.
+
+    Attached notes reference stored files from their fields instead of carrying the media along.
+    """
+
+    def __init__(self, client: AnkiClientLike, prefix: str = "aicards-") -> None:
+        self._client = client
+        self._prefix = prefix
+        self._stored: set[str] | None = None
+
+    async def attach(self, note: NoteData) -> NoteData:
+        if not any(note.get(kind) for kind in _media_kinds):
+            return note
+
+        fields = dict(note.get("fields", {}))
+        remaining: dict[str, list[MediaFile]] = {}
+
+        for kind in _media_kinds:
+            for media in note.get(kind, ()):
+                filename = await self._store(media)
+                if filename is None:
+                    # NOTE: URLs are left for AnkiConnect to download on its own
+                    remaining.setdefault(kind, []).append(media)
+                    continue
+
+                reference = (
+                    f'<img src="{filename}">'
+                    if kind == "picture"
+                    else f"[sound:{filename}]"
+                )
+                for field in media["fields"]:
+                    fields[field] = fields.get(field, "") + reference
+
+        attached = t.cast(
+            NoteData, {k: v for k, v in note.items() if k not in _media_kinds}
+        )
+        attached["fields"] = fields
+        attached.update(remaining)  # type: ignore[typeddict-item]
+        return attached
+
+    async def _store(self, media: MediaFile) -> str | None:
+        source: dict[str, str]
+        if "path" in media:
+            path = media["path"]
+            digest = await aio.to_thread(_file_digest, path)
+            source = {"path": path}
+        elif "data" in media:
+            data = media["data"]
+            digest = hashlib.sha256(base64.b64decode(data)).hexdigest()
+            source = {"data": data}
+        else:
+            return None
+
+        filename = f"{self._prefix}{digest[:32]}{PurePath(media['filename']).suffix}"
+
+        stored = await self._stored_names()
+        if filename not in stored:
+            try:
+                await self._client.store_media_file(filename, **source)
+            except BaseException:
+                # NOTE: The media folder may have changed under us, it's listed again next time
+                self._stored = None
+                raise
+            stored.add(filename)
+
+        return filename
+
+    async def _stored_names(self) -> set[str]:
+        if self._stored is None:
+            self._stored = set(
+                await self._client.get_media_file_names(f"{self._prefix}*")
+            )
+        return self._stored
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
@@ -0,0 +1,90 @@
+import asyncio as aio
+import time
+import typing as t
+
+from aicards.misc.ankiconnect_client import (
+    AnkiClientLike,
+    AnkiConnectClientError,
+    NoteData,
+)
+
+
+class InvalidNoteError(AnkiConnectClientError):
+    """Note doesn't match the decks/models of the collection; detected without asking Anki."""
+
+    pass
+
+
+def _canonical(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+class SchemaRegistry:
+    """
+    Cached view of deck names, model names and model fields of the collection.
+
+    Cache expires after `ttl` seconds or on explicit `invalidate()`.
+    """
+
+    def __init__(
+        self,
+        client: AnkiClientLike,
+        ttl: float = 300.0,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._client = client
+        self._ttl = ttl
+        self._clock = clock
+        self._fetched_at: float | None = None
+        self._decks: frozenset[str] = frozenset()
+        self._models: frozenset[str] = frozenset()
+        self._fields: dict[str, list[str]] = {}
+
+    def invalidate(self) -> None:
+        self._fetched_at = None
+        self._fields.clear()
+
+    async def field_names(self, model_name: str) -> list[str]:
+        await self._ensure_fresh()
+        if model_name not in self._models:
+            raise InvalidNoteError(f"model was not found: {model_name}")
+        if model_name not in self._fields:
+            self._fields[model_name] = await self._client.model_field_names(model_name)
+        return self._fields[model_name]
+
+    async def validate(self, note: NoteData) -> NoteData:
+        """Return the note with field names mapped onto the model's, or raise `InvalidNoteError`."""
+        await self._ensure_fresh()
+
+        deck_name = note.get("deckName", "Default")
+        if deck_name not in self._decks:
+            raise InvalidNoteError(f"deck was not found: {deck_name}")
+
+        field_names = await self.field_names(note.get("modelName", ""))
+        by_canonical = {_canonical(name): name for name in field_names}
+
+        fields: dict[str, str] = {}
+        for name, value in note.get("fields", {}).items():
+            if (mapped := by_canonical.get(_canonical(name))) is None:
+                raise InvalidNoteError(
+                    f"model {note.get('modelName')} has no field {name!r}"
+                )
+            fields[mapped] = value
+
+        return t.cast(NoteData, {**note, "fields": fields})
+
+    async def _ensure_fresh(self) -> None:
+        if (
+            self._fetched_at is not None
+            and self._clock() - self._fetched_at < self._ttl
+        ):
+            return
+
+        # NOTE: Issued together, so that a coalescing client packs them into a single round-trip
+        decks, models = await aio.gather(
+            self._client.deck_names(),
+            self._client.model_names(),
+        )
+        self._decks, self._models = frozenset(decks), frozenset(models)
+        self._fields = {}
+        self._fetched_at = self._clock()
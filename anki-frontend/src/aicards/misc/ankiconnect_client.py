@@ -1,10 +1,17 @@
+import asyncio as aio
 import json
+import re
+import time
 import typing as t
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
 
 import httpx
 import pydantic
 
+from aicards.misc.logging import LoggerLike, null_logger
+from aicards.misc.resilience import AdaptiveTimeout, CircuitBreaker, RetryPolicy
+
 
 # Exception Hierarchy
 class AnkiConnectClientError(Exception):
@@ -25,6 +32,12 @@ class AnkiConnectAPIError(AnkiConnectClientError):
     pass
 
 
+class AnkiSchemaError(AnkiConnectAPIError):
+    """Note refers to a deck, model or field the collection doesn't have."""
+
+    pass
+
+
 class DuplicateScopeOptions(t.TypedDict, total=False):
     """Options for duplicate scope checking."""
 
@@ -48,6 +61,7 @@ class MediaFileBase(t.TypedDict):
     fields: t.Sequence[str]
 
 
+@t.final
 class MediaFileWithURL(MediaFileBase, total=False):
     """Media file with URL."""
 
@@ -55,6 +69,7 @@ class MediaFileWithURL(MediaFileBase, total=False):
     skipHash: str
 
 
+@t.final
 class MediaFileWithData(MediaFileBase, total=False):
     """Media file with data."""
 
@@ -62,6 +77,7 @@ class MediaFileWithData(MediaFileBase, total=False):
     skipHash: str
 
 
+@t.final
 class MediaFileWithPath(MediaFileBase, total=False):
     """Media file with path."""
 
@@ -89,15 +105,114 @@ class AddNoteParams(t.TypedDict):
 
 class CanAddNoteResponse(pydantic.BaseModel):
     canAdd: bool
-    error: None | str
+    # NOTE: AnkiConnect leaves it out for notes that can be added
+    error: None | str = None
+
+    def exception(self) -> AnkiConnectAPIError | None:
+        """Why the note can't be added, as the error adding it would raise."""
+        return None if self.canAdd else api_error(self.error or "cannot create note")
 
 
 type CanAddNotesResponse = list[CanAddNoteResponse]
 
 
+class NoteFieldInfo(pydantic.BaseModel):
+    value: str
+    order: int
+
+
+class NoteInfo(pydantic.BaseModel):
+    noteId: int
+    modelName: str
+    tags: list[str] = []
+    fields: dict[str, NoteFieldInfo]
+
+
+type NotesInfoResponse = list[NoteInfo]
+
+type AddNotesResponse = list[int | AnkiConnectAPIError]
+
+
+class AnkiClientLike(t.Protocol):
+    """Operations on the Anki collection the add-on relies on, whatever the transport."""
+
+    async def add_note(self, note: NoteData) -> int: ...
+
+    async def add_notes(self, notes: t.Sequence[NoteData]) -> AddNotesResponse: ...
+
+    async def can_add_notes_with_error_detail(
+        self, notes: t.Sequence[NoteData]
+    ) -> CanAddNotesResponse: ...
+
+    async def find_notes(self, query: str) -> list[int]: ...
+
+    async def notes_info(self, note_ids: t.Sequence[int]) -> NotesInfoResponse: ...
+
+    async def model_field_names(self, model_name: str) -> list[str]: ...
+
+    async def model_names(self) -> list[str]: ...
+
+    async def deck_names(self) -> list[str]: ...
+
+    async def store_media_file(
+        self,
+        filename: str,
+        *,
+        path: str | None = None,
+        data: str | None = None,
+    ) -> str: ...
+
+    async def get_media_file_names(self, pattern: str = "*") -> list[str]: ...
+
+
+@dataclass(frozen=True)
+class CoalescingOptions:
+    """Packing of concurrently issued requests into a single `multi` action."""
+
+    max_batch_size: int = 32
+    # NOTE: Zero packs only the requests issued within the same event loop tick
+    max_delay: float = 0.0
+
+
+type _Pending = tuple[dict[str, t.Any], aio.Future[t.Any]]
+
+# NOTE: Only actions that are safe to repeat when it is unknown whether the first attempt went through
+IDEMPOTENT_ACTIONS = frozenset(
+    {
+        "version",
+        "deckNames",
+        "modelNames",
+        "modelFieldNames",
+        "findNotes",
+        "notesInfo",
+        "canAddNotes",
+        "canAddNotesWithErrorDetail",
+        "getMediaFilesNames",
+        # NOTE: Storing the same file under the same name twice has the same effect as storing it once
+        "storeMediaFile",
+    }
+)
+
+
 class AnkiConnectClient:
-    def __init__(self, client: httpx.AsyncClient):
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        coalescing: CoalescingOptions | None = None,
+        retry: RetryPolicy = RetryPolicy(),
+        breaker: CircuitBreaker | None = None,
+        timeouts: AdaptiveTimeout | None = None,
+        logger: LoggerLike = null_logger,
+    ):
         self._client = client
+        self._coalescing = coalescing
+        self._retry = retry
+        self._breaker = CircuitBreaker() if breaker is None else breaker
+        self._timeouts = AdaptiveTimeout() if timeouts is None else timeouts
+        self._logger = logger
+        self._pending: list[_Pending] = []
+        self._flush_handle: aio.Handle | None = None
+        self._batches: set[aio.Task[None]] = set()
 
     @classmethod
     @asynccontextmanager
@@ -105,41 +220,174 @@ class AnkiConnectClient:
         cls,
         host: str = "localhost",
         port: int = 8765,
+        coalescing: CoalescingOptions | None = None,
+        retry: RetryPolicy = RetryPolicy(),
+        logger: LoggerLike = null_logger,
     ) -> t.AsyncGenerator["AnkiConnectClient", None]:
-        async with httpx.AsyncClient(
-            base_url=f"http://{host}:{port}/",
-            timeout=httpx.Timeout(10.0),
-        ) as client:
-            yield cls(client)
+        async with httpx.AsyncClient(base_url=f"http://{host}:{port}/") as client:
+            self = cls(client, coalescing, retry, logger=logger)
+            try:
+                yield self
+            finally:
+                self._flush()
+                await aio.gather(*self._batches, return_exceptions=True)
 
     async def _request(self, action: str, version: int = 6, **params) -> t.Any:
         payload = {"action": action, "version": version}
         if params:
             payload["params"] = params
 
+        if self._coalescing is None or action == "multi":
+            return await self._send(payload)
+
+        future = aio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        self._schedule_flush(self._coalescing)
+        return await future
+
+    async def _send(self, payload: dict[str, t.Any]) -> t.Any:
+        action = payload["action"]
+        body = json.dumps(payload).encode()
+        attempts = self._retry.attempts if _is_idempotent(payload) else 1
+
+        with self._logger.span(
+            "AnkiConnect %(action)s",
+            {"action": action, "size": len(body)},
+        ) as logger:
+            for attempt in range(attempts):
+                if not self._breaker.allow():
+                    logger.debug("Circuit is open, failing fast", {"retries": attempt})
+                    raise AnkiConnectConnectionError(
+                        "AnkiConnect is unresponsive, not attempting to connect"
+                    )
+
+                try:
+                    data = await self._post(body)
+                except AnkiConnectConnectionError as e:
+                    self._breaker.record_failure()
+                    context = {"retries": attempt, "breaker": self._breaker.state}
+                    if attempt + 1 >= attempts:
+                        logger.warn("AnkiConnect request failed", context, exc_info=e)
+                        raise
+                    delay = self._retry.delay(attempt)
+                    logger.debug(
+                        "AnkiConnect request failed, retrying in %(delay).2fs",
+                        {**context, "delay": delay},
+                    )
+                    await aio.sleep(delay)
+                    continue
+
+                self._breaker.record_success()
+                logger.debug(
+                    "AnkiConnect request completed",
+                    {"retries": attempt, "breaker": self._breaker.state},
+                )
+                break
+
+        if data.get("error") is not None:
+            raise api_error(data["error"])
+
+        return data.get("result")
+
+    async def _post(self, body: bytes) -> dict[str, t.Any]:
+        started_at = time.monotonic()
         try:
-            response = await self._client.post("", json=payload)
+            response = await self._client.post(
+                "",
+                content=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self._timeouts.timeout_for(len(body)),
+            )
             response.raise_for_status()
             data = response.json()
-
-            if data.get("error") is not None:
-                raise AnkiConnectAPIError(data["error"])
-
-            return data.get("result")
-
         except httpx.RequestError as e:
             raise AnkiConnectConnectionError(
                 f"Failed to connect to AnkiConnect: {e}"
             ) from e
+        except httpx.HTTPStatusError as e:
+            # NOTE: Server errors are as transient as a lost connection, the rest won't pass on retry
+            if e.response.is_server_error:
+                raise AnkiConnectConnectionError(
+                    f"AnkiConnect failed to answer: {e}"
+                ) from e
+            raise AnkiConnectClientError(f"AnkiConnect refused the request: {e}") from e
         except json.JSONDecodeError as e:
             raise AnkiConnectClientError(f"Invalid JSON response: {e}") from e
 
+        self._timeouts.observe(time.monotonic() - started_at)
+        return data
+
+    def _schedule_flush(self, options: CoalescingOptions) -> None:
+        if len(self._pending) >= options.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            loop = aio.get_running_loop()
+            self._flush_handle = (
+                loop.call_later(options.max_delay, self._flush)
+                if options.max_delay > 0
+                else loop.call_soon(self._flush)
+            )
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = aio.create_task(self._send_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _send_batch(self, batch: t.Sequence[_Pending]) -> None:
+        if len(batch) == 1:
+            payload, future = batch[0]
+            outcomes: list[t.Any] = [await _captured(self._send(payload))]
+        else:
+            try:
+                raw_results = await self._send(
+                    {
+                        "action": "multi",
+                        "version": 6,
+                        "params": {"actions": [payload for payload, _ in batch]},
+                    }
+                )
+                if not isinstance(raw_results, list) or len(raw_results) != len(batch):
+                    raise AnkiConnectAPIError("Unexpected response format")
+                outcomes = [_unwrap_multi_result(r) for r in raw_results]
+            except Exception as e:
+                outcomes = [e] * len(batch)
+
+        for (_, future), outcome in zip(batch, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
     async def add_note(self, note: NoteData) -> int:
         result = await self._request("addNote", note=note)
         if result is None:
             raise AnkiConnectAPIError("Failed to add note")
         return result
 
+    async def add_notes(self, notes: t.Sequence[NoteData]) -> AddNotesResponse:
+        """Add notes in a single round-trip; yields a note id or an error per note."""
+        if not notes:
+            return []
+
+        raw_results = await self._request("addNotes", notes=list(notes))
+        if not isinstance(raw_results, list) or len(raw_results) != len(notes):
+            raise AnkiConnectAPIError("Unexpected response format")
+
+        return [
+            AnkiConnectAPIError("Failed to add note") if note_id is None else note_id
+            for note_id in raw_results
+        ]
+
     async def can_add_notes_with_error_detail(
         self, notes: t.Sequence[NoteData]
     ) -> CanAddNotesResponse:
@@ -153,3 +401,76 @@ class AnkiConnectClient:
             )
         except pydantic.ValidationError as e:
             raise AnkiConnectAPIError("Unexpected response format") from e
+
+    async def find_notes(self, query: str) -> list[int]:
+        return list(await self._request("findNotes", query=query))
+
+    async def notes_info(self, note_ids: t.Sequence[int]) -> NotesInfoResponse:
+        if not note_ids:
+            return []
+
+        raw_results = await self._request("notesInfo", notes=list(note_ids))
+
+        try:
+            return pydantic.TypeAdapter(NotesInfoResponse).validate_python(
+                # NOTE: Notes deleted in the meantime are reported as empty objects
+                [r for r in raw_results if r]
+            )
+        except pydantic.ValidationError as e:
+            raise AnkiConnectAPIError("Unexpected response format") from e
+
+    async def model_field_names(self, model_name: str) -> list[str]:
+        return list(await self._request("modelFieldNames", modelName=model_name))
+
+    async def model_names(self) -> list[str]:
+        return list(await self._request("modelNames"))
+
+    async def deck_names(self) -> list[str]:
+        return list(await self._request("deckNames"))
+
+    async def store_media_file(
+        self,
+        filename: str,
+        *,
+        path: str | None = None,
+        data: str | None = None,
+    ) -> str:
+        """Store a file in the media folder, either read by Anki from `path` or base64 `data`."""
+        source = {"path": path} if path is not None else {"data": data}
+        return await self._request("storeMediaFile", filename=filename, **source)
+
+    async def get_media_file_names(self, pattern: str = "*") -> list[str]:
+        return list(await self._request("getMediaFilesNames", pattern=pattern))
+
+
+async def _captured(coro: t.Awaitable[t.Any]) -> t.Any:
+    try:
+        return await coro
+    except Exception as e:
+        return e
+
+
+def api_error(message: str) -> AnkiConnectAPIError:
+    """Error AnkiConnect reported, of the type its message tells."""
+    if _schema_error.search(message):
+        return AnkiSchemaError(message)
+    return AnkiConnectAPIError(message)
+
+
+# NOTE: AnkiConnect reports errors as messages only, this is the one place that reads them
+_schema_error = re.compile(r"(deck|model) was not found|unknown field")
+
+
+def _unwrap_multi_result(raw: t.Any) -> t.Any:
+    # NOTE: Actions with version >= 6 are reported by `multi` as {"result": ..., "error": ...}
+    if isinstance(raw, dict) and raw.keys() <= {"result", "error"}:
+        if raw.get("error") is not None:
+            return api_error(raw["error"])
+        return raw.get("result")
+    return raw
+
+
+def _is_idempotent(payload: t.Mapping[str, t.Any]) -> bool:
+    if payload["action"] == "multi":
+        return all(_is_idempotent(a) for a in payload["params"]["actions"])
+    return payload["action"] in IDEMPOTENT_ACTIONS
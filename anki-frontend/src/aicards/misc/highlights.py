@@ -0,0 +1,236 @@
+"""
+Local detection of highlighted and underlined text, so that only those parts of a page are sent to the LLM.
+"""
+
+import typing as t
+from collections.abc import Buffer
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+from aicards.misc.imaging import EncodedImage, decode, encode
+
+type Mask = npt.NDArray[np.bool_]
+
+
+@dataclass(frozen=True)
+class HighlightOptions:
+    # Longer side of the downscaled copy the detection runs on
+    scan_dimension: int = 1024
+    # Highlighter ink is bright and saturated, 0..1
+    min_saturation: float = 0.3
+    min_brightness: float = 0.6
+    # Underlines are dark horizontal strokes at least this long, in scan pixels, and text is as dark
+    min_underline: int = 48
+    max_underline_brightness: float = 0.4
+    # Marked pixels closer than this are one region, in scan pixels
+    gap: int = 12
+    # Regions with fewer marked pixels are noise, in scan pixels
+    min_area: int = 80
+    # Lines of context kept above and below each region, which spans its text block in width
+    context_lines: float = 1.0
+    # Blank columns wider than this separate text blocks, in scan pixels
+    column_gap: int = 48
+    # Line height assumed for regions too thin to tell it, as a fraction of the scanned height
+    line_height: float = 1 / 40
+    # Crops covering more of the page than this aren't worth it
+    max_coverage: float = 0.6
+
+
+@dataclass(frozen=True)
+class Region:
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def area(self) -> int:
+        return (self.right - self.left) * (self.bottom - self.top)
+
+    def overlaps(self, other: "Region") -> bool:
+        return (
+            self.left < other.right
+            and other.left < self.right
+            and self.top < other.bottom
+            and other.top < self.bottom
+        )
+
+    def union(self, other: "Region") -> "Region":
+        return Region(
+            min(self.left, other.left),
+            min(self.top, other.top),
+            max(self.right, other.right),
+            max(self.bottom, other.bottom),
+        )
+
+
+def crop(
+    data: bytes, options: HighlightOptions = HighlightOptions()
+) -> list[EncodedImage]:
+    """PNG crops of the emphasized parts of an image, top to bottom; empty if there is nothing worth cropping to."""
+    image = decode(data)
+    crops = []
+    for region in detect(image, options):
+        part = image.copy(
+            region.left,
+            region.top,
+            region.right - region.left,
+            region.bottom - region.top,
+        )
+        crops.append(
+            EncodedImage(
+                data=encode(part, "PNG"),
+                mime="image/png",
+                width=part.width(),
+                height=part.height(),
+            )
+        )
+    return crops
+
+
+def detect(
+    image: QImage, options: HighlightOptions = HighlightOptions()
+) -> list[Region]:
+    """Regions of the image with highlighted or underlined text plus their context, in image coordinates."""
+    if image.isNull():
+        return []
+
+    scale = min(1.0, options.scan_dimension / max(image.width(), image.height()))
+    scanned = image.scaled(
+        max(1, round(image.width() * scale)),
+        max(1, round(image.height() * scale)),
+        Qt.AspectRatioMode.IgnoreAspectRatio,
+        Qt.TransformationMode.SmoothTransformation,
+    ).convertToFormat(QImage.Format.Format_RGB32)
+
+    rgb = _pixels(scanned)
+    highest, lowest = rgb.max(axis=2), rgb.min(axis=2)
+    brightness = highest / 255
+    saturation = (highest - lowest) / np.maximum(highest, 1)
+
+    highlighted = (saturation >= options.min_saturation) & (
+        brightness >= options.min_brightness
+    )
+    dark = brightness <= options.max_underline_brightness
+    underlined = _horizontal_strokes(dark, options.min_underline)
+    marked = highlighted | underlined
+
+    height, width = marked.shape
+    line = max(1, round(height * options.line_height))
+    regions = []
+    for box in _boxes(marked, options.gap):
+        if marked[box.top : box.bottom, box.left : box.right].sum() < options.min_area:
+            continue
+        margin = round(max(box.bottom - box.top, line) * options.context_lines)
+        top, bottom = max(0, box.top - margin), min(height, box.bottom + margin)
+        # NOTE: Whole lines are kept, as the sentence around an emphasis is its context
+        left, right = _text_block(dark[top:bottom], box, options.column_gap)
+        regions.append(
+            Region(
+                max(0, left - line),
+                top,
+                min(width, right + line),
+                bottom,
+            )
+        )
+
+    regions = _merged(regions)
+    if sum(r.area for r in regions) > options.max_coverage * width * height:
+        return []
+
+    return [
+        Region(
+            max(0, int(r.left / scale)),
+            max(0, int(r.top / scale)),
+            min(image.width(), round(r.right / scale)),
+            min(image.height(), round(r.bottom / scale)),
+        )
+        for r in regions
+    ]
+
+
+def _pixels(image: QImage) -> npt.NDArray[np.int32]:
+    """RGB channels of a 32-bit image, height x width x 3."""
+    bits = image.constBits()
+    assert bits is not None, "Pixels of a null image"
+    bits.setsize(image.sizeInBytes())
+    # NOTE: sip's voidptr exposes the buffer protocol, its stubs just don't say so
+    rows = np.frombuffer(t.cast(Buffer, bits), np.uint8).reshape(
+        image.height(), image.bytesPerLine()
+    )
+    # NOTE: Format_RGB32 is 0xffRRGGBB, i.e. B, G, R, ff bytes in little-endian memory
+    bgra = rows[:, : image.width() * 4].reshape(image.height(), image.width(), 4)
+    return bgra[:, :, 2::-1].astype(np.int32)
+
+
+def _horizontal_strokes(dark: Mask, length: int) -> Mask:
+    """Dark pixels in horizontal runs of at least `length` that are thin, unlike blocks of text or filled shapes."""
+    height, width = dark.shape
+    if width < length:
+        return np.zeros_like(dark)
+
+    runs = np.zeros((height, width + 1), np.int32)
+    np.cumsum(dark, axis=1, out=runs[:, 1:])
+    starts = (runs[:, length:] - runs[:, :-length]) == length
+
+    # NOTE: A pixel is in a long run if any window of `length` covering it is all dark
+    covered = np.zeros((height, width + 1), np.int32)
+    np.cumsum(np.pad(starts, ((0, 0), (0, length - 1))), axis=1, out=covered[:, 1:])
+    strokes = covered[:, length:] > covered[:, :-length]
+    strokes = np.pad(strokes, ((0, 0), (length - 1, 0)))[:, :width]
+
+    thickness = 3
+    above = np.pad(dark, ((thickness, 0), (0, 0)))[:height]
+    below = np.pad(dark, ((0, thickness), (0, 0)))[thickness:]
+    return strokes & ~(above & below)
+
+
+def _text_block(dark: Mask, box: Region, gap: int) -> tuple[int, int]:
+    """Columns spanned by the text around the box, up to blank gutters wider than `gap`."""
+    left, right = box.left, box.right
+    for start, end in _runs(dark.any(axis=0), gap):
+        if start < box.right and box.left < end:
+            left, right = min(left, start), max(right, end)
+    return left, right
+
+
+def _boxes(marked: Mask, gap: int) -> list[Region]:
+    """Bounding boxes of clusters of marked pixels: bands of rows, then runs of columns within each band."""
+    boxes = []
+    for top, bottom in _runs(marked.any(axis=1), gap):
+        band = marked[top:bottom]
+        for left, right in _runs(band.any(axis=0), gap):
+            rows = np.flatnonzero(band[:, left:right].any(axis=1))
+            boxes.append(
+                Region(left, top + int(rows[0]), right, top + int(rows[-1]) + 1)
+            )
+    return boxes
+
+
+def _runs(present: Mask, gap: int) -> list[tuple[int, int]]:
+    """Spans of indices where `present` holds, bridging holes of up to `gap`."""
+    indices = np.flatnonzero(present)
+    if not len(indices):
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > gap + 1)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _merged(regions: list[Region]) -> list[Region]:
+    """Overlapping regions joined, top to bottom."""
+    merged: list[Region] = []
+    for region in sorted(regions, key=lambda r: (r.top, r.left)):
+        while True:
+            overlapping = next((m for m in merged if m.overlaps(region)), None)
+            if overlapping is None:
+                break
+            merged.remove(overlapping)
+            region = region.union(overlapping)
+        merged.append(region)
+    return sorted(merged, key=lambda r: (r.top, r.left))
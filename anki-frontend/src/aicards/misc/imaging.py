@@ -0,0 +1,185 @@
+import math
+import typing as t
+from dataclasses import dataclass
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt5.QtGui import QImage, QImageReader, QImageWriter
+
+type ImageFormat = t.Literal["PNG", "JPEG", "WEBP"]
+
+_mimes: dict[ImageFormat, str] = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    mime: str
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class PreprocessedImage(EncodedImage):
+    source_width: int
+    source_height: int
+
+
+@dataclass(frozen=True)
+class PreprocessingOptions:
+    # Longest side after downscaling; None keeps the original resolution
+    max_dimension: int | None = 1568
+    grayscale: bool = False
+    # Palette size for color reduction; None keeps full color
+    colors: int | None = None
+    format: ImageFormat = "JPEG"
+    # 0..100, ignored by lossless formats
+    quality: int = 80
+
+
+@dataclass(frozen=True)
+class TilingOptions:
+    # Images with a longer side are split into tiles
+    threshold: int = 2400
+    tile_size: int = 1536
+    overlap: int = 160
+
+
+def decode(data: bytes) -> QImage:
+    image = QImage()
+    if not image.loadFromData(data):
+        raise ValueError("Unsupported or corrupted image data")
+    return image
+
+
+def dimensions(data: bytes) -> tuple[int, int]:
+    """Width and height read from the image header, without decoding the pixels."""
+    buffer = QBuffer()
+    buffer.setData(data)
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    size = QImageReader(buffer).size()
+    if not size.isValid():
+        raise ValueError("Unsupported or corrupted image data")
+    return size.width(), size.height()
+
+
+def writable(format: ImageFormat) -> ImageFormat:
+    if format == "WEBP" and b"webp" not in QImageWriter.supportedImageFormats():
+        # NOTE: WebP comes from an optional Qt image format plugin
+        return "JPEG"
+    return format
+
+
+def encode(image: QImage, format: ImageFormat = "PNG", quality: int = -1) -> bytes:
+    byte_array = QByteArray()
+    buffer = QBuffer(byte_array)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, format, quality)
+    buffer.close()
+    return bytes(byte_array.data())
+
+
+def preprocess(data: bytes, options: PreprocessingOptions) -> PreprocessedImage:
+    """Downscale, reduce colors of and re-encode an image."""
+    image = source = decode(data)
+
+    if options.max_dimension is not None and (
+        max(image.width(), image.height()) > options.max_dimension
+    ):
+        image = image.scaled(
+            options.max_dimension,
+            options.max_dimension,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation,
+        )
+
+    if options.grayscale:
+        image = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    elif options.colors is not None:
+        image = image.convertToFormat(
+            QImage.Format.Format_Indexed8,
+            _palette(image, options.colors),
+            Qt.ImageConversionFlag.ThresholdDither,
+        )
+
+    format = writable(options.format)
+    if format == "JPEG" and image.format() == QImage.Format.Format_Indexed8:
+        # NOTE: JPEG has no palettes, so the reduction would be lost anyway
+        format = "PNG"
+
+    return PreprocessedImage(
+        data=encode(image, format, options.quality),
+        mime=_mimes[format],
+        width=image.width(),
+        height=image.height(),
+        source_width=source.width(),
+        source_height=source.height(),
+    )
+
+
+def split(
+    data: bytes, tile_size: int, overlap: int, format: ImageFormat = "PNG"
+) -> list[EncodedImage]:
+    """
+    Cut an image into overlapping tiles no larger than `tile_size` on either side.
+
+    Tiles go row by row, top to bottom.
+    """
+    image = decode(data)
+    columns = _spans(image.width(), tile_size, overlap)
+    rows = _spans(image.height(), tile_size, overlap)
+
+    tiles = []
+    for top, bottom in rows:
+        for left, right in columns:
+            tile = image.copy(left, top, right - left, bottom - top)
+            tiles.append(
+                EncodedImage(
+                    data=encode(tile, format),
+                    mime=_mimes[format],
+                    width=tile.width(),
+                    height=tile.height(),
+                )
+            )
+    return tiles
+
+
+def estimate_vision_tokens(width: int, height: int) -> int:
+    """
+    Tokens a "high detail" image costs on OpenAI vision models.
+
+    The image is fit into 2048x2048, then its shortest side into 768, then it's billed per 512px tile.
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = int(round(width * scale)), int(round(height * scale))
+    scale = min(1.0, 768 / min(width, height))
+    width, height = int(round(width * scale)), int(round(height * scale))
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _spans(length: int, size: int, overlap: int) -> list[tuple[int, int]]:
+    """Evenly spread windows of `size` covering `length`, each overlapping the next by at least `overlap`."""
+    if length <= size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (size - overlap))
+    starts = [round(i * (length - size) / (count - 1)) for i in range(count)]
+    return [(start, start + size) for start in starts]
+
+
+def _palette(image: QImage, colors: int) -> list[int]:
+    """Most frequent colors of a thumbnail, quantized to 5 bits per channel."""
+    thumbnail = image.scaled(
+        64, 64, Qt.AspectRatioMode.KeepAspectRatio
+    ).convertToFormat(QImage.Format.Format_RGB32)
+
+    counts: dict[int, int] = {}
+    for y in range(thumbnail.height()):
+        for x in range(thumbnail.width()):
+            rgb = thumbnail.pixel(x, y) & 0xF8F8F8
+            counts[rgb] = counts.get(rgb, 0) + 1
+
+    frequent = sorted(counts, key=counts.__getitem__, reverse=True)[:colors]
+    return [0xFF000000 | rgb for rgb in frequent]
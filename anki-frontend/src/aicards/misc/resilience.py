@@ -0,0 +1,98 @@
+import collections
+import random
+import time
+import typing as t
+from dataclasses import dataclass
+
+type BreakerState = t.Literal["closed", "open", "half-open"]
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 3
+    base_delay: float = 0.25
+    max_delay: float = 4.0
+
+    def delay(self, attempt: int) -> float:
+        """Backoff before retrying after the given (zero-based) attempt, with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class CircuitBreaker:
+    """Fails fast after consecutive failures until a trial call succeeds again."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_started_at: float | None = None
+
+    @property
+    def state(self) -> BreakerState:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self._reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        match self.state:
+            case "closed":
+                return True
+            case "half-open" if not self._trial_pending():
+                self._trial_started_at = self._clock()
+                return True
+            case _:
+                return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._trial_pending() or self._failures >= self._failure_threshold:
+            self._opened_at = self._clock()
+        self._trial_started_at = None
+
+    def _trial_pending(self) -> bool:
+        # NOTE: A trial that never reported back (e.g. got cancelled) expires like the open state does
+        return (
+            self._trial_started_at is not None
+            and self._clock() - self._trial_started_at < self._reset_timeout
+        )
+
+
+class AdaptiveTimeout:
+    """Per-call timeout derived from payload size and recently observed latency."""
+
+    def __init__(
+        self,
+        base: float = 10.0,
+        per_kib: float = 0.05,
+        latency_factor: float = 4.0,
+        ceiling: float = 120.0,
+        window: int = 32,
+    ) -> None:
+        self._base = base
+        self._per_kib = per_kib
+        self._latency_factor = latency_factor
+        self._ceiling = ceiling
+        self._latencies = collections.deque[float](maxlen=window)
+
+    def observe(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    def timeout_for(self, payload_size: int) -> float:
+        recent = sorted(self._latencies)
+        p95 = recent[int(0.95 * (len(recent) - 1))] if recent else 0.0
+        timeout = max(self._base, p95 * self._latency_factor)
+        return min(self._ceiling, timeout + self._per_kib * payload_size / 1024)
@@ -3,15 +3,23 @@ import asyncio
 import contextlib
 import sys
 import logging
+from pathlib import Path
 
 import qasync
 from PyQt5.QtWidgets import QApplication, QMainWindow
 from openai import AsyncOpenAI
 
 from aicards.misc.logging.stdlib import StdLogger
-from aicards.misc.ankiconnect_client import AnkiConnectClient
-from aicards.ctx.aicards.core.ai import AiClient
-from aicards.ctx.aicards.core import Service
+from aicards.comproot import anki_client_running
+from aicards.ctx.aicards.core.ai import (
+    AiClient,
+    LlmTelemetry,
+    RequestScheduler,
+    ResponseCache,
+    Route,
+    Router,
+)
+from aicards.ctx.aicards.core import Service, ExportJournal
 from aicards.ctx.aicards.gui import AICardsContainer
 
 
@@ -34,19 +42,58 @@ def main() -> None:
 
         async def driver():
             async with contextlib.AsyncExitStack() as stack:
-                ankiconnect_client = await stack.enter_async_context(
-                    AnkiConnectClient.running()
+                anki_client = await stack.enter_async_context(
+                    anki_client_running(logger)
+                )
+
+                user_files = Path(__file__).parent / "user_files"
+
+                cache = stack.enter_context(
+                    contextlib.closing(
+                        ResponseCache.open(user_files / "extraction_cache.db")
+                    )
+                )
+                protonote_cache = stack.enter_context(
+                    contextlib.closing(
+                        ResponseCache.open(user_files / "protonote_cache.db")
+                    )
+                )
+
+                telemetry = LlmTelemetry()
+                stack.callback(
+                    lambda: logger.info(
+                        "LLM usage this session:\n%(report)s",
+                        {"report": telemetry.report()},
+                    )
                 )
 
                 ai_client = await stack.enter_async_context(
-                    AiClient.running(AsyncOpenAI())
+                    AiClient.running(
+                        AsyncOpenAI(),
+                        cache=cache,
+                        protonote_cache=protonote_cache,
+                        scheduler=RequestScheduler(logger=logger),
+                        telemetry=telemetry,
+                        router=Router(
+                            {"extraction": Route(("gpt-4o-mini", "gpt-4o"))},
+                            logger=logger,
+                        ),
+                        logger=logger,
+                    )
+                )
+
+                journal = stack.enter_context(
+                    contextlib.closing(
+                        ExportJournal.open(user_files / "export_journal.db")
+                    )
                 )
 
                 service = await stack.enter_async_context(
                     Service.running(
                         ai_client,
-                        ankiconnect_client,
-                        deck_name="Default",
+                        anki_client,
+                        deck_name="English",
+                        journal=journal,
                         logger=logger,
                     )
                 )
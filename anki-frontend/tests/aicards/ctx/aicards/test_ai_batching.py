@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from PyQt5.QtGui import QColor, QImage
+
+from aicards.misc import imaging
+from aicards.misc.ankiconnect_client import AnkiConnectClient
+from aicards.ctx.aicards.base import Image
+from aicards.ctx.aicards.core import Service
+from aicards.ctx.aicards.core.ai import AiClient, BatchingOptions, ResponseCache, pack
+from tests.fakes.ankiconnect import FakeAnkiConnect
+from tests.fakes.openai import FakeOpenAI, Pace, mock_openai
+
+
+def page(width: int, height: int, color: str = "white") -> Image:
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    image.fill(QColor(color))
+    return Image(name="page.png", mime="image/png", data=imaging.encode(image, "PNG"))
+
+
+def image_urls(payload: dict) -> list[str]:
+    return [
+        part["image_url"]["url"]
+        for message in payload["messages"]
+        if isinstance(message["content"], list)
+        for part in message["content"]
+        if part["type"] == "image_url"
+    ]
+
+
+def digest(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:8]
+
+
+def per_image(payload: dict) -> list[str]:
+    urls = image_urls(payload)
+    return [
+        json.dumps(
+            {
+                "message": "ok",
+                "images": [
+                    {"index": i, "extractions": [{"reason": "bold", "snippet": url}]}
+                    for i, url in reversed(list(enumerate(urls)))
+                ],
+            }
+        )
+    ]
+
+
+def test_images_are_packed_within_every_budget():
+    small, large = page(100, 100), page(2000, 2000)
+
+    assert pack([small] * 5, BatchingOptions(max_images=2)) == [[0, 1], [2, 3], [4]]
+    assert pack([small] * 3, BatchingOptions(max_bytes=2 * len(small.data))) == [
+        [0, 1],
+        [2],
+    ]
+    # NOTE: A 2000x2000 image costs 765 tokens, a 100x100 one 255
+    assert pack([small, large, small, small], BatchingOptions(max_tokens=1200)) == [
+        [0, 1],
+        [2, 3],
+    ]
+    assert pack([large], BatchingOptions(max_tokens=10)) == [[0]]
+
+
+@pytest.mark.qasync
+async def test_batch_is_sent_as_one_request_and_split_back_per_image():
+    requests: list[dict] = []
+    images = [
+        Image(name=f"{i}.png", mime="image/png", data=bytes([i])) for i in range(3)
+    ]
+
+    async with AiClient.running(mock_openai(per_image, requests)) as ai:
+        results = await ai.get_extractions_from_images(images)
+
+    assert len(requests) == 1 and len(image_urls(requests[0])) == 3
+    assert [r.extractions[0].snippet for r in results] == image_urls(requests[0])
+
+
+@pytest.mark.qasync
+async def test_cached_images_are_not_sent_again():
+    cache = ResponseCache.open(":memory:")
+    requests: list[dict] = []
+    images = [
+        Image(name=f"{i}.png", mime="image/png", data=bytes([i])) for i in range(3)
+    ]
+
+    async with AiClient.running(mock_openai(per_image, requests), cache=cache) as ai:
+        first = await ai.get_extractions_from_images(images[:2])
+        second = await ai.get_extractions_from_images(images)
+
+    assert len(image_urls(requests[1])) == 1
+    assert second[:2] == first
+
+
+@pytest.mark.qasync
+async def test_response_missing_an_image_fails_the_batch():
+    def respond(payload: dict) -> list[str]:
+        return [json.dumps({"message": "ok", "images": []})]
+
+    images = [
+        Image(name=f"{i}.png", mime="image/png", data=bytes([i])) for i in range(2)
+    ]
+    async with AiClient.running(mock_openai(respond)) as ai:
+        with pytest.raises(ValueError, match="Expected results for images"):
+            await ai.get_extractions_from_images(images)
+
+
+async def extract_batch(openai: AsyncOpenAI, images: list[Image], **kwargs):
+    async with (
+        FakeAnkiConnect.running() as (_, anki_url),
+        AnkiConnectClient.running(*anki_url.removeprefix("http://").split(":")) as anki,
+        AiClient.running(openai) as ai,
+        Service.running(ai, anki, preprocessing=None, **kwargs) as service,
+    ):
+        return await service.extract_emphases_batch(images)
+
+
+@pytest.mark.qasync
+async def test_service_packs_images_into_few_requests():
+    images = [page(400, 300, color) for color in ("white", "red", "blue", "green")]
+
+    async with FakeOpenAI.running(pace=Pace(tokens_per_second=5000)) as (fake, url):
+        results = await extract_batch(
+            AsyncOpenAI(api_key="unused", base_url=url),
+            images,
+            batching=BatchingOptions(max_images=3),
+        )
+
+    assert [len(image_urls(r)) for r in fake.requests] == [3, 1]
+    assert [len(r) for r in results] == [3, 3, 3, 3]
+    assert len({e.snippet for r in results for e in r}) == 12
+
+
+@pytest.mark.qasync
+async def test_service_falls_back_to_one_request_per_image():
+    requests: list[dict] = []
+
+    def respond(payload: dict) -> list[str] | httpx.Response:
+        urls = image_urls(payload)
+        if len(urls) > 1:
+            return httpx.Response(500, json={"error": {"message": "too many images"}})
+        extraction = {"reason": "bold", "snippet": digest(urls[0])}
+        return [json.dumps({"message": "ok", "extractions": [extraction]})]
+
+    images = [page(400, 300, color) for color in ("white", "red")]
+    results = await extract_batch(mock_openai(respond, requests), images)
+
+    assert [len(image_urls(r)) for r in requests] == [2, 1, 1]
+    assert [[e.snippet for e in r] for r in results] == [
+        [digest(f"data:image/png;base64,{base64.b64encode(i.data).decode()}")]
+        for i in images
+    ]
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import AiClient, ResponseCache, cache_key
+from tests.fakes.openai import mock_openai
+
+RESPONSE = json.dumps(
+    {"message": "ok", "extractions": [{"reason": "bold", "snippet": "word"}]}
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_max_age():
+    clock = Clock()
+    cache = ResponseCache.open(":memory:", max_age=60, clock=clock)
+    cache.put("a", b"A")
+
+    clock.now += 59
+    assert cache.get("a") == b"A"
+    clock.now += 2
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    clock = Clock()
+    cache = ResponseCache.open(":memory:", max_bytes=10, clock=clock)
+    for key in "abc":
+        clock.now += 1
+        cache.put(key, b"x" * 4)
+        if key == "b":
+            clock.now += 1
+            cache.get("a")
+
+    assert cache.get("a") == b"x" * 4
+    assert cache.get("b") is None
+    assert cache.get("c") == b"x" * 4
+
+
+def test_key_separates_parts():
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+    assert cache_key(b"img", "prompt") == cache_key("img", "prompt")
+
+
+@pytest.mark.qasync
+async def test_repeated_image_is_served_from_cache():
+    cache = ResponseCache.open(":memory:")
+    image = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+    requests: list[dict] = []
+    replayed: list[Extraction] = []
+
+    async def on_extraction(extraction: Extraction) -> None:
+        replayed.append(extraction)
+
+    openai = mock_openai(lambda _: [RESPONSE], requests)
+    async with AiClient.running(openai, cache=cache) as ai:
+        first = await ai.get_extractions_from_image(image)
+        second = await ai.get_extractions_from_image(image, on_extraction=on_extraction)
+        await ai.get_extractions_from_image(image, bypass_cache=True)
+
+    assert first == second
+    assert replayed == list(second.extractions)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(requests) == 2
+
+
+@pytest.mark.qasync
+async def test_model_is_part_of_the_key():
+    cache = ResponseCache.open(":memory:")
+    image = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+    for model in ("gpt-4o-mini", "gpt-4o"):
+        openai = mock_openai(lambda _: [RESPONSE])
+        async with AiClient.running(openai, model=model, cache=cache) as ai:
+            await ai.get_extractions_from_image(image)
+
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_tagged_entries_are_invalidated_together():
+    cache = ResponseCache.open(":memory:")
+    cache.put("a", b"1", tag="cat")
+    cache.put("b", b"2", tag="cat")
+    cache.put("c", b"3", tag="dog")
+
+    assert cache.invalidate("cat") == 2
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c") == b"3"
+    assert cache.invalidate() == 1
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from aicards.ctx.aicards.base import Extraction
+from aicards.ctx.aicards.core.ai import AiClient
+from aicards.ctx.aicards.core.ai._prompting import (
+    PrefixCacheEstimate,
+    PromptPrefix,
+    count_tokens,
+    fit_contexts,
+)
+from tests.fakes.openai import mock_openai
+
+
+def test_token_counts_are_in_the_right_ballpark():
+    sentence = "The quick brown fox jumps over the lazy dog, 12345 times."
+
+    # NOTE: About 15 tokens with OpenAI's tokenizers
+    assert 12 <= count_tokens(sentence) <= 20
+    assert count_tokens("") == 0
+
+
+def test_prefix_is_cached_once_warm_and_long_enough():
+    now = 0.0
+    estimate = PrefixCacheEstimate(min_tokens=100, step=32, ttl=60, clock=lambda: now)
+    long = PromptPrefix("word " * 200, {"type": "json_object"})
+    short = PromptPrefix("word", {"type": "json_object"})
+
+    assert estimate.cached_tokens(long) == 0
+    assert estimate.cached_tokens(long) == long.tokens // 32 * 32
+    assert estimate.cached_tokens(short) == estimate.cached_tokens(short) == 0
+
+    now = 61.0
+    assert estimate.cached_tokens(long) == 0
+
+
+def test_contexts_are_shortened_around_snippets():
+    context = "A " * 200 + "needle" + " B" * 200
+    extractions = [
+        Extraction(reason="r", snippet="needle", context=context),
+        Extraction(reason="r", snippet="short", context="A short one."),
+    ]
+
+    def count(es) -> int:
+        return sum(len(e.context or "") for e in es)
+
+    fitted = fit_contexts(extractions, 100, count)
+
+    assert count(fitted) <= 100
+    assert "needle" in fitted[0].context and fitted[0].context.startswith("…")
+    assert fitted[1] == extractions[1]
+    assert fit_contexts(extractions, 10_000, count) == extractions
+    assert [e.context for e in fit_contexts(extractions, 0, count)] == [None, None]
+
+
+def drafts_for(payload: dict) -> list[str]:
+    extractions = json.loads(payload["messages"][-1]["content"])
+    return [
+        json.dumps(
+            {
+                "message": "ok",
+                "results": [
+                    {"index": i, "protonotes": []} for i in range(len(extractions))
+                ],
+            }
+        )
+    ]
+
+
+@pytest.mark.qasync
+async def test_static_prefix_comes_first_and_never_changes():
+    requests: list[dict] = []
+    extractions = [Extraction(reason="r", snippet=f"w{i}") for i in range(4)]
+
+    async with AiClient.running(mock_openai(drafts_for, requests)) as ai:
+        await ai.generate_protonotes(extractions, batch_size=2)
+
+    first, second = requests
+    assert first["messages"][0] == second["messages"][0]
+    assert first["messages"][0]["role"] == "system"
+    assert first["response_format"] == second["response_format"]
+    assert first["messages"][1] != second["messages"][1]
+
+
+@pytest.mark.qasync
+async def test_protonote_prompts_are_trimmed_to_budget():
+    requests: list[dict] = []
+    extraction = Extraction(reason="r", snippet="needle", context="word " * 5000)
+
+    async with AiClient.running(
+        mock_openai(drafts_for, requests), prompt_budgets={"protonotes": 1500}
+    ) as ai:
+        result = await ai.generate_protonotes([extraction])
+
+    [sent] = json.loads(requests[0]["messages"][-1]["content"])
+    assert len(sent["context"]) < len(extraction.context) / 2
+    # NOTE: Results still refer to the extractions as given
+    assert result.results[0].extraction == extraction
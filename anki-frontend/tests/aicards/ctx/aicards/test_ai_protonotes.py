@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+
+from aicards.ctx.aicards.base import (
+    EnglishNounProtonote,
+    Extraction,
+    MeaningProtonote,
+)
+from aicards.ctx.aicards.core.ai import AiClient, ResponseCache
+from tests.fakes.openai import mock_openai
+
+
+def extraction(snippet: str) -> Extraction:
+    return Extraction(reason="bold", snippet=snippet)
+
+
+def drafts_for(payload: dict) -> str:
+    extractions = json.loads(payload["messages"][-1]["content"])
+    return json.dumps(
+        {
+            "message": "ok",
+            "results": [
+                {
+                    "index": i,
+                    "protonotes": [
+                        {
+                            "type": "Meaning",
+                            "concept": e["snippet"],
+                            "examples": [f"{e['snippet']} in a sentence"],
+                        },
+                        {"type": "English Noun", "singular": "cat", "plural": "cats"},
+                    ],
+                }
+                for i, e in reversed(list(enumerate(extractions)))
+            ],
+        }
+    )
+
+
+@pytest.mark.qasync
+async def test_extractions_are_batched_and_merged_in_input_order():
+    requests: list[dict] = []
+    extractions = [extraction(f"word {i}") for i in range(12)]
+
+    async with AiClient.running(mock_openai(lambda p: [drafts_for(p)], requests)) as ai:
+        result = await ai.generate_protonotes(extractions, batch_size=5)
+
+    assert len(requests) == 3
+    assert [r.extraction for r in result.results] == extractions
+    assert not result.failed
+
+    meaning, noun = result.results[7].protonotes
+    assert isinstance(meaning, MeaningProtonote) and meaning.concept == "word 7"
+    assert meaning.examples[0] is not None and meaning.examples[1] is None
+    assert isinstance(noun, EnglishNounProtonote) and noun.plural == "cats"
+    assert len({p.id for r in result.results for p in r.protonotes}) == 24
+
+
+@pytest.mark.qasync
+async def test_batches_run_concurrently_up_to_the_limit():
+    in_flight = peak = 0
+
+    async def respond(payload: dict) -> list[str]:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [drafts_for(payload)]
+
+    async with AiClient.running(mock_openai(respond)) as ai:
+        await ai.generate_protonotes(
+            [extraction(str(i)) for i in range(20)], batch_size=2, max_in_flight=3
+        )
+
+    assert peak == 3
+
+
+@pytest.mark.qasync
+async def test_malformed_batch_is_retried_then_reported_without_failing_others():
+    calls: dict[str, int] = {}
+
+    def respond(payload: dict) -> list[str]:
+        first = json.loads(payload["messages"][-1]["content"])[0]["snippet"]
+        calls[first] = calls.get(first, 0) + 1
+        if first == "flaky" and calls[first] == 1:
+            return ['{"message": "truncated", "results": [']
+        if first == "broken":
+            return ['{"message": "no results", "results": []}']
+        return [drafts_for(payload)]
+
+    extractions = [extraction(s) for s in ("flaky", "a", "broken", "b", "c")]
+    async with AiClient.running(mock_openai(respond)) as ai:
+        result = await ai.generate_protonotes(extractions, batch_size=2, attempts=2)
+
+    assert calls == {"flaky": 2, "broken": 2, "c": 1}
+    assert [r.extraction.snippet for r in result.results] == ["flaky", "a", "c"]
+    assert [e.snippet for e in result.failed] == ["broken", "b"]
+
+
+@pytest.mark.qasync
+async def test_only_extractions_missing_from_the_cache_are_sent():
+    cache = ResponseCache.open(":memory:")
+    sent: list[str] = []
+
+    def respond(payload: dict) -> list[str]:
+        sent.extend(
+            e["snippet"] for e in json.loads(payload["messages"][-1]["content"])
+        )
+        return [drafts_for(payload)]
+
+    async with AiClient.running(mock_openai(respond), protonote_cache=cache) as ai:
+        first = await ai.generate_protonotes([extraction("cat"), extraction("dog")])
+        second = await ai.generate_protonotes(
+            [extraction("  Dog "), extraction("bird"), extraction("CAT")]
+        )
+
+    assert sent == ["cat", "dog", "bird"]
+    assert [r.extraction.snippet for r in second.results] == ["  Dog ", "bird", "CAT"]
+    assert second.results[0].protonotes[0].concept == "dog"
+    assert "2 from cache" in second.message
+    # NOTE: Cached protonotes become new notes, so they get new ids
+    assert first.results[1].protonotes[0].id != second.results[0].protonotes[0].id
+
+
+@pytest.mark.qasync
+async def test_invalidated_snippets_are_generated_again():
+    cache = ResponseCache.open(":memory:")
+    requests: list[dict] = []
+    extractions = [extraction("cat"), extraction("dog")]
+
+    openai = mock_openai(lambda p: [drafts_for(p)], requests)
+    async with AiClient.running(openai, protonote_cache=cache) as ai:
+        await ai.generate_protonotes(extractions)
+        assert ai.invalidate_protonotes("Cat") == 1
+        await ai.generate_protonotes(extractions)
+
+    assert json.loads(requests[1]["messages"][-1]["content"])[0]["snippet"] == "cat"
+    assert len(json.loads(requests[1]["messages"][-1]["content"])) == 1
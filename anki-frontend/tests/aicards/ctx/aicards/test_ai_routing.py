@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import AiClient, ResponseCache, Route, Router
+from tests.fakes.openai import mock_openai
+
+IMAGE = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+RESULT = json.dumps(
+    {
+        "message": "ok",
+        "extractions": [{"reason": "bold", "snippet": "cat"}],
+    }
+)
+
+
+def answering(delays: dict[str, float], failing: set[str] = set()):
+    async def respond(payload: dict):
+        model = payload["model"]
+        await asyncio.sleep(delays.get(model, 0.0))
+        if model in failing:
+            return httpx.Response(500, json={"error": {"message": "boom"}})
+        return [RESULT[:10], RESULT[10:]]
+
+    return respond
+
+
+@pytest.mark.qasync
+async def test_slow_calls_are_hedged_with_the_fallback_model():
+    requests: list[dict] = []
+    router = Router({"extraction": Route(("slow", "fast"), initial_hedge_delay=0.05)})
+    streamed: list[Extraction] = []
+
+    async def on_extraction(extraction: Extraction) -> None:
+        streamed.append(extraction)
+
+    client = mock_openai(answering({"slow": 5.0}), requests)
+    async with AiClient.running(client, router=router) as ai:
+        started_at = asyncio.get_running_loop().time()
+        result = await ai.get_extractions_from_image(IMAGE, on_extraction=on_extraction)
+        elapsed = asyncio.get_running_loop().time() - started_at
+
+    assert [r["model"] for r in requests] == ["slow", "fast"]
+    assert [e.snippet for e in result.extractions] == ["cat"]
+    # NOTE: Only the winner's stream is read
+    assert streamed == list(result.extractions)
+    assert elapsed < 1.0
+    metrics = router.metrics["extraction"]
+    assert (metrics.calls, metrics.hedged, metrics.hedges_won) == (1, 1, 1)
+
+
+@pytest.mark.qasync
+async def test_fast_answers_are_not_hedged():
+    requests: list[dict] = []
+    router = Router({"extraction": Route(("primary", "fallback"))})
+
+    async with AiClient.running(
+        mock_openai(answering({}), requests), router=router
+    ) as ai:
+        await ai.get_extractions_from_image(IMAGE)
+
+    assert [r["model"] for r in requests] == ["primary"]
+    assert router.metrics["extraction"].hedge_rate == 0.0
+
+
+@pytest.mark.qasync
+async def test_failures_fall_back_right_away():
+    requests: list[dict] = []
+    router = Router({"extraction": Route(("broken", "backup"))})
+
+    async with AiClient.running(
+        mock_openai(answering({}, failing={"broken"}), requests), router=router
+    ) as ai:
+        result = await ai.get_extractions_from_image(IMAGE)
+
+    assert [r["model"] for r in requests] == ["broken", "backup"]
+    assert len(result.extractions) == 1
+    assert router.metrics["extraction"].fallbacks == 1
+
+
+@pytest.mark.qasync
+async def test_fallback_answers_are_not_cached_as_the_preferred_model():
+    cache = ResponseCache.open(":memory:")
+    requests: list[dict] = []
+    router = Router({"extraction": Route(("broken", "backup"))})
+    failing = {"broken"}
+
+    async with AiClient.running(
+        mock_openai(answering({}, failing), requests), cache=cache, router=router
+    ) as ai:
+        await ai.get_extractions_from_image(IMAGE)
+        failing.clear()
+        await ai.get_extractions_from_image(IMAGE)
+        await ai.get_extractions_from_image(IMAGE)
+
+    assert [r["model"] for r in requests] == ["broken", "backup", "broken"]
+
+
+@pytest.mark.qasync
+async def test_hedge_delay_follows_recent_latencies():
+    route = Route(("m",), hedge_percentile=0.5, min_samples=4, min_hedge_delay=0.0)
+    router = Router({"protonotes": route})
+
+    assert router.hedge_delay("protonotes") == route.initial_hedge_delay
+    for delay in (0.01, 0.02, 0.03, 0.2):
+
+        async def attempt(model: str, delay=delay) -> str:
+            await asyncio.sleep(delay)
+            return model
+
+        assert await router.run("protonotes", attempt) == ("m", "m")
+
+    assert 0.02 < router.hedge_delay("protonotes") < 0.1
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from aicards.ctx.aicards.base import Extraction
+from aicards.ctx.aicards.core.ai import AiClient, RateLimits, RequestScheduler
+from aicards.ctx.aicards.core.ai._scheduler import TokenBucket
+from tests.fakes.openai import mock_openai
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_refills_over_time():
+    clock = Clock()
+    bucket = TokenBucket(capacity=10, per_second=2, clock=clock)
+    bucket.take(10)
+
+    assert bucket.time_until(4) == 2.0
+    clock.now += 1
+    assert bucket.time_until(4) == 1.0
+    # NOTE: Oversized requests wait for a full bucket instead of forever
+    assert bucket.time_until(100) == 4.0
+
+
+@pytest.mark.qasync
+async def test_interactive_calls_overtake_queued_background_ones():
+    scheduler = RequestScheduler(RateLimits(requests_per_minute=600))
+    order: list[str] = []
+
+    async def call(name: str, priority) -> None:
+        await scheduler.acquire(priority, tokens=1)
+        order.append(name)
+
+    # NOTE: Bucket starts full, so drain it to make everyone queue
+    scheduler._requests.take(600)
+
+    background = [asyncio.create_task(call(f"b{i}", "background")) for i in range(3)]
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call("i", "interactive"))
+    await asyncio.sleep(0)
+
+    assert scheduler.metrics.queued == {"interactive": 1, "background": 3}
+    await asyncio.gather(interactive, *background)
+
+    assert order[0] == "i"
+    assert scheduler.metrics.admitted == 4
+    assert scheduler.metrics.max_wait > 0
+
+
+@pytest.mark.qasync
+async def test_rate_limited_call_waits_for_retry_after():
+    scheduler = RequestScheduler(RateLimits(attempts=3))
+    loop = asyncio.get_running_loop()
+    calls: list[float] = []
+
+    def respond(payload: dict) -> list[str] | httpx.Response:
+        calls.append(loop.time())
+        if len(calls) == 1:
+            return httpx.Response(
+                429,
+                headers={"retry-after-ms": "50"},
+                json={"error": {"message": "slow down"}},
+            )
+        response = {
+            "message": "ok",
+            "results": [{"index": 0, "protonotes": []}],
+        }
+        return [json.dumps(response)]
+
+    async with AiClient.running(mock_openai(respond), scheduler=scheduler) as ai:
+        result = await ai.generate_protonotes(
+            [Extraction(reason="bold", snippet="a")], attempts=1
+        )
+
+    assert len(result.results) == 1
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.05
+    assert scheduler.metrics.throttled == 1
@@ -0,0 +1,68 @@
+import json
+import typing as t
+
+import pydantic
+import pytest
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import AiClient, ExtractionResult
+from aicards.ctx.aicards.core.ai._drafts import ProtonoteDraftsResponse
+from aicards.ctx.aicards.core.ai._schemas import strict_response_format
+from tests.fakes.openai import mock_openai
+
+IMAGE = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+RESULT = json.dumps({"message": "ok", "extractions": [{"reason": "r", "snippet": "s"}]})
+
+
+def objects(node: t.Any) -> t.Iterator[dict]:
+    if isinstance(node, list):
+        for item in node:
+            yield from objects(item)
+    elif isinstance(node, dict):
+        if node.get("type") == "object":
+            yield node
+        for value in node.values():
+            yield from objects(value)
+
+
+@pytest.mark.parametrize("model", [ExtractionResult, ProtonoteDraftsResponse])
+def test_strict_schemas_close_every_object(model: type):
+    response_format = strict_response_format("x", pydantic.TypeAdapter(model))
+    schema = response_format["json_schema"]["schema"]
+    dumped = json.dumps(schema)
+
+    assert response_format["json_schema"]["strict"] is True
+    assert all(
+        o["additionalProperties"] is False and o["required"] == list(o["properties"])
+        for o in objects(schema)
+    )
+    assert '"oneOf"' not in dumped and '"default"' not in dumped
+    assert '"discriminator"' not in dumped
+
+
+@pytest.mark.qasync
+async def test_schema_is_sent_as_response_format_instead_of_in_the_prompt():
+    requests: list[dict] = []
+
+    async with AiClient.running(mock_openai(lambda _: [RESULT], requests)) as ai:
+        result = await ai.get_extractions_from_image(IMAGE)
+
+    [request] = requests
+    assert request["response_format"]["type"] == "json_schema"
+    assert "$defs" not in request["messages"][0]["content"]
+    assert result.extractions == (Extraction(reason="r", snippet="s"),)
+
+
+@pytest.mark.qasync
+async def test_providers_without_structured_outputs_get_the_schema_in_the_prompt():
+    requests: list[dict] = []
+
+    async with AiClient.running(
+        mock_openai(lambda _: [RESULT], requests), strict_schema=False
+    ) as ai:
+        await ai.get_extractions_from_image(IMAGE)
+
+    [request] = requests
+    assert request["response_format"] == {"type": "json_object"}
+    assert "$defs" in request["messages"][0]["content"]
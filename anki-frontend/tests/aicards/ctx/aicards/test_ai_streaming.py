@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import AiClient
+from aicards.ctx.aicards.core.ai._streaming import JsonArrayItems
+from tests.fakes.openai import mock_openai
+
+RESPONSE = json.dumps(
+    {
+        "message": "Found 2 emphases",
+        "extractions": [
+            {"reason": "bold", "snippet": 'say "hi" {sic}', "context": None},
+            {"reason": "underlined", "snippet": "[brackets]", "comment": "x"},
+        ],
+    }
+)
+
+
+def fragments(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(RESPONSE)])
+def test_items_are_parsed_regardless_of_fragmentation(size: int):
+    scanner = JsonArrayItems("extractions")
+    items = [item for f in fragments(RESPONSE, size) for item in scanner.feed(f)]
+
+    assert items == json.loads(RESPONSE)["extractions"]
+
+
+def test_item_is_emitted_as_soon_as_it_closes():
+    scanner = JsonArrayItems("extractions")
+    first_end = RESPONSE.index("}, {") + 1
+
+    assert scanner.feed(RESPONSE[: first_end - 1]) == []
+    assert len(scanner.feed(RESPONSE[first_end - 1 : first_end])) == 1
+
+
+def test_arrays_of_other_members_are_ignored():
+    scanner = JsonArrayItems("extractions")
+    document = json.dumps(
+        {"other": [{"a": 1}], "nested": {"extractions": [{"b": 2}]}, "extractions": []}
+    )
+
+    assert scanner.feed(document) == []
+
+
+@pytest.mark.qasync
+async def test_extractions_are_streamed_before_the_response_completes():
+    tokens: list[str] = []
+    extractions: list[tuple[Extraction, int]] = []
+
+    async def on_token(token: str) -> None:
+        tokens.append(token)
+
+    async def on_extraction(extraction: Extraction) -> None:
+        extractions.append((extraction, len(tokens)))
+
+    requests: list[dict] = []
+    openai = mock_openai(lambda _: fragments(RESPONSE, 5), requests)
+    async with AiClient.running(openai) as ai:
+        result = await ai.get_extractions_from_image(
+            Image(name="shot.png", mime="image/png", data=b"pixels"),
+            on_token=on_token,
+            on_extraction=on_extraction,
+        )
+
+    assert requests[0]["stream"] is True
+    assert "".join(tokens) == RESPONSE
+    assert [e for e, _ in extractions] == list(result.extractions)
+    assert extractions[0][1] < extractions[1][1]
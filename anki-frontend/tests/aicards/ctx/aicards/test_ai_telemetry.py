@@ -0,0 +1,71 @@
+import pytest
+from openai import AsyncOpenAI
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import (
+    AiClient,
+    CallStats,
+    LlmTelemetry,
+    RateLimits,
+    RequestScheduler,
+)
+from tests.fakes.openai import FakeOpenAI, Faults, Pace
+
+IMAGE = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+
+@pytest.mark.qasync
+async def test_calls_are_recorded_per_stage():
+    telemetry = LlmTelemetry()
+    extractions = [Extraction(reason="bold", snippet=f"w{i}") for i in range(4)]
+
+    async with FakeOpenAI.running(pace=Pace(tokens_per_second=10_000)) as (_, url):
+        async with AiClient.running(
+            AsyncOpenAI(api_key="unused", base_url=url), telemetry=telemetry
+        ) as ai:
+            await ai.get_extractions_from_image(IMAGE)
+            await ai.generate_protonotes(extractions, batch_size=2)
+
+    extraction, protonotes = (
+        telemetry.stages["extraction"],
+        telemetry.stages["protonotes"],
+    )
+    assert (extraction.calls, protonotes.calls) == (1, 2)
+    assert extraction.streamed == 1 and 0 < extraction.mean_time_to_first_token
+    assert extraction.mean_time_to_first_token <= extraction.mean_latency
+    assert protonotes.streamed == 0
+    assert all(
+        s.prompt_tokens > 0 and s.completion_tokens > 0
+        for s in (extraction, protonotes)
+    )
+    assert extraction.request_bytes > len(IMAGE.data)
+    assert 0 < extraction.cost < 0.01
+    assert "extraction" in telemetry.report()
+
+
+@pytest.mark.qasync
+async def test_retries_and_failures_are_counted():
+    telemetry = LlmTelemetry()
+    faults = Faults(rate_limit_rate=0.5, retry_after=0.01)
+
+    async with FakeOpenAI.running(faults=faults, seed=3) as (fake, url):
+        async with AiClient.running(
+            AsyncOpenAI(api_key="unused", base_url=url),
+            scheduler=RequestScheduler(RateLimits(attempts=20)),
+            telemetry=telemetry,
+        ) as ai:
+            await ai.get_extractions_from_image(IMAGE)
+
+    [stage] = telemetry.stages.values()
+    assert stage.retries == len(fake.requests) - 1 > 0
+    assert stage.failures == 0
+
+
+def test_unknown_models_cost_nothing():
+    telemetry = LlmTelemetry()
+    stats = CallStats("extraction", "local-llama", 100, prompt_tokens=10**6)
+
+    assert telemetry.cost_of(stats) == 0.0
+    assert telemetry.cost_of(
+        CallStats("extraction", "gpt-4o-mini", 100, prompt_tokens=10**6)
+    ) == pytest.approx(0.15)
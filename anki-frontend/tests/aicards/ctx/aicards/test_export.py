@@ -0,0 +1,73 @@
+import uuid
+
+import pytest
+from openai import AsyncOpenAI
+
+from aicards.misc.ankiconnect_client import AnkiConnectClient
+from aicards.ctx.aicards.base import Example, MeaningProtonote
+from aicards.ctx.aicards.core import Service
+from aicards.ctx.aicards.core.ai import AiClient
+from tests.fakes.ankiconnect import FakeAnkiConnect
+
+
+def protonote(concept: str) -> MeaningProtonote:
+    return MeaningProtonote(
+        id=f"proto-{uuid.uuid4()}",
+        type="Meaning",
+        concept=concept,
+        examples=(Example(sentence=f"{concept} in a sentence", image=None), None),
+    )
+
+
+@pytest.mark.qasync
+async def test_duplicate_in_a_batch_does_not_fail_the_rest():
+    async with FakeAnkiConnect.running() as (fake, url):
+        # NOTE: Anki checks duplicates across decks, the service only knows its own deck
+        fake.dispatch(
+            {
+                "action": "addNote",
+                "params": {
+                    "note": {
+                        "deckName": "English",
+                        "modelName": "Meaning",
+                        "fields": {"Concept": "cat"},
+                    }
+                },
+            }
+        )
+
+        async with (
+            AnkiConnectClient.running(*url.removeprefix("http://").split(":")) as anki,
+            AiClient.running(AsyncOpenAI(api_key="unused")) as ai,
+            Service.running(ai, anki) as service,
+        ):
+            protonotes = [protonote(c) for c in ("dog", "cat", "bird")]
+            results = await service.export_protonotes(protonotes)
+            await service.export_protonotes(protonotes)
+
+    concepts = sorted(n["fields"]["Concept"] for n in fake.notes.values())
+    assert concepts == ["bird", "cat", "dog"]
+    assert [r.protonote for r in results] == protonotes
+    assert not any(r.queued for r in results)
+    assert results[0].ok and results[2].ok
+    assert not results[1].ok and "duplicate" in (results[1].error or "")
+    assert all(r.note_id is not None for r in results if r.ok)
+
+
+@pytest.mark.qasync
+async def test_notes_deleted_in_anki_can_be_exported_again():
+    async with (
+        FakeAnkiConnect.running() as (fake, url),
+        AnkiConnectClient.running(*url.removeprefix("http://").split(":")) as anki,
+        AiClient.running(AsyncOpenAI(api_key="unused")) as ai,
+        Service.running(ai, anki) as service,
+    ):
+        [first] = await service.export_protonotes([protonote("dog")])
+        assert await service.preflight_protonotes([protonote("dog")])
+
+        fake.dispatch({"action": "deleteNotes", "params": {"notes": [first.note_id]}})
+        assert not await service.preflight_protonotes([protonote("dog")])
+        [second] = await service.export_protonotes([protonote("dog")])
+
+    assert first.ok and second.ok and second.note_id != first.note_id
+    assert first.note_id is not None and second.note_id is not None
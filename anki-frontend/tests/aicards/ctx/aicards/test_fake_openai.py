@@ -0,0 +1,69 @@
+import openai
+import pytest
+from openai import AsyncOpenAI
+
+from aicards.ctx.aicards.base import Extraction, Image
+from aicards.ctx.aicards.core.ai import AiClient, RateLimits, RequestScheduler
+from tests.fakes.openai import FakeOpenAI, Faults, Pace
+
+IMAGE = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+
+@pytest.mark.qasync
+async def test_streamed_extraction_roundtrip():
+    streamed: list[Extraction] = []
+
+    async def on_extraction(extraction: Extraction) -> None:
+        streamed.append(extraction)
+
+    async with FakeOpenAI.running(pace=Pace(tokens_per_second=10_000)) as (_, url):
+        async with AiClient.running(AsyncOpenAI(api_key="unused", base_url=url)) as ai:
+            first = await ai.get_extractions_from_image(
+                IMAGE, on_extraction=on_extraction
+            )
+            second = await ai.get_extractions_from_image(IMAGE)
+
+    assert len(first.extractions) == 3
+    assert streamed == list(first.extractions)
+    assert first == second
+
+
+@pytest.mark.qasync
+async def test_protonote_generation_roundtrip():
+    extractions = [Extraction(reason="bold", snippet=f"w{i}") for i in range(7)]
+
+    async with FakeOpenAI.running() as (fake, url):
+        async with AiClient.running(AsyncOpenAI(api_key="unused", base_url=url)) as ai:
+            result = await ai.generate_protonotes(extractions, batch_size=3)
+
+    assert len(fake.requests) == 3
+    assert [r.extraction for r in result.results] == extractions
+    assert [r.protonotes[0].description for r in result.results] == [
+        e.snippet for e in extractions
+    ]
+
+
+@pytest.mark.qasync
+async def test_rate_limits_are_absorbed_by_the_scheduler():
+    faults = Faults(rate_limit_rate=0.5, retry_after=0.01)
+    scheduler = RequestScheduler(RateLimits(attempts=20))
+
+    async with FakeOpenAI.running(faults=faults, seed=3) as (fake, url):
+        async with AiClient.running(
+            AsyncOpenAI(api_key="unused", base_url=url), scheduler=scheduler
+        ) as ai:
+            result = await ai.get_extractions_from_image(IMAGE)
+
+    assert len(result.extractions) == 3
+    assert scheduler.metrics.throttled == len(fake.requests) - 1 > 0
+
+
+@pytest.mark.qasync
+async def test_stalls_trip_client_timeouts():
+    async with FakeOpenAI.running(faults=Faults(stall_rate=1, stall=1)) as (_, url):
+        client = AsyncOpenAI(
+            api_key="unused", base_url=url, timeout=0.05, max_retries=0
+        )
+        async with AiClient.running(client) as ai:
+            with pytest.raises(openai.APITimeoutError):
+                await ai.get_extractions_from_image(IMAGE)
@@ -0,0 +1,246 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from aicards.misc.ankiconnect_client import AnkiConnectClient, NoteData
+from aicards.misc.resilience import RetryPolicy
+from aicards.ctx.aicards.core._journal import (
+    ExportJournal,
+    JournalEntry,
+    JournaledExporter,
+)
+
+
+class FakeAnki:
+    def __init__(self) -> None:
+        self.online = False
+        self.added: list[str] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if not self.online:
+            raise httpx.ConnectError("Anki is closed", request=request)
+
+        payload = json.loads(request.content)
+        params = payload["params"]
+        match payload["action"]:
+            case "addNotes":
+                result = []
+                for note in params["notes"]:
+                    self.added.append(note["fields"]["Front"])
+                    result.append(len(self.added))
+            case "findNotes":
+                result = list(range(1, len(self.added) + 1))
+            case "notesInfo":
+                result = [
+                    {
+                        "noteId": note_id,
+                        "modelName": "Basic",
+                        "fields": {
+                            "Front": {"value": self.added[note_id - 1], "order": 0}
+                        },
+                    }
+                    for note_id in params["notes"]
+                ]
+            case "canAddNotesWithErrorDetail":
+                result = [
+                    (
+                        {
+                            "canAdd": False,
+                            "error": "cannot create note because it is a duplicate",
+                        }
+                        if note["fields"]["Front"] in self.added
+                        else {"canAdd": True, "error": None}
+                    )
+                    for note in params["notes"]
+                ]
+            case action:
+                raise AssertionError(action)
+
+        return httpx.Response(200, json={"result": result, "error": None})
+
+
+@pytest.fixture
+def anki() -> FakeAnki:
+    return FakeAnki()
+
+
+@pytest.fixture
+def journal() -> ExportJournal:
+    return ExportJournal.open(":memory:")
+
+
+@pytest.fixture
+def exporter(anki: FakeAnki, journal: ExportJournal) -> JournaledExporter:
+    client = AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/",
+            transport=httpx.MockTransport(lambda request: anki.handle(request)),
+        ),
+        retry=RetryPolicy(attempts=1),
+    )
+    return JournaledExporter(journal, client)
+
+
+def note(front: str) -> NoteData:
+    return {"deckName": "Default", "modelName": "Basic", "fields": {"Front": front}}
+
+
+@pytest.mark.qasync
+async def test_export_is_queued_while_anki_is_unreachable(
+    anki: FakeAnki, exporter: JournaledExporter
+):
+    entries = await exporter.export([("a", note("A")), ("b", note("B"))])
+    assert [e.state for e in entries] == [None, None]
+
+    anki.online = True
+    assert await exporter.drain() == 2
+    assert anki.added == ["A", "B"]
+    assert await exporter.drain() == 0
+
+
+@pytest.mark.qasync
+async def test_replay_does_not_add_notes_twice(
+    anki: FakeAnki, exporter: JournaledExporter, journal: ExportJournal
+):
+    anki.online = True
+    anki.added.append("A")  # delivered, but the confirmation never got journaled
+    journal.append([("a", note("A")), ("b", note("B"))])
+    journal.record([("a", "sent", None, None), ("b", "sent", None, None)])
+
+    await exporter.drain()
+
+    assert anki.added == ["A", "B"]
+    assert [(e.state, e.note_id) for e in journal.lookup(["a", "b"])] == [
+        ("done", 1),
+        ("done", 2),
+    ]
+
+
+@pytest.mark.qasync
+async def test_reexport_of_done_entry_is_a_no_op(
+    anki: FakeAnki, exporter: JournaledExporter
+):
+    anki.online = True
+    first = await exporter.export([("a", note("A"))])
+    second = await exporter.export([("a", note("A"))])
+
+    assert anki.added == ["A"]
+    assert first == second
+
+
+@pytest.mark.qasync
+async def test_batches_are_delivered_concurrently_in_input_order(
+    journal: ExportJournal,
+):
+    in_flight = peak = 0
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        payload = json.loads(request.content)
+        notes = payload["params"]["notes"]
+        if payload["action"] == "canAddNotesWithErrorDetail":
+            result = [
+                (
+                    {"canAdd": False, "error": "broken note"}
+                    if n["fields"]["Front"] == "C"
+                    else {"canAdd": True, "error": None}
+                )
+                for n in notes
+            ]
+            return httpx.Response(200, json={"result": result, "error": None})
+
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+        fronts = [n["fields"]["Front"] for n in notes]
+        if "C" in fronts:
+            return httpx.Response(200, json={"result": None, "error": "broken batch"})
+        return httpx.Response(
+            200, json={"result": [ord(f) for f in fronts], "error": None}
+        )
+
+    client = AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/", transport=httpx.MockTransport(handle)
+        )
+    )
+    exporter = JournaledExporter(journal, client, batch_size=2, max_in_flight=2)
+    delivered: list[str] = []
+
+    async def on_delivered(entries: list[JournalEntry]) -> None:
+        delivered.extend(e.key for e in entries)
+
+    fronts = "ABCDEFGH"
+    entries = await exporter.export(
+        [(f.lower(), note(f)) for f in fronts], on_delivered
+    )
+
+    assert peak == 2
+    assert [e.key for e in entries] == list(fronts.lower())
+    # NOTE: A note Anki won't take is failed before its batch is sent, the rest is added
+    assert [e.state for e in entries] == ["done"] * 2 + ["failed"] + ["done"] * 5
+    assert entries[2].error == "broken note"
+    assert [e.note_id for e in entries if e.state == "done"] == [
+        ord(f) for f in "ABDEFGH"
+    ]
+    assert sorted(delivered) == list(fronts.lower())
+
+
+@pytest.mark.qasync
+async def test_notes_added_by_a_failed_batch_are_not_added_again(
+    anki: FakeAnki, exporter: JournaledExporter, journal: ExportJournal
+):
+    anki.online = True
+    original = anki.handle
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if payload["action"] == "addNotes" and len(payload["params"]["notes"]) > 1:
+            # NOTE: Like AnkiConnect, the good notes are kept although the batch fails
+            original(request)
+            return httpx.Response(200, json={"result": None, "error": "['bad note']"})
+        return original(request)
+
+    anki.handle = handle
+    entries = await exporter.export([("a", note("A")), ("b", note("B"))])
+
+    assert anki.added == ["A", "B"]
+    assert [(e.state, e.note_id) for e in entries] == [("done", 1), ("done", 2)]
+    assert journal.backlog(10) == []
+
+
+@pytest.mark.qasync
+async def test_replay_keeps_running_after_a_failure(
+    anki: FakeAnki, journal: ExportJournal
+):
+    anki.online = True
+    failures = 0
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        nonlocal failures
+        if not failures:
+            failures += 1
+            raise RuntimeError("AnkiConnect add-on crashed")
+        return anki.handle(request)
+
+    client = AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/", transport=httpx.MockTransport(handle)
+        )
+    )
+    exporter = JournaledExporter(journal, client, replay_interval=0.01)
+    journal.append([("a", note("A"))])
+
+    replaying = asyncio.create_task(exporter.replaying())
+    try:
+        async with asyncio.timeout(1):
+            while journal.backlog(10):
+                await asyncio.sleep(0.01)
+    finally:
+        replaying.cancel()
+
+    assert anki.added == ["A"]
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from openai import AsyncOpenAI
+
+from aicards.misc.ankiconnect_client import AnkiConnectClient
+from aicards.ctx.aicards.base import Image, LlmChatMessage
+from aicards.ctx.aicards.core import Service
+from aicards.ctx.aicards.core.ai import AiClient
+from aicards.ctx.aicards.core._singleflight import SingleFlight
+from tests.fakes.ankiconnect import FakeAnkiConnect
+from tests.fakes.openai import FakeOpenAI, Pace
+
+
+class Collected:
+    def __init__(self) -> None:
+        self.values: list = []
+
+    async def asend(self, value) -> None:
+        self.values.append(value)
+
+
+@pytest.mark.qasync
+async def test_late_joiner_gets_everything_sent_so_far():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    runs = 0
+
+    async def run(channel) -> str:
+        nonlocal runs
+        runs += 1
+        await channel.asend("early")
+        await release.wait()
+        await channel.asend("late")
+        return "result"
+
+    first, joined_first = flights.join("key", run)
+    early, late = Collected(), Collected()
+    following = asyncio.create_task(first.follow(early))
+    await asyncio.sleep(0)
+
+    second, joined_second = flights.join("key", run)
+    joining = asyncio.create_task(second.follow(late))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await following == await joining == "result"
+    assert (joined_first, joined_second, runs) == (False, True, 1)
+    assert early.values == late.values == ["early", "late"]
+
+    # NOTE: Finished flights are forgotten
+    third, joined_third = flights.join("key", run)
+    release.set()
+    assert not joined_third and third is not first
+    await third.follow(Collected())
+
+
+@pytest.mark.qasync
+async def test_failure_is_fanned_out():
+    flights = SingleFlight()
+
+    async def run(_) -> None:
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    flight, _ = flights.join("key", run)
+    joined, _ = flights.join("key", run)
+    results = await asyncio.gather(
+        flight.follow(Collected()), joined.follow(Collected()), return_exceptions=True
+    )
+    assert [type(r) for r in results] == [ValueError, ValueError]
+
+
+@pytest.mark.qasync
+async def test_identical_images_share_one_extraction():
+    image = Image(name="shot.png", mime="image/png", data=b"pixels")
+
+    async with (
+        FakeOpenAI.running(pace=Pace(tokens_per_second=5000)) as (openai, openai_url),
+        FakeAnkiConnect.running() as (_, anki_url),
+        AnkiConnectClient.running(*anki_url.removeprefix("http://").split(":")) as anki,
+        AiClient.running(AsyncOpenAI(api_key="unused", base_url=openai_url)) as ai,
+        Service.running(ai, anki, preprocessing=None) as service,
+    ):
+        operations = [service.extract_emphases(image) for _ in range(3)]
+        streamed = [Collected() for _ in operations]
+        messages = [Collected() for _ in operations]
+        for operation, items, msgs in zip(operations, streamed, messages):
+            await operation.items.subscribe_async(items.asend)
+            await operation.llm_messages.subscribe_async(msgs.asend)
+
+        results = await asyncio.gather(*operations)
+
+    assert len(openai.requests) == 1
+    assert results[0] == results[1] == results[2] and len(results[0]) == 3
+    assert all(items.values == results[0] for items in streamed)
+
+    stream_ids = {
+        msg.stream_id
+        for msgs in messages
+        for msg in msgs.values
+        if isinstance(msg, LlmChatMessage) and msg.stream_id
+    }
+    assert len(stream_ids) == 3
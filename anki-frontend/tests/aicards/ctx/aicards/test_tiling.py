@@ -0,0 +1,81 @@
+import pytest
+from openai import AsyncOpenAI
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from aicards.misc import imaging
+from aicards.misc.ankiconnect_client import AnkiConnectClient
+from aicards.misc.imaging import TilingOptions
+from aicards.ctx.aicards.base import Image
+from aicards.ctx.aicards.core import Service
+from aicards.ctx.aicards.core.ai import AiClient
+from tests.fakes.ankiconnect import FakeAnkiConnect
+from tests.fakes.openai import FakeOpenAI, Pace
+
+
+class Collected:
+    def __init__(self) -> None:
+        self.values: list = []
+
+    async def asend(self, value) -> None:
+        self.values.append(value)
+
+
+def blank(width: int, height: int) -> Image:
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    image.fill(QColor("white"))
+    return Image(name="page.png", mime="image/png", data=imaging.encode(image, "PNG"))
+
+
+async def extract(image: Image, tiling: TilingOptions | None):
+    async with (
+        FakeOpenAI.running(pace=Pace(tokens_per_second=5000)) as (openai, openai_url),
+        FakeAnkiConnect.running() as (_, anki_url),
+        AnkiConnectClient.running(*anki_url.removeprefix("http://").split(":")) as anki,
+        AiClient.running(AsyncOpenAI(api_key="unused", base_url=openai_url)) as ai,
+        Service.running(ai, anki, preprocessing=None, tiling=tiling) as service,
+    ):
+        operation = service.extract_emphases(image)
+        streamed, messages = Collected(), Collected()
+        await operation.items.subscribe_async(streamed.asend)
+        await operation.llm_messages.subscribe_async(messages.asend)
+        result = await operation
+
+    return openai.requests, result, streamed.values, messages.values
+
+
+@pytest.mark.qasync
+async def test_tall_images_are_extracted_tile_by_tile():
+    tiling = TilingOptions(threshold=2000, tile_size=1000, overlap=100)
+
+    requests, result, streamed, messages = await extract(blank(800, 3000), tiling)
+
+    # NOTE: Blank tiles are identical, so the fake extracts the same emphases from each
+    assert len(requests) == 4
+    assert len(result) == 3 and streamed == result
+    assert any("4 tiles" in m.text for m in messages if m.role == "system")
+    assert len({m.stream_id for m in messages if m.stream_id}) == 4
+
+
+@pytest.mark.qasync
+async def test_small_images_are_not_tiled():
+    requests, result, _, _ = await extract(blank(800, 600), TilingOptions())
+
+    assert len(requests) == 1 and len(result) == 3
+
+
+@pytest.mark.qasync
+async def test_only_highlighted_regions_are_sent():
+    image = QImage(1200, 1600, QImage.Format.Format_RGB32)
+    image.fill(QColor("white"))
+    painter = QPainter(image)
+    painter.fillRect(100, 300, 400, 30, QColor("yellow"))
+    painter.fillRect(100, 1200, 300, 30, QColor("yellow"))
+    painter.end()
+    data = imaging.encode(image, "PNG")
+
+    requests, result, _, messages = await extract(
+        Image(name="page.png", mime="image/png", data=data), TilingOptions()
+    )
+
+    assert len(requests) == 2 and len(result) == 6
+    assert any("2 highlighted regions" in m.text for m in messages)
@@ -0,0 +1,101 @@
+import base64
+from pathlib import Path
+
+import pytest
+from anki.collection import Collection
+
+from aicards.misc.ankiconnect_client import AnkiConnectAPIError, NoteData
+from aicards.misc.anki_collection_client import AnkiCollectionClient
+
+
+@pytest.fixture
+def col(tmp_path) -> Collection:
+    col = Collection(str(tmp_path / "collection.anki2"))
+    yield col
+    col.close()
+
+
+@pytest.fixture
+def client(col: Collection) -> AnkiCollectionClient:
+    return AnkiCollectionClient(col)
+
+
+def note(front: str, **overrides) -> NoteData:
+    return {
+        "deckName": "Default",
+        "modelName": "Basic",
+        "fields": {"Front": front, "Back": "back"},
+        **overrides,
+    }
+
+
+@pytest.mark.qasync
+async def test_add_notes_reports_per_note_results(client: AnkiCollectionClient):
+    results = await client.add_notes([note("Haus"), note("Haus"), note("Baum")])
+
+    assert isinstance(results[0], int)
+    assert isinstance(results[1], AnkiConnectAPIError)
+    assert isinstance(results[2], int)
+    assert sorted(await client.find_notes('deck:"Default"')) == sorted(
+        [results[0], results[2]]
+    )
+
+
+@pytest.mark.qasync
+async def test_can_add_notes_explains_rejections(client: AnkiCollectionClient):
+    await client.add_note(note("Haus"))
+
+    checks = await client.can_add_notes_with_error_detail(
+        [
+            note("Haus"),
+            note("Baum"),
+            note("Baum", modelName="Missing"),
+            note("Baum", deckName="Missing"),
+        ]
+    )
+
+    assert [c.canAdd for c in checks] == [False, True, False, False]
+    assert "duplicate" in (checks[0].error or "")
+
+
+@pytest.mark.qasync
+async def test_notes_info_orders_fields_like_the_model(client: AnkiCollectionClient):
+    note_id = await client.add_note(note("Haus"))
+
+    [info] = await client.notes_info([note_id, 12345])
+
+    assert info.modelName == "Basic"
+    assert info.fields["Front"].order == 0
+    assert info.fields["Back"].value == "back"
+    assert await client.model_field_names("Basic") == ["Front", "Back"]
+
+
+@pytest.mark.qasync
+async def test_media_is_stored_under_the_name_the_collection_gives_it(
+    col: Collection, client: AnkiCollectionClient
+):
+    col.media.write_data("haus.png", b"another picture")
+    picture = {
+        "filename": "haus.png",
+        "data": base64.b64encode(b"picture").decode(),
+        "fields": ["Back"],
+    }
+
+    note_id = await client.add_note(note("Haus", picture=[picture]))
+
+    back = col.get_note(note_id)["Back"]
+    stored = back.removeprefix('back<img src="').removesuffix('">')
+    assert stored != "haus.png"
+    assert (Path(col.media.dir()) / stored).read_bytes() == b"picture"
+
+
+@pytest.mark.qasync
+async def test_notes_added_at_once_are_undone_at_once(
+    col: Collection, client: AnkiCollectionClient
+):
+    await client.add_notes([note("Haus"), note("Baum")])
+    assert col.undo_status().undo == "Add Notes"
+
+    col.undo()
+
+    assert await client.find_notes('deck:"Default"') == []
@@ -0,0 +1,107 @@
+import json
+
+import httpx
+import pytest
+
+from aicards.misc.ankiconnect_client import AnkiConnectClient
+from aicards.misc.anki_duplicates import DuplicateIndex
+from aicards.misc.anki_schema import SchemaRegistry
+
+
+class FakeCollection:
+    def __init__(self) -> None:
+        self.notes: dict[int, str] = {1: "<b>Haus</b>", 2: "Baum"}
+        self.actions: list[str] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        self.actions.append(payload["action"])
+        params = payload.get("params", {})
+
+        match payload["action"]:
+            case "findNotes":
+                result = list(self.notes)
+            case "notesInfo":
+                result = [
+                    {
+                        "noteId": note_id,
+                        "modelName": "Meaning",
+                        "tags": [],
+                        "fields": {
+                            "Concept": {"value": self.notes[note_id], "order": 0},
+                            "Example 1 Sentence": {"value": "", "order": 1},
+                        },
+                    }
+                    for note_id in params["notes"]
+                ]
+            case "modelFieldNames":
+                result = ["Concept", "Example 1 Sentence"]
+            case "modelNames":
+                result = ["Meaning"]
+            case "deckNames":
+                result = ["English"]
+            case action:
+                raise AssertionError(action)
+
+        return httpx.Response(200, json={"result": result, "error": None})
+
+
+@pytest.fixture
+def collection() -> FakeCollection:
+    return FakeCollection()
+
+
+@pytest.fixture
+def index(collection: FakeCollection) -> DuplicateIndex:
+    client = AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/",
+            transport=httpx.MockTransport(collection.handle),
+        )
+    )
+    return DuplicateIndex(client, SchemaRegistry(client))
+
+
+def note(concept: str) -> dict:
+    return {
+        "deckName": "English",
+        "modelName": "Meaning",
+        "fields": {"Concept": concept},
+    }
+
+
+@pytest.mark.qasync
+async def test_refresh_indexes_first_fields(index: DuplicateIndex):
+    await index.refresh("English")
+
+    assert index.contains(await index.key_of(note("Haus")))
+    assert not index.contains(await index.key_of(note("Katze")))
+
+
+@pytest.mark.qasync
+async def test_refresh_only_fetches_unseen_notes(
+    index: DuplicateIndex, collection: FakeCollection
+):
+    await index.refresh("English")
+    del collection.notes[2]
+    collection.notes[3] = "Katze"
+    collection.actions.clear()
+
+    await index.refresh("English")
+
+    assert collection.actions == ["findNotes", "notesInfo"]
+    assert not index.contains(await index.key_of(note("Baum")))
+    assert index.contains(await index.key_of(note("Katze")))
+
+
+@pytest.mark.qasync
+async def test_added_notes_are_known_without_round_trips(
+    index: DuplicateIndex, collection: FakeCollection
+):
+    key = await index.key_of(note("Hund"))
+    collection.actions.clear()
+
+    index.add(42, key)
+
+    assert index.contains(await index.key_of(note("Hund")))
+    assert collection.actions == []
@@ -0,0 +1,86 @@
+import base64
+
+import pytest
+
+from aicards.misc.ankiconnect_client import NoteData
+from aicards.misc.anki_media import MediaUploader
+
+
+class FakeMediaClient:
+    def __init__(self, stored: set[str]) -> None:
+        self.stored = stored
+        self.uploads: list[str] = []
+        self.listings = 0
+
+    async def store_media_file(self, filename, *, path=None, data=None) -> str:
+        self.uploads.append(filename)
+        self.stored.add(filename)
+        return filename
+
+    async def get_media_file_names(self, pattern: str = "*") -> list[str]:
+        self.listings += 1
+        return sorted(self.stored)
+
+
+def note_with_picture(path: str) -> NoteData:
+    return {
+        "deckName": "Default",
+        "modelName": "Basic",
+        "fields": {"Front": "Haus", "Back": ""},
+        "picture": [{"filename": "crop.png", "path": path, "fields": ["Back"]}],
+    }
+
+
+@pytest.mark.qasync
+async def test_identical_media_is_uploaded_once(tmp_path):
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"same bytes")
+    second.write_bytes(b"same bytes")
+    client = FakeMediaClient(set())
+    uploader = MediaUploader(client)  # type: ignore[arg-type]
+
+    a = await uploader.attach(note_with_picture(str(first)))
+    b = await uploader.attach(note_with_picture(str(second)))
+
+    assert len(client.uploads) == 1
+    assert client.listings == 1
+    assert a["fields"] == b["fields"]
+    assert a["fields"]["Back"] == f'<img src="{client.uploads[0]}">'
+    assert "picture" not in a
+
+
+@pytest.mark.qasync
+async def test_media_already_in_anki_is_not_uploaded(tmp_path):
+    uploader = MediaUploader(FakeMediaClient(set()))  # type: ignore[arg-type]
+    data = base64.b64encode(b"audio").decode()
+    note: NoteData = {
+        "fields": {"Front": "Haus"},
+        "audio": [{"filename": "haus.mp3", "data": data, "fields": ["Front"]}],
+    }
+    stored = (await uploader.attach(note))["fields"]["Front"].removeprefix("Haus")
+
+    client = FakeMediaClient({stored.removeprefix("[sound:").removesuffix("]")})
+    await MediaUploader(client).attach(note)  # type: ignore[arg-type]
+
+    assert client.uploads == []
+
+
+@pytest.mark.qasync
+async def test_failed_upload_lists_media_again(tmp_path):
+    class FailingOnce(FakeMediaClient):
+        async def store_media_file(self, filename, *, path=None, data=None) -> str:
+            if self.listings < 2:
+                raise ConnectionError("Anki went away")
+            return await super().store_media_file(filename, path=path, data=data)
+
+    picture = tmp_path / "a.png"
+    picture.write_bytes(b"bytes")
+    client = FailingOnce(set())
+    uploader = MediaUploader(client)  # type: ignore[arg-type]
+
+    with pytest.raises(ConnectionError):
+        await uploader.attach(note_with_picture(str(picture)))
+    await uploader.attach(note_with_picture(str(picture)))
+
+    assert client.listings == 2
+    assert len(client.uploads) == 1
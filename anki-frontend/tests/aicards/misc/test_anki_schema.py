@@ -0,0 +1,90 @@
+import pytest
+
+from aicards.misc.ankiconnect_client import NoteData
+from aicards.misc.anki_schema import InvalidNoteError, SchemaRegistry
+
+
+class FakeSchemaClient:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.models = {"Meaning": ["Concept", "Example 1 Sentence"]}
+
+    async def deck_names(self) -> list[str]:
+        self.calls.append("deckNames")
+        return ["English"]
+
+    async def model_names(self) -> list[str]:
+        self.calls.append("modelNames")
+        return list(self.models)
+
+    async def model_field_names(self, model_name: str) -> list[str]:
+        self.calls.append("modelFieldNames")
+        return self.models[model_name]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def note(**overrides) -> NoteData:
+    return {
+        "deckName": "English",
+        "modelName": "Meaning",
+        "fields": {"concept": "Haus", "Example 1  sentence": "Das Haus."},
+        **overrides,
+    }
+
+
+@pytest.fixture
+def client() -> FakeSchemaClient:
+    return FakeSchemaClient()
+
+
+@pytest.mark.qasync
+async def test_validate_maps_field_names(client: FakeSchemaClient):
+    registry = SchemaRegistry(client)  # type: ignore[arg-type]
+
+    validated = await registry.validate(note())
+
+    assert validated["fields"] == {
+        "Concept": "Haus",
+        "Example 1 Sentence": "Das Haus.",
+    }
+
+
+@pytest.mark.qasync
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"deckName": "Missing"},
+        {"modelName": "Missing"},
+        {"fields": {"Plural": "Häuser"}},
+    ],
+)
+async def test_validate_rejects_notes_locally(client: FakeSchemaClient, overrides):
+    registry = SchemaRegistry(client)  # type: ignore[arg-type]
+
+    with pytest.raises(InvalidNoteError):
+        await registry.validate(note(**overrides))
+
+
+@pytest.mark.qasync
+async def test_schema_is_cached_until_expired_or_invalidated(
+    client: FakeSchemaClient,
+):
+    clock = FakeClock()
+    registry = SchemaRegistry(client, ttl=60, clock=clock)  # type: ignore[arg-type]
+
+    for _ in range(3):
+        await registry.validate(note())
+    assert client.calls == ["deckNames", "modelNames", "modelFieldNames"]
+
+    registry.invalidate()
+    await registry.validate(note())
+    clock.now = 60
+    await registry.validate(note())
+    assert len(client.calls) == 9
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import typing as t
+
+import httpx
+import pytest
+
+from aicards.misc.ankiconnect_client import (
+    AnkiConnectClient,
+    AnkiConnectAPIError,
+    AnkiConnectClientError,
+    AnkiConnectConnectionError,
+    AnkiSchemaError,
+    CoalescingOptions,
+    NoteData,
+)
+from aicards.misc.resilience import CircuitBreaker, RetryPolicy
+
+
+def make_client(
+    handler: t.Callable[[dict], dict],
+    requests: list[dict] | None = None,
+    coalescing: CoalescingOptions | None = None,
+) -> AnkiConnectClient:
+    def transport_handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if requests is not None:
+            requests.append(payload)
+        return httpx.Response(200, json=handler(payload))
+
+    return AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/",
+            transport=httpx.MockTransport(transport_handler),
+        ),
+        coalescing,
+    )
+
+
+@pytest.fixture
+def notes() -> list[NoteData]:
+    return [
+        {"deckName": "Default", "modelName": "Basic", "fields": {"Front": f"n{i}"}}
+        for i in range(3)
+    ]
+
+
+@pytest.mark.qasync
+async def test_add_notes_uses_single_round_trip(notes: list[NoteData]):
+    requests: list[dict] = []
+    client = make_client(lambda p: {"result": [1, 2, 3], "error": None}, requests)
+
+    assert await client.add_notes(notes) == [1, 2, 3]
+    assert [r["action"] for r in requests] == ["addNotes"]
+    assert requests[0]["params"]["notes"] == notes
+
+
+@pytest.mark.qasync
+async def test_add_notes_reports_per_note_failures(notes: list[NoteData]):
+    client = make_client(lambda p: {"result": [1, None, 3], "error": None})
+
+    results = await client.add_notes(notes)
+
+    assert results[0] == 1
+    assert isinstance(results[1], AnkiConnectAPIError)
+    assert results[2] == 3
+
+
+@pytest.mark.qasync
+async def test_add_notes_skips_request_for_empty_input():
+    requests: list[dict] = []
+    client = make_client(lambda p: {"result": [], "error": None}, requests)
+
+    assert await client.add_notes([]) == []
+    assert requests == []
+
+
+@pytest.mark.qasync
+async def test_coalescing_packs_concurrent_requests_into_multi():
+    requests: list[dict] = []
+
+    def handler(payload: dict) -> dict:
+        actions = payload["params"]["actions"]
+        return {
+            "result": [
+                (
+                    {"result": None, "error": "boom"}
+                    if a["action"] == "deckNames"
+                    else {"result": a["action"], "error": None}
+                )
+                for a in actions
+            ],
+            "error": None,
+        }
+
+    client = make_client(handler, requests, CoalescingOptions())
+
+    results = await asyncio.gather(
+        client._request("modelNames"),
+        client._request("deckNames"),
+        client._request("version"),
+        return_exceptions=True,
+    )
+
+    assert [r["action"] for r in requests] == ["multi"]
+    assert results[0] == "modelNames"
+    assert isinstance(results[1], AnkiConnectAPIError)
+    assert results[2] == "version"
+
+
+@pytest.mark.qasync
+async def test_coalescing_respects_max_batch_size():
+    requests: list[dict] = []
+
+    def handler(payload: dict) -> dict:
+        actions = payload["params"]["actions"]
+        return {"result": [{"result": 1, "error": None}] * len(actions), "error": None}
+
+    client = make_client(handler, requests, CoalescingOptions(max_batch_size=2))
+
+    await asyncio.gather(*(client._request("version") for _ in range(4)))
+
+    assert [len(r["params"]["actions"]) for r in requests] == [2, 2]
+
+
+def make_flaky_client(
+    failures: int,
+    requests: list[dict],
+    breaker: CircuitBreaker | None = None,
+) -> AnkiConnectClient:
+    def transport_handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        if len(requests) <= failures:
+            raise httpx.ConnectError("Anki is busy", request=request)
+        return httpx.Response(200, json={"result": [], "error": None})
+
+    return AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/",
+            transport=httpx.MockTransport(transport_handler),
+        ),
+        retry=RetryPolicy(attempts=3, base_delay=0),
+        breaker=breaker,
+    )
+
+
+@pytest.mark.qasync
+async def test_idempotent_requests_are_retried():
+    requests: list[dict] = []
+    client = make_flaky_client(2, requests)
+
+    assert await client.find_notes("deck:English") == []
+    assert len(requests) == 3
+
+
+@pytest.mark.qasync
+async def test_non_idempotent_requests_are_not_retried(notes: list[NoteData]):
+    requests: list[dict] = []
+    client = make_flaky_client(1, requests)
+
+    with pytest.raises(AnkiConnectConnectionError):
+        await client.add_notes(notes)
+    assert len(requests) == 1
+
+
+@pytest.mark.qasync
+async def test_open_circuit_fails_fast():
+    requests: list[dict] = []
+    client = make_flaky_client(
+        10, requests, CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    )
+
+    with pytest.raises(AnkiConnectConnectionError):
+        await client.find_notes("deck:English")
+
+    assert len(requests) == 2
+
+
+@pytest.mark.qasync
+@pytest.mark.parametrize(
+    "status, error", [(500, AnkiConnectConnectionError), (403, AnkiConnectClientError)]
+)
+async def test_http_errors_are_client_errors(status: int, error: type[Exception]):
+    client = AnkiConnectClient(
+        httpx.AsyncClient(
+            base_url="http://anki/",
+            transport=httpx.MockTransport(lambda request: httpx.Response(status)),
+        ),
+        retry=RetryPolicy(attempts=1),
+    )
+
+    with pytest.raises(error):
+        await client.find_notes("deck:English")
+
+
+@pytest.mark.qasync
+async def test_schema_errors_are_told_apart(notes: list[NoteData]):
+    client = make_client(
+        lambda p: {
+            "result": [
+                {"canAdd": False, "error": "model was not found: Basic"},
+                {"canAdd": False, "error": "cannot create note because it is empty"},
+                {"canAdd": True},
+            ],
+            "error": None,
+        }
+    )
+
+    checks = await client.can_add_notes_with_error_detail(notes)
+
+    assert [type(c.exception()) for c in checks] == [
+        AnkiSchemaError,
+        AnkiConnectAPIError,
+        type(None),
+    ]
+    with pytest.raises(AnkiSchemaError):
+        await make_client(
+            lambda p: {"result": None, "error": "deck was not found: German"}
+        ).add_note(notes[0])
@@ -0,0 +1,59 @@
+import asyncio as aio
+
+import pytest
+
+from aicards.misc.ankiconnect_client import (
+    AnkiConnectAPIError,
+    AnkiConnectClient,
+    CoalescingOptions,
+)
+from aicards.misc.resilience import RetryPolicy
+from tests.fakes.ankiconnect import FakeAnkiConnect, Faults
+
+
+def note(concept: str) -> dict:
+    return {
+        "deckName": "English",
+        "modelName": "Meaning",
+        "fields": {"Concept": concept},
+    }
+
+
+@pytest.mark.qasync
+async def test_coalesced_adds_roundtrip_over_http():
+    async with FakeAnkiConnect.running() as (fake, url):
+        host, port = url.removeprefix("http://").split(":")
+        async with AnkiConnectClient.running(
+            host, int(port), coalescing=CoalescingOptions(max_delay=0.01)
+        ) as client:
+            a, b = await aio.gather(
+                client.add_notes([note("a")]), client.add_notes([note("b")])
+            )
+
+    assert isinstance(a[0], int) and isinstance(b[0], int)
+    assert len(fake.notes) == 2
+
+
+@pytest.mark.qasync
+async def test_a_bad_note_fails_its_batch_but_the_rest_is_added():
+    async with FakeAnkiConnect.running() as (fake, url):
+        host, port = url.removeprefix("http://").split(":")
+        async with AnkiConnectClient.running(host, int(port)) as client:
+            with pytest.raises(AnkiConnectAPIError, match="duplicate"):
+                await client.add_notes([note("a"), note("b"), note("a")])
+
+    assert len(fake.notes) == 2
+
+
+@pytest.mark.qasync
+async def test_idempotent_requests_survive_dropped_connections():
+    faults = Faults(drop_rate=0.5)
+    async with FakeAnkiConnect.running(faults=faults, seed=1) as (fake, url):
+        host, port = url.removeprefix("http://").split(":")
+        async with AnkiConnectClient.running(
+            host, int(port), retry=RetryPolicy(attempts=10, base_delay=0)
+        ) as client:
+            for _ in range(5):
+                assert await client.deck_names() == ["Default", "English"]
+
+    assert fake.requests > 5
@@ -0,0 +1,61 @@
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from aicards.misc import highlights, imaging
+from aicards.misc.highlights import Region
+
+
+def page(marks: list[tuple[int, int, int, int, str]]) -> QImage:
+    """A page of 'text' blocks with extra filled rectangles on top."""
+    image = QImage(1600, 2200, QImage.Format.Format_RGB32)
+    image.fill(QColor("white"))
+    painter = QPainter(image)
+    for y in range(100, 2100, 50):
+        for x in range(100, 1500, 40):
+            painter.fillRect(x, y, 30, 20, QColor("black"))
+    for x, y, width, height, color in marks:
+        painter.fillRect(x, y, width, height, QColor(color))
+    painter.end()
+    return image
+
+
+def contains(region: Region, x: int, y: int) -> bool:
+    return region.left <= x < region.right and region.top <= y < region.bottom
+
+
+def test_finds_highlights_and_underlines():
+    image = page([(300, 595, 400, 30, "yellow"), (200, 1324, 500, 3, "black")])
+
+    highlight, underline = highlights.detect(image)
+
+    assert contains(highlight, 300, 595) and contains(highlight, 699, 624)
+    # NOTE: The line above an underline is what's underlined
+    assert contains(underline, 200, 1300) and contains(underline, 699, 1326)
+    assert highlight.area + underline.area < 0.2 * 1600 * 2200
+
+
+def test_crops_span_the_whole_lines_around_an_emphasis():
+    [highlight] = highlights.detect(page([(300, 595, 400, 30, "yellow")]))
+
+    # NOTE: Text runs from x=100 to x=1490, the sentence around the word is its context
+    assert contains(highlight, 100, 600) and contains(highlight, 1489, 600)
+    assert highlight.right < 1600 - 50
+
+
+def test_plain_text_has_nothing_to_crop():
+    assert highlights.detect(page([])) == []
+    assert highlights.crop(imaging.encode(page([]))) == []
+
+
+def test_crops_are_smaller_than_the_page():
+    data = imaging.encode(page([(300, 595, 400, 30, "#9f9")]))
+
+    [crop] = highlights.crop(data)
+
+    assert crop.mime == "image/png"
+    assert len(crop.data) < len(data) / 4
+
+
+def test_gives_up_when_most_of_the_page_is_colorful():
+    image = page([(0, 0, 1600, 1800, "pink")])
+
+    assert highlights.detect(image) == []
@@ -0,0 +1,77 @@
+import pytest
+from PyQt5.QtGui import QColor, QImage
+
+from aicards.misc import imaging
+from aicards.misc.imaging import PreprocessingOptions
+
+
+@pytest.fixture
+def screenshot() -> bytes:
+    image = QImage(3840, 2160, QImage.Format.Format_RGB32)
+    image.fill(QColor("white"))
+    for y in range(0, 2160, 40):
+        for x in range(0, 3840, 8):
+            image.setPixelColor(x, y, QColor("black"))
+    return imaging.encode(image, "PNG")
+
+
+def test_downscales_to_max_dimension(screenshot: bytes):
+    result = imaging.preprocess(screenshot, PreprocessingOptions(max_dimension=1000))
+
+    assert (result.source_width, result.source_height) == (3840, 2160)
+    assert (result.width, result.height) == (1000, 562)
+    assert result.mime == "image/jpeg"
+    assert imaging.decode(result.data).width() == 1000
+
+
+def test_keeps_small_images_at_their_resolution():
+    image = QImage(200, 100, QImage.Format.Format_RGB32)
+    image.fill(QColor("red"))
+
+    result = imaging.preprocess(
+        imaging.encode(image), PreprocessingOptions(format="PNG")
+    )
+
+    assert (result.width, result.height) == (200, 100)
+    assert result.mime == "image/png"
+
+
+def test_palette_reduction_falls_back_to_png(screenshot: bytes):
+    result = imaging.preprocess(screenshot, PreprocessingOptions(colors=4))
+
+    assert result.mime == "image/png"
+    assert imaging.decode(result.data).colorCount() <= 4
+
+
+def test_grayscale_conversion(screenshot: bytes):
+    result = imaging.preprocess(screenshot, PreprocessingOptions(grayscale=True))
+
+    assert imaging.decode(result.data).isGrayscale()
+
+
+def test_corrupted_data_is_rejected():
+    with pytest.raises(ValueError):
+        imaging.preprocess(b"not an image", PreprocessingOptions())
+
+
+@pytest.mark.parametrize(
+    "size, tokens",
+    [((512, 512), 255), ((1024, 1024), 765), ((3840, 2160), 1105), ((100, 50), 255)],
+)
+def test_estimates_vision_tokens(size: tuple[int, int], tokens: int):
+    assert imaging.estimate_vision_tokens(*size) == tokens
+
+
+def test_splits_into_overlapping_tiles(screenshot: bytes):
+    tiles = imaging.split(screenshot, tile_size=1536, overlap=128)
+
+    assert imaging.dimensions(screenshot) == (3840, 2160)
+    # NOTE: 3 columns by 2 rows
+    assert len(tiles) == 6
+    assert all(max(tile.width, tile.height) <= 1536 for tile in tiles)
+    assert [imaging.dimensions(tile.data) for tile in tiles[:3]] == [(1536, 1536)] * 3
+
+
+def test_dimensions_reject_garbage():
+    with pytest.raises(ValueError):
+        imaging.dimensions(b"not an image")
@@ -0,0 +1,54 @@
+from aicards.misc.resilience import AdaptiveTimeout, CircuitBreaker, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_retry_delay_is_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=2.0)
+    assert all(0 <= policy.delay(attempt) <= 2.0 for attempt in range(10))
+
+
+def test_breaker_opens_after_threshold_and_recovers_after_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now = 5
+    assert breaker.allow()
+    assert not breaker.allow()  # single trial at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+
+def test_adaptive_timeout_scales_with_size_and_latency():
+    timeouts = AdaptiveTimeout(base=10, per_kib=1, latency_factor=4, ceiling=100)
+
+    assert timeouts.timeout_for(0) == 10
+    assert timeouts.timeout_for(5 * 1024) == 15
+
+    timeouts.observe(5)
+    assert timeouts.timeout_for(0) == 20
+    assert timeouts.timeout_for(1024 * 1024) == 100
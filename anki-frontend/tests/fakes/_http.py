@@ -0,0 +1,97 @@
+import asyncio as aio
+import contextlib
+import typing as t
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class Request:
+    method: str
+    path: str
+    headers: t.Mapping[str, str]
+    body: bytes
+
+
+@dataclass(frozen=True)
+class Response:
+    status: int = 200
+    headers: t.Mapping[str, str] = field(default_factory=dict)
+    # NOTE: An async iterator is sent chunk by chunk, as soon as each chunk is produced
+    body: bytes | t.AsyncIterator[bytes] = b""
+
+
+# NOTE: Returning None drops the connection without answering
+type Handler = t.Callable[[Request], t.Awaitable[Response | None]]
+
+_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests"}
+
+
+@contextlib.asynccontextmanager
+async def serving(
+    handler: Handler,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> t.AsyncIterator[str]:
+    """Minimal HTTP/1.1 server with keep-alive, yielding its base URL."""
+
+    async def on_connection(reader: aio.StreamReader, writer: aio.StreamWriter):
+        try:
+            while request := await _read_request(reader):
+                response = await handler(request)
+                if response is None:
+                    break
+                await _write_response(writer, response)
+        except (ConnectionError, aio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await aio.start_server(on_connection, host, port)
+    async with server:
+        bound_host, bound_port = server.sockets[0].getsockname()[:2]
+        try:
+            yield f"http://{bound_host}:{bound_port}"
+        finally:
+            # NOTE: Idle keep-alive connections of clients left open would block the shutdown
+            server.close()
+            server.close_clients()
+
+
+async def _read_request(reader: aio.StreamReader) -> Request | None:
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return Request(method, path, headers, body)
+
+
+async def _write_response(writer: aio.StreamWriter, response: Response) -> None:
+    status_line = f"HTTP/1.1 {response.status} {_reasons.get(response.status, '')}"
+    headers = dict(response.headers)
+
+    if isinstance(response.body, bytes):
+        headers["Content-Length"] = str(len(response.body))
+        writer.write(_head(status_line, headers) + response.body)
+        await writer.drain()
+        return
+
+    headers["Transfer-Encoding"] = "chunked"
+    writer.write(_head(status_line, headers))
+    async for chunk in response.body:
+        if chunk:
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def _head(status_line: str, headers: t.Mapping[str, str]) -> bytes:
+    lines = [status_line, *(f"{k}: {v}" for k, v in headers.items()), "", ""]
+    return "\r\n".join(lines).encode("latin-1")
@@ -0,0 +1,219 @@
+import asyncio as aio
+import base64
+import contextlib
+import fnmatch
+import itertools
+import json
+import random
+import typing as t
+from dataclasses import dataclass
+
+from tests.fakes._http import Request, Response, serving
+
+DUPLICATE_ERROR = "cannot create note because it is a duplicate"
+
+DEFAULT_MODELS = {
+    "Basic": ["Front", "Back"],
+    "Meaning": ["Concept", "Example 1 Sentence", "Example 2 Sentence"],
+    "English Noun": ["Singular", "Plural"],
+}
+
+
+@dataclass(frozen=True)
+class Faults:
+    """Latency and failures injected into every request."""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Requests answered with an AnkiConnect error
+    error_rate: float = 0.0
+    # Requests whose connection is closed without an answer
+    drop_rate: float = 0.0
+    # Requests answered only after `stall` seconds, as when Anki syncs
+    stall_rate: float = 0.0
+    stall: float = 5.0
+    # Extra latency per note/action carried by the request
+    per_item_latency: float = 0.0
+
+
+class FakeAnkiConnect:
+    """In-memory stand-in for AnkiConnect served over real HTTP."""
+
+    def __init__(
+        self,
+        faults: Faults = Faults(),
+        decks: t.Iterable[str] = ("Default", "English"),
+        models: t.Mapping[str, t.Sequence[str]] = DEFAULT_MODELS,
+        seed: int | None = None,
+    ) -> None:
+        self.faults = faults
+        self.decks = set(decks)
+        self.models = {name: list(fields) for name, fields in models.items()}
+        self.notes: dict[int, dict[str, t.Any]] = {}
+        self.media: dict[str, bytes] = {}
+        self._first_fields: set[tuple[str, str]] = set()
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def running(
+        cls,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        **kwargs,
+    ) -> t.AsyncIterator[tuple[t.Self, str]]:
+        self = cls(**kwargs)
+        async with serving(self._handle, host, port) as base_url:
+            yield self, base_url
+
+    async def _handle(self, request: Request) -> Response | None:
+        self.requests += 1
+        payload = json.loads(request.body)
+        faults = self.faults
+
+        delay = faults.latency + self._random.uniform(0, faults.jitter)
+        delay += faults.per_item_latency * _items_in(payload)
+        if self._random.random() < faults.stall_rate:
+            delay += faults.stall
+        await aio.sleep(delay)
+
+        if self._random.random() < faults.drop_rate:
+            return None
+
+        if self._random.random() < faults.error_rate:
+            envelope = {"result": None, "error": "injected failure"}
+        else:
+            envelope = self.dispatch(payload)
+
+        return Response(
+            headers={"Content-Type": "application/json"},
+            body=json.dumps(envelope).encode(),
+        )
+
+    def dispatch(self, payload: t.Mapping[str, t.Any]) -> dict[str, t.Any]:
+        handler = getattr(self, f"_action_{payload['action']}", None)
+        if handler is None:
+            return {"result": None, "error": "unsupported action"}
+
+        try:
+            return {"result": handler(**payload.get("params", {})), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+    def _action_version(self) -> int:
+        return 6
+
+    def _action_deckNames(self) -> list[str]:
+        return sorted(self.decks)
+
+    def _action_modelNames(self) -> list[str]:
+        return list(self.models)
+
+    def _action_modelFieldNames(self, modelName: str) -> list[str]:
+        if modelName not in self.models:
+            raise Exception(f"model was not found: {modelName}")
+        return self.models[modelName]
+
+    def _action_addNote(self, note: dict[str, t.Any]) -> int:
+        first = self._check(note)
+        note_id = next(self._ids)
+        self.notes[note_id] = note
+        self._first_fields.add((note["modelName"], first))
+        return note_id
+
+    def _action_addNotes(self, notes: list[dict[str, t.Any]]) -> list[int]:
+        # NOTE: Like AnkiConnect, a bad note fails the whole batch, but the good ones stay added
+        results: list[int] = []
+        errors: list[str] = []
+        for note in notes:
+            try:
+                results.append(self._action_addNote(note))
+            except Exception as e:
+                errors.append(str(e))
+        if errors:
+            raise Exception(str(errors))
+        return results
+
+    def _action_deleteNotes(self, notes: list[int]) -> None:
+        for note_id in notes:
+            if (note := self.notes.pop(note_id, None)) is not None:
+                first = note["fields"].get(self.models[note["modelName"]][0], "")
+                self._first_fields.discard((note["modelName"], first))
+
+    def _action_canAddNotesWithErrorDetail(
+        self, notes: list[dict[str, t.Any]]
+    ) -> list[dict[str, t.Any]]:
+        results = []
+        for note in notes:
+            try:
+                self._check(note)
+            except Exception as e:
+                results.append({"canAdd": False, "error": str(e)})
+            else:
+                results.append({"canAdd": True})
+        return results
+
+    def _action_multi(self, actions: list[dict[str, t.Any]]) -> list[dict[str, t.Any]]:
+        return [self.dispatch(action) for action in actions]
+
+    def _action_findNotes(self, query: str) -> list[int]:
+        deck = query.removeprefix('deck:"').removesuffix('"')
+        return [i for i, note in self.notes.items() if note.get("deckName") == deck]
+
+    def _action_notesInfo(self, notes: list[int]) -> list[dict[str, t.Any]]:
+        return [
+            (
+                {
+                    "noteId": note_id,
+                    "modelName": self.notes[note_id]["modelName"],
+                    "tags": list(self.notes[note_id].get("tags", [])),
+                    "fields": {
+                        name: {
+                            "value": self.notes[note_id]["fields"].get(name, ""),
+                            "order": order,
+                        }
+                        for order, name in enumerate(
+                            self.models[self.notes[note_id]["modelName"]]
+                        )
+                    },
+                }
+                if note_id in self.notes
+                else {}
+            )
+            for note_id in notes
+        ]
+
+    def _action_storeMediaFile(
+        self, filename: str, data: str | None = None, path: str | None = None, **_
+    ) -> str:
+        if path is not None:
+            with open(path, "rb") as f:
+                self.media[filename] = f.read()
+        else:
+            self.media[filename] = base64.b64decode(data or "")
+        return filename
+
+    def _action_getMediaFilesNames(self, pattern: str = "*") -> list[str]:
+        return fnmatch.filter(self.media, pattern)
+
+    def _check(self, note: t.Mapping[str, t.Any]) -> str:
+        if note.get("deckName") not in self.decks:
+            raise Exception(f"deck was not found: {note.get('deckName')}")
+        if (fields := self.models.get(note.get("modelName", ""))) is None:
+            raise Exception(f"model was not found: {note.get('modelName')}")
+
+        first = note["fields"].get(fields[0], "")
+        if not first:
+            raise Exception("cannot create note because it is empty")
+        if not note.get("options", {}).get("allowDuplicate") and (
+            (note["modelName"], first) in self._first_fields
+        ):
+            raise Exception(DUPLICATE_ERROR)
+        return first
+
+
+def _items_in(payload: t.Mapping[str, t.Any]) -> int:
+    params = payload.get("params", {})
+    return len(params.get("notes", params.get("actions", [None])))
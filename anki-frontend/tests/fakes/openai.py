@@ -0,0 +1,276 @@
+import asyncio as aio
+import contextlib
+import hashlib
+import inspect
+import json
+import random
+import typing as t
+from dataclasses import dataclass
+
+import httpx
+from openai import AsyncOpenAI
+
+from aicards.ctx.aicards.core.ai._prompts import BATCH_EXTRACTION_PROMPT
+from tests.fakes._http import Request, Response, serving
+
+type Reply = t.Sequence[str] | httpx.Response
+
+
+def completion_chunk(content: str, index: int = 0) -> dict[str, t.Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "fake",
+        "choices": [{"index": index, "delta": {"content": content}}],
+    }
+
+
+def sse_event(data: dict[str, t.Any]) -> bytes:
+    return f"data: {json.dumps(data)}\n\n".encode()
+
+
+def sse(chunks: t.Iterable[dict[str, t.Any]]) -> bytes:
+    return b"".join(sse_event(chunk) for chunk in chunks) + b"data: [DONE]\n\n"
+
+
+def completion(content: str) -> dict[str, t.Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "fake",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+    }
+
+
+def mock_openai(
+    respond: t.Callable[[dict[str, t.Any]], "Reply | t.Awaitable[Reply]"],
+    requests: list[dict[str, t.Any]] | None = None,
+) -> AsyncOpenAI:
+    """
+    Client whose chat completions are made of the fragments `respond` returns for each request.
+
+    Fragments are streamed one per chunk when the request asks for streaming. A ready response,
+    e.g. an error, is sent as is.
+    """
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if requests is not None:
+            requests.append(payload)
+
+        fragments = respond(payload)
+        if inspect.isawaitable(fragments):
+            fragments = await fragments
+        if isinstance(fragments, httpx.Response):
+            return fragments
+        if not payload.get("stream"):
+            return httpx.Response(200, json=completion("".join(fragments)))
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "text/event-stream"},
+            content=sse(completion_chunk(f) for f in fragments),
+        )
+
+    return AsyncOpenAI(
+        api_key="unused",
+        base_url="http://openai/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+    )
+
+
+@dataclass(frozen=True)
+class Pace:
+    time_to_first_token: float = 0.0
+    tokens_per_second: float | None = None
+    # NOTE: ~4 characters per token, close enough for JSON
+    chars_per_token: int = 4
+
+
+@dataclass(frozen=True)
+class Faults:
+    # Requests answered with 429 and a retry-after
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.5
+    # Requests answered only after `stall` seconds, to trip client timeouts
+    stall_rate: float = 0.0
+    stall: float = 30.0
+
+
+class FakeOpenAI:
+    """
+    Chat completions server with canned, schema-valid responses of AiClient's requests.
+
+    Requests carrying an image get an `ExtractionResult`, batches of images a `BatchExtractionResult`,
+    requests carrying extractions get protonote drafts for each of them. Responses depend only on the request, so runs are reproducible.
+    """
+
+    def __init__(
+        self,
+        pace: Pace = Pace(),
+        faults: Faults = Faults(),
+        extractions_per_image: int = 3,
+        seed: int | None = None,
+    ) -> None:
+        self.pace = pace
+        self.faults = faults
+        self.extractions_per_image = extractions_per_image
+        self.requests: list[dict[str, t.Any]] = []
+        self._random = random.Random(seed)
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def running(
+        cls,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        **kwargs,
+    ) -> t.AsyncIterator[tuple[t.Self, str]]:
+        """Yield the server and the base URL to point `AsyncOpenAI(base_url=...)` at."""
+        self = cls(**kwargs)
+        async with serving(self._handle, host, port) as base_url:
+            yield self, f"{base_url}/v1"
+
+    async def _handle(self, request: Request) -> Response:
+        if request.path.rstrip("/") != "/v1/chat/completions":
+            return _error(404, "not found")
+
+        payload = json.loads(request.body)
+        self.requests.append(payload)
+
+        if self._random.random() < self.faults.rate_limit_rate:
+            return _error(
+                429,
+                "rate limit reached",
+                {"retry-after-ms": str(int(self.faults.retry_after * 1000))},
+            )
+        if self._random.random() < self.faults.stall_rate:
+            await aio.sleep(self.faults.stall)
+
+        content = self.respond(payload)
+        usage = self._usage(payload, content)
+        if payload.get("stream"):
+            include_usage = (payload.get("stream_options") or {}).get("include_usage")
+            return Response(
+                headers={"Content-Type": "text/event-stream"},
+                body=self._streamed(content, usage if include_usage else None),
+            )
+
+        await aio.sleep(self.pace.time_to_first_token + self._generation_time(content))
+        return Response(
+            headers={"Content-Type": "application/json"},
+            body=json.dumps({**completion(content), "usage": usage}).encode(),
+        )
+
+    def respond(self, payload: t.Mapping[str, t.Any]) -> str:
+        messages = payload["messages"]
+        parts = [
+            part
+            for message in messages
+            for part in (
+                message["content"]
+                if isinstance(message["content"], list)
+                else [{"type": "text", "text": message["content"]}]
+            )
+        ]
+
+        images = [p["image_url"]["url"] for p in parts if p["type"] == "image_url"]
+        if images and parts[0]["text"].startswith(BATCH_EXTRACTION_PROMPT):
+            return json.dumps(
+                {
+                    "message": f"Extracted emphases from {len(images)} images",
+                    "images": [
+                        {
+                            "index": i,
+                            "extractions": self._extraction_result(image)[
+                                "extractions"
+                            ],
+                        }
+                        for i, image in enumerate(images)
+                    ],
+                }
+            )
+        if images:
+            return json.dumps(self._extraction_result(images[0]))
+        return json.dumps(self._drafts_response(json.loads(parts[-1]["text"])))
+
+    def _extraction_result(self, image_url: str) -> dict[str, t.Any]:
+        digest = hashlib.sha256(image_url.encode()).hexdigest()[:8]
+        return {
+            "message": f"Found {self.extractions_per_image} emphases",
+            "extractions": [
+                {
+                    "reason": "Highlighted in the image",
+                    "snippet": f"word-{digest}-{i}",
+                    "context": f"A sentence with word-{digest}-{i} in it.",
+                    "comment": None,
+                }
+                for i in range(self.extractions_per_image)
+            ],
+        }
+
+    def _drafts_response(self, extractions: list[dict[str, t.Any]]) -> dict[str, t.Any]:
+        return {
+            "message": f"Created protonotes for {len(extractions)} extractions",
+            "results": [
+                {
+                    "index": i,
+                    "protonotes": [
+                        {
+                            "type": "Meaning",
+                            "concept": extraction["snippet"],
+                            "examples": [
+                                extraction.get("context") or extraction["snippet"]
+                            ],
+                        }
+                    ],
+                }
+                for i, extraction in enumerate(extractions)
+            ],
+        }
+
+    async def _streamed(
+        self, content: str, usage: dict[str, int] | None
+    ) -> t.AsyncIterator[bytes]:
+        await aio.sleep(self.pace.time_to_first_token)
+        step = self.pace.chars_per_token
+        for i in range(0, len(content), step):
+            if i and self.pace.tokens_per_second:
+                await aio.sleep(1 / self.pace.tokens_per_second)
+            yield sse_event(completion_chunk(content[i : i + step]))
+        if usage is not None:
+            yield sse_event({**completion_chunk(""), "choices": [], "usage": usage})
+        yield b"data: [DONE]\n\n"
+
+    def _usage(self, payload: t.Mapping[str, t.Any], content: str) -> dict[str, int]:
+        prompt = len(json.dumps(payload["messages"])) // self.pace.chars_per_token
+        completion = -(-len(content) // self.pace.chars_per_token)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+        }
+
+    def _generation_time(self, content: str) -> float:
+        if not self.pace.tokens_per_second:
+            return 0.0
+        tokens = len(content) / self.pace.chars_per_token
+        return tokens / self.pace.tokens_per_second
+
+
+def _error(
+    status: int, message: str, headers: t.Mapping[str, str] | None = None
+) -> Response:
+    return Response(
+        status=status,
+        headers={"Content-Type": "application/json", **(headers or {})},
+        body=json.dumps({"error": {"message": message, "type": "fake"}}).encode(),
+    )